@@ -0,0 +1,84 @@
+from ASTwithCalculation import AST
+
+
+class ASTOptimizer:
+    """Pass between build_ast and AST: decodes literals once and folds constant sub-expressions"""
+
+    MAX_FOLDED_SIZE = 4096  # bits of folded integers / characters of folded strings
+
+    def __init__(self, ast, fold_constants=True):
+        self.ast, self.fold_constants = ast, fold_constants
+
+    @staticmethod
+    def constant(value):
+        if isinstance(value, str):
+            return {'op': 'STRING', 'content': value, 'value': value}
+        return {'op': 'NUMBER', 'content': repr(value), 'value': value}
+
+    @staticmethod
+    def is_constant(ast):
+        return 'value' in ast
+
+    @staticmethod
+    def is_cheap(op, left, right):
+        """Guards compile time against folding expressions like 2 ** 10 ** 10"""
+        limit = ASTOptimizer.MAX_FOLDED_SIZE
+        if op == 'POW' and isinstance(left, int) and isinstance(right, int) and right > 0:
+            return left.bit_length() * right <= limit
+        if op == 'LEFT_SHIFT' and isinstance(right, int):
+            return right <= limit
+        if op == 'MUL' and isinstance(left, str) != isinstance(right, str):
+            string, times = (left, right) if isinstance(left, str) else (right, left)
+            return not isinstance(times, int) or len(string) * times <= limit
+        return True
+
+    def optimize(self, ast=None):
+        if ast is None:
+            ast = self.ast
+
+        if ast['op'] == 'NUMBER':
+            value = float(ast['content']) if '.' in ast['content'] else int(ast['content'])
+            return {'op': 'NUMBER', 'content': ast['content'], 'value': value}
+
+        if ast['op'] == 'STRING':
+            return {'op': 'STRING', 'content': ast['content'], 'value': ast['content']}
+
+        if ast['op'] == 'VARIABLE':
+            return ast
+
+        if ast['op'] == 'CALL_FUNCTION':
+            return {'op': 'CALL_FUNCTION', 'function': ast['function'],
+                    'arguments': [self.optimize(sub_ast) for sub_ast in ast['arguments']]}
+
+        if ast['op'] == 'IF':
+            condition, true, false = map(self.optimize, (ast['condition'], ast['true'], ast['false']))
+            if self.fold_constants and self.is_constant(condition):
+                return true if condition['value'] else false
+            return {'op': 'IF', 'condition': condition, 'true': true, 'false': false}
+
+        left = self.optimize(ast['left'])
+
+        if ast['op'] in AST.unary_operations:
+            if self.fold_constants and self.is_constant(left):
+                try:
+                    return self.constant(AST.unary_operations[ast['op']](left['value']))
+                except (TypeError, ValueError, ArithmeticError):
+                    pass
+            return {'op': ast['op'], 'left': left}
+
+        right = self.optimize(ast['right'])
+
+        if self.fold_constants and self.is_constant(left):
+            if ast['op'] == 'AND':
+                return right if left['value'] else left
+            if ast['op'] == 'OR':
+                return left if left['value'] else right
+
+            if ast['op'] in AST.binary_operations and self.is_constant(right) and \
+                    self.is_cheap(ast['op'], left['value'], right['value']):
+                try:
+                    return self.constant(AST.binary_operations[ast['op']](left['value'], right['value']))
+                except (TypeError, ValueError, ArithmeticError):
+                    pass
+
+        return {'op': ast['op'], 'left': left, 'right': right}
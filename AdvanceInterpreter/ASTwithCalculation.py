@@ -1,3 +1,123 @@
+import weakref
+from VariableScopeClass import UNSET, TailCall
+
+
+class InlineCache:
+    """Types of operands seen by one binary node of variables and constants, like `i < n` or `s + 1`. After PROBES
+    executions the node is specialised for the only pair of types seen, if it is one of SPECIALISED: it reads
+    variables itself and runs the operation after a guard on classes of operands, which rejects unassigned
+    locals too. Operands failing the guard run the generic node. After MISSES of them the node records types
+    again, at most RESPECIALISATIONS times, then it stays generic"""
+
+    SPECIALISED = {(int, int), (float, float), (int, float), (float, int), (str, str)}
+    PROBES = 8
+    MISSES = 64
+    RESPECIALISATIONS = 4
+
+    OPERATORS = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'INT_DIV': '//', 'DIV': '/', 'MOD': '%', 'POW': '**',
+                 'LEFT_SHIFT': '<<', 'RIGHT_SHIFT': '>>', 'BIT_AND': '&', 'BIT_XOR': '^', 'BIT_OR': '|',
+                 'EQUALS': '==', 'NOT_EQUALS': '!=', 'LESS': '<', 'LESS_EQUALS': '<=', 'GREATER': '>',
+                 'GREATER_EQUALS': '>='}
+    COMPARISONS = ('EQUALS', 'NOT_EQUALS', 'LESS', 'LESS_EQUALS', 'GREATER', 'GREATER_EQUALS')
+
+    # reading of operand by its kind, `{0}` is local of node and `{1}` is slot, name or value given to factory
+    READS = {'slot': ['        {0} = variables.slots[{1}]'],
+             'global': ['        try:', '            {0} = variables.vars[{1}]',
+                        '        except (AttributeError, KeyError):', '            return miss(variables)']}
+
+    factories = {}  # (op, kinds of operands, types of operands, condition) -> factory of specialised nodes
+    instances = weakref.WeakSet()  # caches alive, for statistics
+
+    def __init__(self, owner):
+        self.owner = owner  # ast compiled again when the node changes
+        self.types, self.probes, self.misses, self.respecialisations = set(), 0, 0, 0
+        InlineCache.instances.add(self)
+
+    def pair(self):
+        """Types of operands the node is specialised for, None for generic node"""
+        if self.respecialisations > self.RESPECIALISATIONS or len(self.types) != 1:
+            return None
+        pair = next(iter(self.types))
+        return pair if pair in self.SPECIALISED else None
+
+    def node(self, op, operands, condition, left, right, generic):
+        """Closure of the node in the current state of cache, operands are (kind, slot, name or value)"""
+        if self.respecialisations > self.RESPECIALISATIONS:
+            return generic
+        if self.probes < self.PROBES:
+            return self.probing(AST.binary_operations[op], left, right)
+        pair = self.pair()
+        if pair is None:
+            return generic
+        kinds = tuple(kind for kind, _ in operands)
+        factory = self.factory(op, kinds, pair, condition)
+        return factory(operands[0][1], operands[1][1], self.missing(generic))
+
+    def probing(self, operation, left, right):
+        def probing_node(variables):
+            left_value, right_value = left(variables), right(variables)
+            self.types.add((left_value.__class__, right_value.__class__))
+            self.probes += 1
+            if self.probes == self.PROBES:
+                self.owner.recompile()
+            return operation(left_value, right_value)
+        return probing_node
+
+    def missing(self, generic):
+        def miss(variables):
+            self.misses += 1
+            if self.misses == self.MISSES:
+                self.misses, self.respecialisations = 0, self.respecialisations + 1
+                if self.respecialisations <= self.RESPECIALISATIONS:
+                    self.types, self.probes = set(), 0
+                self.owner.recompile()
+            return generic(variables)
+        return miss
+
+    @staticmethod
+    def factory(op, kinds, pair, condition):
+        """Function `factory(left, right, miss)` making specialised nodes, every combination of op, kinds and types
+        of operands gets code of its own"""
+        key = (op, kinds, pair, condition)
+        if key not in InlineCache.factories:
+            lines, guards, values = ['def factory(left, right, miss):', '    def node(variables):'], [], []
+            for local, argument, kind, operand_type in zip(('a', 'b'), ('left', 'right'), kinds, pair):
+                if kind == 'constant':
+                    values.append(argument)
+                    continue
+                lines.extend(line.format(local, argument) for line in InlineCache.READS[kind])
+                guards.append('{}.__class__ is {}'.format(local, operand_type.__name__))
+                values.append(local)
+            expression = '{} {} {}'.format(values[0], InlineCache.OPERATORS[op], values[1])
+            if op in InlineCache.COMPARISONS and not condition:
+                expression = '({}) + 0'.format(expression)
+            lines += ['        if {}:'.format(' and '.join(guards)), '            return ' + expression,
+                      '        return miss(variables)', '    return node']
+            namespace = {}
+            exec(compile('\n'.join(lines), '<inline cache {}>'.format(op), 'exec'), namespace)
+            InlineCache.factories[key] = namespace['factory']
+        return InlineCache.factories[key]
+
+    def state(self):
+        if self.respecialisations > self.RESPECIALISATIONS:
+            return 'generic, types change'
+        if self.probes < self.PROBES:
+            return 'probing'
+        pair = self.pair()
+        if pair is None:
+            return 'polymorphic' if len(self.types) > 1 else 'generic'
+        return 'monomorphic {}/{}'.format(pair[0].__name__, pair[1].__name__)
+
+    @staticmethod
+    def statistics():
+        """Returns {state: count} over binary nodes with inline caches alive"""
+        statistics = {}
+        for cache in list(InlineCache.instances):
+            state = cache.state()
+            statistics[state] = statistics.get(state, 0) + 1
+        return statistics
+
+
 class AST:
 
     class InvalidAstOperationException(Exception):
@@ -7,6 +127,21 @@ class AST:
         def __repr__(self):
             return 'Invalid operation in ast: {}'.format(self.operation)
 
+    class NotFunctionException(Exception):
+        def __init__(self, type_name):
+            self.type_name = type_name
+
+        def __repr__(self):
+            return 'Value of type {} is not a function'.format(self.type_name)
+
+    @staticmethod
+    def not_function(function):
+        """Exception for AttributeError raised by calling value which is not a function, None when function was
+        called and AttributeError came from inside of it"""
+        if hasattr(function, 'execute'):
+            return None
+        return AST.NotFunctionException(type(function).__name__)
+
     binary_operations = {'ADD':            lambda x, y: x + y,
                          'SUB':            lambda x, y: x - y,
                          'MUL':            lambda x, y: x * y,
@@ -19,22 +154,82 @@ class AST:
                          'BIT_AND':        lambda x, y: x & y,
                          'BIT_XOR':        lambda x, y: x ^ y,
                          'BIT_OR':         lambda x, y: x | y,
-                         'EQUALS':         lambda x, y: int(x == y),
-                         'NOT_EQUALS':     lambda x, y: int(x != y),
-                         'LESS':           lambda x, y: int(x < y),
-                         'LESS_EQUALS':    lambda x, y: int(x <= y),
-                         'GREATER':        lambda x, y: int(x > y),
-                         'GREATER_EQUALS': lambda x, y: int(x >= y)}
+                         'EQUALS':         lambda x, y: (x == y) + 0,
+                         'NOT_EQUALS':     lambda x, y: (x != y) + 0,
+                         'LESS':           lambda x, y: (x < y) + 0,
+                         'LESS_EQUALS':    lambda x, y: (x <= y) + 0,
+                         'GREATER':        lambda x, y: (x > y) + 0,
+                         'GREATER_EQUALS': lambda x, y: (x >= y) + 0}
+
+    @staticmethod
+    def logical_not(x):
+        try:
+            return not x
+        except ValueError:
+            # arrays have no single truth value, they are negated element-wise
+            return (x == 0) + 0
 
     unary_operations = {'UNARY_PLUS':      lambda x: x,
                         'UNARY_MINUS':     lambda x: -x,
-                        'NOT':             lambda x: not x}
+                        'NOT':             logical_not.__func__}
+
+    binary_nodes = {'ADD':            lambda l, r: lambda variables: l(variables) + r(variables),
+                    'SUB':            lambda l, r: lambda variables: l(variables) - r(variables),
+                    'MUL':            lambda l, r: lambda variables: l(variables) * r(variables),
+                    'INT_DIV':        lambda l, r: lambda variables: l(variables) // r(variables),
+                    'DIV':            lambda l, r: lambda variables: l(variables) / r(variables),
+                    'MOD':            lambda l, r: lambda variables: l(variables) % r(variables),
+                    'POW':            lambda l, r: lambda variables: l(variables) ** r(variables),
+                    'LEFT_SHIFT':     lambda l, r: lambda variables: l(variables) << r(variables),
+                    'RIGHT_SHIFT':    lambda l, r: lambda variables: l(variables) >> r(variables),
+                    'BIT_AND':        lambda l, r: lambda variables: l(variables) & r(variables),
+                    'BIT_XOR':        lambda l, r: lambda variables: l(variables) ^ r(variables),
+                    'BIT_OR':         lambda l, r: lambda variables: l(variables) | r(variables),
+                    'EQUALS':         lambda l, r: lambda variables: (l(variables) == r(variables)) + 0,
+                    'NOT_EQUALS':     lambda l, r: lambda variables: (l(variables) != r(variables)) + 0,
+                    'LESS':           lambda l, r: lambda variables: (l(variables) < r(variables)) + 0,
+                    'LESS_EQUALS':    lambda l, r: lambda variables: (l(variables) <= r(variables)) + 0,
+                    'GREATER':        lambda l, r: lambda variables: (l(variables) > r(variables)) + 0,
+                    'GREATER_EQUALS': lambda l, r: lambda variables: (l(variables) >= r(variables)) + 0}
 
-    def __init__(self, ast):
-        self.ast = ast
+    # comparisons which value is only tested for truth are not turned into int
+    condition_nodes = dict(binary_nodes,
+                           EQUALS=lambda l, r: lambda variables: l(variables) == r(variables),
+                           NOT_EQUALS=lambda l, r: lambda variables: l(variables) != r(variables),
+                           LESS=lambda l, r: lambda variables: l(variables) < r(variables),
+                           LESS_EQUALS=lambda l, r: lambda variables: l(variables) <= r(variables),
+                           GREATER=lambda l, r: lambda variables: l(variables) > r(variables),
+                           GREATER_EQUALS=lambda l, r: lambda variables: l(variables) >= r(variables))
+
+    def __init__(self, ast, condition=False):
+        self.ast, self.symbols, self.condition = ast, None, condition  # value of condition is only tested
+        self.function, self.async_function, self.caches = self.first_execution, None, {}
+
+    def __getstate__(self):
+        # closures can not be pickled, they are compiled again on load
+        return {'ast': self.ast, 'symbols': self.symbols, 'condition': self.condition}
+
+    def __setstate__(self, state):
+        self.ast, self.symbols, self.condition = state['ast'], state['symbols'], state.get('condition', False)
+        self.function, self.async_function, self.caches = self.first_execution, None, {}
+
+    inline_caches = True  # without them every binary node is generic
+
+    def first_execution(self, variables):
+        """Ast is compiled when it runs first, so code which never runs, like functions never called, costs
+        nothing but parsing. Resolving function bodies to slots does not compile them twice either. Inline caches
+        of binary nodes compile it again when they have seen types of operands (see InlineCache)"""
+        self.function = self.compile(self.ast, self.symbols, self.condition, self if self.inline_caches else None)
+        return self.function(variables)
+
+    def recompile(self):
+        self.function = self.first_execution
 
     @staticmethod
     def recursive(ast, variables):
+        if 'value' in ast:
+            return ast['value']
+
         if ast['op'] == 'NUMBER':
             if '.' in ast['content']:
                 return float(ast['content'])
@@ -55,7 +250,10 @@ class AST:
             function = ast['function']['content']
             arguments = [AST.recursive(sub_ast, variables) for sub_ast in ast['arguments']]
             return variables.get(function).execute(arguments, variables)
-        
+
+        if ast['op'] == 'TAIL_CALL':
+            return TailCall([AST.recursive(sub_ast, variables) for sub_ast in ast['arguments']])
+
         left = AST.recursive(ast['left'], variables)
 
         if ast['op'] == 'AND':
@@ -77,5 +275,261 @@ class AST:
 
         raise AST.InvalidAstOperationException(ast['op'])
 
+    @staticmethod
+    def compile_variable(name, symbols):
+        if symbols is None:
+            return lambda variables: variables.get(name)
+
+        slot, builtin = symbols.resolve(name)
+        if slot is not None:
+            def local_variable(frame):
+                value = frame.slots[slot]
+                return value if value is not UNSET else frame.parent.get(name)
+            return local_variable
+
+        if builtin is not None:
+            return lambda variables: builtin
+        return lambda frame: frame.parent.get(name)
+
+    @staticmethod
+    def operand(ast, symbols):
+        """(kind, slot, name or value) of operand which specialised binary node reads itself, None for others"""
+        if 'value' in ast:
+            return 'constant', ast['value']
+        if ast['op'] == 'NUMBER':
+            return 'constant', float(ast['content']) if '.' in ast['content'] else int(ast['content'])
+        if ast['op'] == 'STRING':
+            return 'constant', ast['content']
+        if ast['op'] == 'VARIABLE':
+            if symbols is None:
+                return 'global', ast['content']
+            slot, _ = symbols.resolve(ast['content'])
+            if slot is not None:
+                return 'slot', slot
+        return None
+
+    @staticmethod
+    def compile(ast, symbols=None, condition=False, owner=None):
+        """Turns ast into a closure `function(variables)`, all dispatch on ast['op'] is done here once.
+        With symbols names are resolved to slots of Frame, builtins or outer scope. Value of ast compiled as
+        condition is only tested for truth. Binary nodes of variables and constants get inline caches of owner"""
+        if 'value' in ast:
+            value = ast['value']
+            return lambda variables: value
+
+        if ast['op'] == 'NUMBER':
+            value = float(ast['content']) if '.' in ast['content'] else int(ast['content'])
+            return lambda variables: value
+
+        if ast['op'] == 'VARIABLE':
+            return AST.compile_variable(ast['content'], symbols)
+
+        if ast['op'] == 'STRING':
+            string = ast['content']
+            return lambda variables: string
+
+        if ast['op'] == 'IF':
+            test = AST.compile(ast['condition'], symbols, True, owner)
+            true, false = (AST.compile(ast[key], symbols, condition, owner) for key in ('true', 'false'))
+            return lambda variables: true(variables) if test(variables) else false(variables)
+
+        if ast['op'] == 'CALL_FUNCTION':
+            function = ast['function']['content']
+            arguments = [AST.compile(sub_ast, symbols, False, owner) for sub_ast in ast['arguments']]
+            if symbols is not None:
+                slot, builtin = symbols.resolve(function)
+                if builtin is not None:
+                    builtin_function = builtin.func
+                    return lambda variables: builtin_function(*[argument(variables) for argument in arguments])
+
+            callee = AST.compile_variable(function, symbols)
+
+            def call(variables):
+                function_value = callee(variables)
+                try:
+                    return function_value.execute([argument(variables) for argument in arguments], variables)
+                except AttributeError:
+                    not_function = AST.not_function(function_value)
+                    if not_function is None:
+                        raise
+                    raise not_function from None
+            return call
+
+        if ast['op'] == 'TAIL_CALL':
+            arguments = [AST.compile(sub_ast, symbols, False, owner) for sub_ast in ast['arguments']]
+            return lambda variables: TailCall([argument(variables) for argument in arguments])
+
+        if ast['op'] in ('AND', 'OR'):
+            left, right = (AST.compile(ast[key], symbols, condition, owner) for key in ('left', 'right'))
+            if ast['op'] == 'AND':
+                return lambda variables: left(variables) and right(variables)
+            return lambda variables: left(variables) or right(variables)
+
+        left = AST.compile(ast['left'], symbols, ast['op'] == 'NOT', owner)
+
+        if ast['op'] == 'UNARY_PLUS':
+            return left
+
+        if ast['op'] == 'UNARY_MINUS':
+            return lambda variables: -left(variables)
+
+        if ast['op'] == 'NOT':
+            def negation(variables):
+                value = left(variables)
+                try:
+                    return not value
+                except ValueError:
+                    return (value == 0) + 0
+            return negation
+
+        if ast['op'] in AST.binary_nodes:
+            right = AST.compile(ast['right'], symbols, False, owner)
+            generic = (AST.condition_nodes if condition else AST.binary_nodes)[ast['op']](left, right)
+            operands = AST.operand(ast['left'], symbols), AST.operand(ast['right'], symbols)
+            if owner is None or None in operands or operands[0][0] == operands[1][0] == 'constant':
+                return generic
+            cache = owner.caches.get(id(ast))
+            if cache is None:
+                cache = owner.caches[id(ast)] = InlineCache(owner)
+            return cache.node(ast['op'], operands, condition, left, right, generic)
+
+        raise AST.InvalidAstOperationException(ast['op'])
+
+    @staticmethod
+    def awaits(ast, symbols=None):
+        """Whether ast calls anything which may wait on asyncio: every function but builtins without async variant
+        resolved by symbols"""
+        if 'value' in ast:
+            return False
+        if ast['op'] == 'CALL_FUNCTION':
+            builtin = None if symbols is None else symbols.resolve(ast['function']['content'])[1]
+            if builtin is None or builtin.async_func is not None:
+                return True
+        return any(AST.awaits(ast[key], symbols) for key in ('left', 'right', 'condition', 'true', 'false')
+                   if key in ast) or any(AST.awaits(sub_ast, symbols) for sub_ast in ast.get('arguments', ()))
+
+    @staticmethod
+    def compile_async(ast, symbols=None, condition=False):
+        """Turns ast into a coroutine function `function(variables)` for code running on asyncio, functions called
+        in ast are awaited (see call_async). Parts of ast which await nothing are compiled by compile"""
+        if not AST.awaits(ast, symbols):
+            function = AST.compile(ast, symbols, condition)
+
+            async def evaluate(variables):
+                return function(variables)
+            return evaluate
+
+        op = ast['op']
+        if op == 'IF':
+            test = AST.compile_async(ast['condition'], symbols, True)
+            true, false = (AST.compile_async(ast[key], symbols, condition) for key in ('true', 'false'))
+
+            async def choose(variables):
+                return await (true if await test(variables) else false)(variables)
+            return choose
+
+        if op == 'CALL_FUNCTION':
+            callee = AST.compile_variable(ast['function']['content'], symbols)
+            arguments = [AST.compile_async(sub_ast, symbols) for sub_ast in ast['arguments']]
+
+            async def call(variables):
+                function = callee(variables)
+                return await AST.call_async(function, [await argument(variables) for argument in arguments],
+                                            variables)
+            return call
+
+        if op == 'TAIL_CALL':
+            arguments = [AST.compile_async(sub_ast, symbols) for sub_ast in ast['arguments']]
+
+            async def tail_call(variables):
+                return TailCall([await argument(variables) for argument in arguments])
+            return tail_call
+
+        if op in ('AND', 'OR'):
+            left, right = (AST.compile_async(ast[key], symbols, condition) for key in ('left', 'right'))
+            if op == 'AND':
+                async def conjunction(variables):
+                    value = await left(variables)
+                    return await right(variables) if value else value
+                return conjunction
+
+            async def disjunction(variables):
+                value = await left(variables)
+                return value if value else await right(variables)
+            return disjunction
+
+        left = AST.compile_async(ast['left'], symbols, op == 'NOT')
+
+        if op in AST.unary_operations:
+            operation = AST.unary_operations[op]
+
+            async def unary(variables):
+                return operation(await left(variables))
+            return unary
+
+        if op in AST.binary_operations:
+            operation, right = AST.binary_operations[op], AST.compile_async(ast['right'], symbols)
+
+            async def binary(variables):
+                return operation(await left(variables), await right(variables))
+            return binary
+
+        raise AST.InvalidAstOperationException(op)
+
+    @staticmethod
+    async def call_async(function, arguments_values, variables):
+        """Awaits function which has variant for asyncio (def and fn functions, builtins), others are called as usual"""
+        execute_async = getattr(function, 'execute_async', None)
+        if execute_async is None:
+            if not hasattr(function, 'execute'):
+                raise AST.NotFunctionException(type(function).__name__)
+            return function.execute(arguments_values, variables)
+        return await execute_async(arguments_values, variables)
+
+    @staticmethod
+    def mark_tail_calls(ast, function_name, arguments_count):
+        """Returns ast where calls of function_name in tail position (whole ast or branches of IF on top) are
+        TAIL_CALL nodes, and whether there were any"""
+        if ast['op'] == 'CALL_FUNCTION' and ast['function']['content'] == function_name and \
+                len(ast['arguments']) == arguments_count:
+            return dict(ast, op='TAIL_CALL'), True
+
+        if ast['op'] == 'IF':
+            (true, true_marked), (false, false_marked) = (AST.mark_tail_calls(ast[key], function_name, arguments_count)
+                                                          for key in ('true', 'false'))
+            if true_marked or false_marked:
+                return dict(ast, true=true, false=false), True
+        return ast, False
+
+    @staticmethod
+    def has_tail_call(ast):
+        if ast['op'] == 'IF':
+            return AST.has_tail_call(ast['true']) or AST.has_tail_call(ast['false'])
+        return ast['op'] == 'TAIL_CALL'
+
+    @staticmethod
+    def read_names(ast):
+        """Yields every variable and function name used in ast"""
+        if ast['op'] == 'VARIABLE':
+            yield ast['content']
+        elif ast['op'] in ('CALL_FUNCTION', 'TAIL_CALL'):
+            yield ast['function']['content']
+        for key in ('left', 'right', 'condition', 'true', 'false'):
+            if key in ast:
+                yield from AST.read_names(ast[key])
+        for sub_ast in ast.get('arguments', ()):
+            yield from AST.read_names(sub_ast)
+
+    def resolve(self, symbols):
+        if symbols is not None:
+            self.symbols = symbols
+            self.function, self.async_function, self.caches = self.first_execution, None, {}
+
     def execute(self, variables):
-        return self.recursive(self.ast, variables)
+        return self.function(variables)
+
+    def execute_async(self, variables):
+        """Coroutine evaluating ast in code running on asyncio, compiled by compile_async when it runs first"""
+        if self.async_function is None:
+            self.async_function = self.compile_async(self.ast, self.symbols, self.condition)
+        return self.async_function(variables)
@@ -0,0 +1,105 @@
+import io
+import json
+import multiprocessing
+from time import perf_counter
+from VirtualMachine import CompiledBytecode
+from Transpiler import CompiledPython
+from my_builtins import redirect_output
+from Budget import Budget
+from Compiler import Compiler
+from contextlib import nullcontext
+
+
+class BatchRunner:
+    """Runs one compiled program over many records of a json lines file, every record is a json object which
+    keys are set as variables before the run. Records are distributed over pool of worker processes, compiled
+    program is sent to every worker once. Results come in order of records: printed output, value of variable
+    `result` and error message if the run failed.
+    Limits of budget apply to every record on its own. Records with variables shadowing builtins run program
+    compiled again for them"""
+
+    class InvalidRecordException(Exception):
+        def __init__(self, record):
+            self.record = record
+
+        def __repr__(self):
+            return 'Record must be json object with variables, got {}'.format(self.record.strip()[:80])
+
+    RESULT_VARIABLE = 'result'
+
+    program = None  # program prepared for execution in the current worker
+    limits = None  # keyword arguments of Budget for every record or None
+    source = None  # (source code, compiler options, engine) for programs compiled for shadowed builtins
+    shadowing = {}  # names of builtins shadowed by record -> program prepared for them in the current worker
+
+    def __init__(self, compiled, engine='tree', workers=None, limits=None, source_code='', options=None):
+        self.compiled, self.engine, self.limits = compiled, engine, limits
+        self.source = (source_code, options or {}, engine)
+        self.workers = workers or multiprocessing.cpu_count()
+
+    @staticmethod
+    def prepare(compiled, engine):
+        if engine in ('vm', 'async'):
+            # worker runs one record at a time, there is nothing to run concurrently on event loop
+            return CompiledBytecode(compiled)
+        if engine == 'python':
+            return CompiledPython(compiled)
+        return compiled
+
+    @staticmethod
+    def initialize_worker(compiled, engine, limits, source):
+        BatchRunner.program = BatchRunner.prepare(compiled, engine)
+        BatchRunner.limits, BatchRunner.source, BatchRunner.shadowing = limits, source, {}
+
+    @staticmethod
+    def program_for(variables):
+        shadowed = Compiler.shadowed_builtins(variables)
+        if not shadowed:
+            return BatchRunner.program
+        if shadowed not in BatchRunner.shadowing:
+            source_code, options, engine = BatchRunner.source
+            compiled = Compiler(source_code, seeded_names=shadowed, **options).compile()
+            BatchRunner.shadowing[shadowed] = BatchRunner.prepare(compiled, engine)
+        return BatchRunner.shadowing[shadowed]
+
+    @staticmethod
+    def run_record(line):
+        """Returns {'output', 'result', 'error'} of running the program with variables of record"""
+        output, result, error = io.StringIO(), None, None
+        try:
+            variables = json.loads(line)
+            if not isinstance(variables, dict):
+                raise BatchRunner.InvalidRecordException(line)
+            budget = Budget(**BatchRunner.limits) if BatchRunner.limits else None
+            with redirect_output(output), budget.active() if budget else nullcontext():
+                result = BatchRunner.program_for(variables).run(variables).get(BatchRunner.RESULT_VARIABLE)
+        except Exception as e:
+            error = e.__repr__()
+        return {'output': output.getvalue(), 'result': result, 'error': error}
+
+    @staticmethod
+    def read_records(records_file):
+        for line in records_file:
+            if line.strip():
+                yield line
+
+    def run(self, records_file, results_file, chunk_size=16):
+        """Writes result of every record as json line, returns (records count, seconds)"""
+        start = perf_counter()
+        count = 0
+        records = self.read_records(records_file)
+        if self.workers == 1:
+            self.initialize_worker(self.compiled, self.engine, self.limits, self.source)
+            results = map(self.run_record, records)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(self.workers, self.initialize_worker,
+                                        (self.compiled, self.engine, self.limits, self.source))
+            results = pool.imap(self.run_record, records, chunk_size)
+        try:
+            for count, result in enumerate(results, 1):
+                results_file.write(json.dumps(result, default=str) + '\n')
+        finally:
+            if pool is not None:
+                pool.terminate()
+        return count, perf_counter() - start
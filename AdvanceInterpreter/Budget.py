@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from itertools import chain, repeat
+from time import perf_counter
+
+
+class Budget:
+    """Limits of one run: steps (iterations of loops and calls of functions), seconds of wall time and depth of
+    nested calls. Engines read the budget of the current run once per loop or call and meter nothing without it.
+    Loops are charged by chunks of CHUNK iterations, time is checked on every charge of a chunk, so run overshoots
+    time limit by one chunk at most"""
+
+    class BudgetExceededException(Exception):
+        def __init__(self, limit, value, steps, seconds):
+            self.limit, self.value, self.steps, self.seconds = limit, value, steps, seconds
+
+        def __repr__(self):
+            return 'Budget exceeded: {} limit {} reached after {} steps in {:.3f} s'.format(
+                self.limit, self.value, self.steps, self.seconds)
+
+    CHUNK = 256
+
+    current = ContextVar('budget', default=None)
+
+    def __init__(self, max_steps=None, max_seconds=None, max_depth=None):
+        self.max_steps, self.max_seconds, self.max_depth = max_steps, max_seconds, max_depth
+        self.steps, self.depth, self.next_check = 0, 0, 0
+        self.started = perf_counter()
+
+    def elapsed(self):
+        return perf_counter() - self.started
+
+    def exceeded(self, limit, value):
+        return Budget.BudgetExceededException(limit, value, self.steps, self.elapsed())
+
+    def check(self):
+        if self.max_steps is not None and self.steps > self.max_steps:
+            raise self.exceeded('steps', self.max_steps)
+        if self.max_seconds is not None and self.elapsed() > self.max_seconds:
+            raise self.exceeded('seconds', self.max_seconds)
+        self.next_check = self.steps + self.CHUNK if self.max_seconds is not None else float('inf')
+        if self.max_steps is not None:
+            self.next_check = min(self.next_check, self.max_steps + 1)
+
+    def charge(self, steps=1):
+        self.steps += steps
+        if self.steps >= self.next_check:
+            self.check()
+
+    def enter(self):
+        """Charges call one level deeper, caller decreases depth when the call ends"""
+        if self.max_depth is not None and self.depth >= self.max_depth:
+            raise self.exceeded('depth', self.max_depth)
+        self.steps += 1
+        if self.steps >= self.next_check:
+            self.check()
+        self.depth += 1
+
+    def chunks(self, iterations, start=CHUNK):
+        for first in range(start, len(iterations), self.CHUNK):
+            chunk = iterations[first:first + self.CHUNK]
+            self.charge(len(chunk))
+            yield chunk
+
+    def metered(self, iterations):
+        """Iterates over range of for loop charging every chunk before it runs, iterating itself costs nothing more"""
+        self.charge(min(len(iterations), self.CHUNK))
+        if len(iterations) <= self.CHUNK:
+            return iterations
+        return chain(iterations[:self.CHUNK], chain.from_iterable(self.chunks(iterations)))
+
+    def chunked(self, iterations):
+        """Ranges of CHUNK iterations of for loop, each charged before it runs. Transpiled loop iterates over
+        every range in inner loop, as fast as over range without budget"""
+        if len(iterations) <= self.CHUNK:
+            self.charge(len(iterations))
+            return iterations,
+        return self.chunks(iterations, 0)
+
+    def endless_chunks(self):
+        while True:
+            self.charge(self.CHUNK)
+            yield repeat((), self.CHUNK)
+
+    def ticks(self):
+        """Endless iterator of empty tuples charging every chunk before it runs. One such iterator is shared by all
+        while loops of transpiled program, they unpack nothing from it (`for () in ticks:`), check their condition
+        and break"""
+        return chain.from_iterable(self.endless_chunks())
+
+    @contextmanager
+    def active(self):
+        """Budget limits runs in the current thread or task inside of with block"""
+        self.started = perf_counter()
+        self.check()
+        token = Budget.current.set(self)
+        try:
+            yield self
+        finally:
+            Budget.current.reset(token)
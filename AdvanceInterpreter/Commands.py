@@ -1,26 +1,143 @@
-from VariableScopeClass import VariableScopeLocalAdvance
+from functools import lru_cache
+import io
+import multiprocessing
+import weakref
+from my_builtins import current_output, redirect_output
+from Budget import Budget
+from VariableScopeClass import VariableScope, Frame, UNSET, TailCall
 
 
 class Function:
 
-    class FunctionInvalidArgumentsException:
-        pass
+    on_tail_call = None  # set by Profiler to count self calls in tail position, which run as loop, as calls
+
+    class FunctionInvalidArgumentsException(Exception):
+        def __init__(self, expected, given):
+            self.expected, self.given = expected, given
+
+        def __repr__(self):
+            return 'Function takes {} arguments but {} were given'.format(self.expected, self.given)
 
-    def __init__(self, argument_names, ast, variable_scope):
+    def __init__(self, argument_names, ast, variable_scope, symbols):
         self.argument_names, self.ast = argument_names, ast
-        self.variable_scope = variable_scope
+        self.variable_scope, self.symbols = variable_scope, symbols
+
+    def execute(self, arguments_values, variable_scope):
+        if len(arguments_values) != self.symbols.arguments_count:
+            raise Function.FunctionInvalidArgumentsException(self.symbols.arguments_count, len(arguments_values))
+
+        budget = Budget.current.get()
+        if budget is not None:
+            budget.enter()
+            try:
+                return self.evaluate(*arguments_values)
+            finally:
+                budget.depth -= 1
+        return self.evaluate(*arguments_values)
+
+    def evaluate(self, *arguments_values):
+        result = self.ast.execute(Frame(self.symbols, self.variable_scope, arguments_values))
+        if result.__class__ is TailCall:
+            budget = Budget.current.get()
+            while result.__class__ is TailCall:
+                if budget is not None:
+                    budget.charge()
+                if self.on_tail_call is not None:
+                    self.on_tail_call()
+                result = self.ast.execute(Frame(self.symbols, self.variable_scope, result.arguments))
+        return result
+
+    async def execute_async(self, arguments_values, variable_scope):
+        """The same as execute in code running on asyncio, functions called by body are awaited"""
+        if len(arguments_values) != self.symbols.arguments_count:
+            raise Function.FunctionInvalidArgumentsException(self.symbols.arguments_count, len(arguments_values))
+
+        budget = Budget.current.get()
+        if budget is not None:
+            budget.enter()
+        try:
+            result = await self.ast.execute_async(Frame(self.symbols, self.variable_scope, arguments_values))
+            while result.__class__ is TailCall:
+                if budget is not None:
+                    budget.charge()
+                result = await self.ast.execute_async(Frame(self.symbols, self.variable_scope, result.arguments))
+            return result
+        finally:
+            if budget is not None:
+                budget.depth -= 1
+
+
+class MemoizedFunction(Function):
+    """fn proven pure by compiler, results are cached by values and types of arguments in LRU of bounded size"""
+
+    instances = weakref.WeakSet()  # memoized functions alive, for statistics
+
+    def __init__(self, argument_names, ast, variable_scope, symbols, name, cache_size):
+        super().__init__(argument_names, ast, variable_scope, symbols)
+        self.name = name
+        self.cached = lru_cache(maxsize=cache_size, typed=True)(self.evaluate)
+        MemoizedFunction.instances.add(self)
 
     def execute(self, arguments_values, variable_scope):
-        variable_scope = self.variable_scope
-        local_variables = VariableScopeLocalAdvance(variable_scope, [])
+        if len(arguments_values) != self.symbols.arguments_count:
+            raise Function.FunctionInvalidArgumentsException(self.symbols.arguments_count, len(arguments_values))
+
+        budget = Budget.current.get()
+        if budget is not None:
+            budget.enter()
+            try:
+                return self.evaluate_cached(*arguments_values)
+            finally:
+                budget.depth -= 1
+        return self.evaluate_cached(*arguments_values)
+
+    async def execute_async(self, arguments_values, variable_scope):
+        # pure functions neither read input nor call def functions, nothing in them waits
+        return self.execute(arguments_values, variable_scope)
 
-        if len(arguments_values) != len(self.argument_names):
-            raise Function.FunctionInvalidArgumentsException
+    def evaluate_cached(self, *arguments_values):
+        try:
+            return self.cached(*arguments_values)
+        except TypeError:
+            if MemoizedFunction.hashable(arguments_values):
+                raise
+            return self.evaluate(*arguments_values)
+
+    @staticmethod
+    def hashable(values):
+        try:
+            hash(tuple(values))
+        except TypeError:
+            return False
+        return True
 
-        for key, value in zip(self.argument_names, arguments_values):
-            local_variables.admin_set_variable(key, value)
+    @staticmethod
+    def memoize(name, function, cache_size):
+        """Same caching for plain python function"""
+        cached = lru_cache(maxsize=cache_size, typed=True)(function)
 
-        return self.ast.execute(local_variables)
+        def memoized(*arguments_values):
+            try:
+                return cached(*arguments_values)
+            except TypeError:
+                if MemoizedFunction.hashable(arguments_values):
+                    raise
+                return function(*arguments_values)
+
+        memoized.name, memoized.cached = name, cached
+        MemoizedFunction.instances.add(memoized)
+        return memoized
+
+    @staticmethod
+    def statistics():
+        """Returns {function name: [hits, misses, cached results]} over memoized functions alive"""
+        statistics = {}
+        for function in list(MemoizedFunction.instances):
+            info = function.cached.cache_info()
+            counters = statistics.setdefault(function.name, [0, 0, 0])
+            for i, value in enumerate((info.hits, info.misses, info.currsize)):
+                counters[i] += value
+        return statistics
 
 
 class ReturnException(Exception):
@@ -30,111 +147,153 @@ class ReturnException(Exception):
 
 class FunctionAdvance:
 
+    on_tail_call = None  # the same as in Function
+
     class NullReturnException(Exception):
         pass
 
-    def __init__(self, argument_names, with_vars, commands, variable_scope):
+    def __init__(self, argument_names, with_vars, commands, variable_scope, symbols):
         self.argument_names, self.with_vars, self.commands = argument_names, with_vars, commands
-        self.variable_scope = variable_scope
+        self.variable_scope, self.symbols = variable_scope, symbols
+        self.unset_locals = [UNSET] * (symbols.size - symbols.arguments_count)
 
-    def execute(self, arguments_values, variable_scope):
-        variable_scope = self.variable_scope
-        local_variables = VariableScopeLocalAdvance(variable_scope, self.with_vars)
+    def create_local_variables(self, arguments_values):
+        if len(arguments_values) != self.symbols.arguments_count:
+            raise Function.FunctionInvalidArgumentsException(self.symbols.arguments_count, len(arguments_values))
 
-        if len(arguments_values) != len(self.argument_names):
-            raise Function.FunctionInvalidArgumentsException
+        return Frame(self.symbols, self.variable_scope, arguments_values + self.unset_locals)
 
-        for key, value in zip(self.argument_names, arguments_values):
-            local_variables.admin_set_variable(key, value)
+    def execute(self, arguments_values, variable_scope):
+        budget = Budget.current.get()
+        if budget is not None:
+            budget.enter()
+            try:
+                return self.run(arguments_values, budget)
+            finally:
+                budget.depth -= 1
+        return self.run(arguments_values)
 
-        for command in self.commands:
-            command.set_scope(local_variables)
+    def run(self, arguments_values, budget=None):
+        while True:
+            local_variables = self.create_local_variables(arguments_values)
 
-        try:
-            for command in self.commands:
-                command.execute()
-        except ReturnException as return_value:
-            return return_value.data
+            try:
+                for command in self.commands:
+                    command.execute(local_variables)
+            except ReturnException as return_value:
+                if return_value.data.__class__ is not TailCall:
+                    return return_value.data
+                arguments_values = return_value.data.arguments
+                if budget is not None:
+                    budget.charge()
+                if self.on_tail_call is not None:
+                    self.on_tail_call()
+                continue
 
-        #raise self.NullReturnException
-        return None
+            #raise self.NullReturnException
+            return None
 
 
 class Command:
-    def __init__(self, variable_scope):
-        self.variable_scope = variable_scope
+    """Commands keep no scope, the active one is passed to execute, so the same commands can run in many frames"""
 
-    def set_scope(self, new_variable_scope):
-        self.variable_scope = new_variable_scope
+    line = None  # number of line in source
 
-    def execute(self):
+    def execute(self, variable_scope):
         pass
 
+    def resolve(self, symbols):
+        """Binds names of expressions to symbols of enclosing function (None at top level), returns command to use"""
+        return self
+
 
 class SetVariableCommand(Command):
-    def __init__(self, variable_scope, var_name, ast):
-        super().__init__(variable_scope)
+    def __init__(self, var_name, ast):
         self.var_name, self.ast = var_name, ast
 
-    def execute(self):
-        self.variable_scope.set(self.var_name, self.ast.execute(self.variable_scope))
+    def execute(self, variable_scope):
+        variable_scope.set(self.var_name, self.ast.execute(variable_scope))
+
+    def resolve(self, symbols):
+        self.ast.resolve(symbols)
+        if symbols is not None and self.var_name in symbols.slots:
+            command = SetLocalCommand(self.var_name, self.ast, symbols.slots[self.var_name])
+            command.line = self.line
+            return command
+        return self
+
+
+class SetLocalCommand(SetVariableCommand):
+    def __init__(self, var_name, ast, slot):
+        super().__init__(var_name, ast)
+        self.slot = slot
+
+    def execute(self, variable_scope):
+        variable_scope.slots[self.slot] = self.ast.execute(variable_scope)
 
 
 class CreateFunctionCommand(Command):
-    def __init__(self, variable_scope, func_name, args, ast):
-        super().__init__(variable_scope)
-        self.func_name, self.args, self.ast = func_name, args, ast
+    def __init__(self, func_name, args, ast, symbols):
+        self.func_name, self.args, self.ast, self.symbols = func_name, args, ast, symbols
+        self.memo_size = None  # set by compiler for pure functions
+
+    def create(self, variable_scope):
+        if self.memo_size is None:
+            return Function(self.args, self.ast, variable_scope, self.symbols)
+        return MemoizedFunction(self.args, self.ast, variable_scope, self.symbols, self.func_name, self.memo_size)
+
+    def execute(self, variable_scope):
+        variable_scope.set(self.func_name, self.create(variable_scope))
 
-    def execute(self):
-        self.variable_scope.set(self.func_name,
-                                Function(self.args, self.ast, self.variable_scope))
+    def resolve(self, symbols):
+        self.ast.resolve(self.symbols)
+        return self
 
 
 class BlockCommand(Command):
-    def __init__(self, variable_scope, commands):
-        super().__init__(variable_scope)
+    def __init__(self, commands):
         self.commands = commands
 
-    def set_scope(self, new_variable_scope):
-        super().set_scope(new_variable_scope)
+    def execute_inner(self, variable_scope):
         for command in self.commands:
-            command.set_scope(new_variable_scope)
+            command.execute(variable_scope)
 
-    def execute_inner(self):
-        for command in self.commands:
-            command.execute()
+    def resolve(self, symbols):
+        self.commands = [command.resolve(symbols) for command in self.commands]
+        return self
 
 
 class CreateAdvanceFunctionCommand(BlockCommand):
-    def __init__(self, func_name, args, with_vars, variable_scope, commands):
-        super().__init__(variable_scope, commands)
-        self.func_name, self.args, self.with_vars = func_name, args, with_vars
+    def __init__(self, func_name, args, with_vars, commands, symbols):
+        super().__init__(commands)
+        self.func_name, self.args, self.with_vars, self.symbols = func_name, args, with_vars, symbols
+
+    def execute(self, variable_scope):
+        variable_scope.set(self.func_name, FunctionAdvance(self.args, self.with_vars, self.commands, variable_scope,
+                                                           self.symbols))
 
-    def execute(self):
-        self.variable_scope.set(self.func_name,
-                                FunctionAdvance(self.args, self.with_vars, self.commands, self.variable_scope))
+    def resolve(self, symbols):
+        return super().resolve(self.symbols)
 
 
 class ReturnCommand(Command):
-    def __init__(self, variable_scope, ast):
-        super().__init__(variable_scope)
+    def __init__(self, ast):
         self.ast = ast
 
-    def execute(self):
-        raise ReturnException(self.ast.execute(self.variable_scope))
+    def execute(self, variable_scope):
+        raise ReturnException(self.ast.execute(variable_scope))
+
+    def resolve(self, symbols):
+        self.ast.resolve(symbols)
+        return self
 
 
 class IfCommand(BlockCommand):
-    def __init__(self, variable_scope, condition_ast, commands):
-        super().__init__(variable_scope, commands)
+    def __init__(self, condition_ast, commands):
+        super().__init__(commands)
         self.condition_ast = condition_ast
         self.next_if_command = None
 
-    def set_scope(self, new_variable_scope):
-        super().set_scope(new_variable_scope)
-        if self.next_if_command:
-            self.next_if_command.set_scope(new_variable_scope)
-
     def hook_up(self, next_if_command):
         self.next_if_command = next_if_command
 
@@ -143,54 +302,140 @@ class IfCommand(BlockCommand):
             return self
         return self.next_if_command.end()
 
-    def execute(self):
-        if self.condition_ast.execute(self.variable_scope):
-            self.execute_inner()
+    def execute(self, variable_scope):
+        if self.condition_ast.execute(variable_scope):
+            self.execute_inner(variable_scope)
         elif self.next_if_command:
-            self.next_if_command.execute()
+            self.next_if_command.execute(variable_scope)
 
+    def resolve(self, symbols):
+        self.condition_ast.resolve(symbols)
+        if self.next_if_command:
+            self.next_if_command.resolve(symbols)
+        return super().resolve(symbols)
 
-class BreakCommand:
+
+class BreakCommand(Command):
 
     class BreakException(Exception):
         pass
 
-    def execute(self):
+    def execute(self, variable_scope):
         raise BreakCommand.BreakException
 
 
-class ContinueCommand:
+class ContinueCommand(Command):
 
     class ContinueException(Exception):
         pass
 
-    def execute(self):
+    def execute(self, variable_scope):
         raise ContinueCommand.ContinueException
 
 
-class WhileCommand(BlockCommand):
+class LoopCommand(BlockCommand):
+    """While or for loop. Loop optimizer may hoist invariant expressions out of its body, they are computed into
+    hidden variables before the first iteration, once loop as written checked its condition or range, so loop
+    which runs no iterations computes nothing. The loop as written is kept as original, it runs instead when they
+    fail or read or give values which may change without assignment, like lists and arrays"""
+
+    IMMUTABLE = frozenset((int, float, str, bool))
+
+    hoisted = ()  # [(hidden variable name, AST, names of variables it reads)]
+    original = None
 
-    def __init__(self, variable_scope, condition_ast, commands):
-        super().__init__(variable_scope, commands)
+    @staticmethod
+    def immutable(*values):
+        return all(value.__class__ in LoopCommand.IMMUTABLE for value in values)
+
+    def hoist(self, variable_scope):
+        """Sets hidden variables, returns False when original loop must run instead"""
+        try:
+            values = [ast.execute(variable_scope) for _, ast, _ in self.hoisted]
+            if not self.immutable(*values, *(variable_scope.get(name) for _, _, names in self.hoisted
+                                             for name in names)):
+                return False
+        except Exception:
+            return False
+        for (name, _, _), value in zip(self.hoisted, values):
+            variable_scope.set(name, value)
+        return True
+
+    def resolve(self, symbols):
+        for _, ast, _ in self.hoisted:
+            ast.resolve(symbols)
+        if self.original is not None:
+            self.original = self.original.resolve(symbols)
+        return super().resolve(symbols)
+
+
+class WhileCommand(LoopCommand):
+
+    def __init__(self, condition_ast, commands):
+        super().__init__(commands)
         self.condition_ast = condition_ast
 
-    def execute(self):
-        while self.condition_ast.execute(self.variable_scope):
+    def execute(self, variable_scope):
+        if self.original is None:
+            return self.run(variable_scope)
+        if self.original.condition_ast.execute(variable_scope):
+            (self if self.hoist(variable_scope) else self.original).run(variable_scope, True)
+
+    def run(self, variable_scope, entered=False):
+        """Runs the loop, entered one does not check condition before the first iteration"""
+        budget = Budget.current.get()
+        if budget is not None:
+            return self.execute_metered(variable_scope, budget, entered)
+        if entered and not self.first_iteration(variable_scope):
+            return
+        while self.condition_ast.execute(variable_scope):
             try:
-                self.execute_inner()
+                self.execute_inner(variable_scope)
             except ContinueCommand.ContinueException:
                 continue
             except BreakCommand.BreakException:
                 break
 
+    def first_iteration(self, variable_scope):
+        """Runs body once, returns False when it breaks the loop"""
+        try:
+            self.execute_inner(variable_scope)
+        except ContinueCommand.ContinueException:
+            pass
+        except BreakCommand.BreakException:
+            return False
+        return True
+
+    def execute_metered(self, variable_scope, budget, entered):
+        steps = int(entered)
+        if entered and not self.first_iteration(variable_scope):
+            budget.charge(steps)
+            return
+        while self.condition_ast.execute(variable_scope):
+            steps += 1
+            if steps == budget.CHUNK:
+                budget.charge(steps)
+                steps = 0
+            try:
+                self.execute_inner(variable_scope)
+            except ContinueCommand.ContinueException:
+                continue
+            except BreakCommand.BreakException:
+                break
+        budget.charge(steps)
+
+    def resolve(self, symbols):
+        self.condition_ast.resolve(symbols)
+        return super().resolve(symbols)
+
 
-class ForCommand(BlockCommand):
+class ForCommand(LoopCommand):
 
     UP = 'UP'
     DOWN = 'DOWN'
 
-    def __init__(self, variable_scope, var_name, from_ast, to_ast, commands, direction):
-        super().__init__(variable_scope, commands)
+    def __init__(self, var_name, from_ast, to_ast, commands, direction):
+        super().__init__(commands)
         self.var_name, self.from_ast, self.to_ast = var_name, from_ast, to_ast
         self.direction = direction
 
@@ -199,24 +444,193 @@ class ForCommand(BlockCommand):
             return range(int(from_value), int(to_value)+1)
         return range(int(from_value), int(to_value)-1, -1)
 
-    def execute(self):
-        from_value = self.from_ast.execute(self.variable_scope)
-        to_value = self.to_ast.execute(self.variable_scope)
+    def iterations(self, from_value, to_value):
         if from_value <= to_value and self.direction == 'UP' or from_value >= to_value and self.direction == 'DOWN':
-            for iterable_value in self.generate_range(from_value, to_value):
-                try:
-                    self.variable_scope.set(self.var_name, iterable_value)
-                    self.execute_inner()
-                except ContinueCommand.ContinueException:
-                    continue
-                except BreakCommand.BreakException:
-                    break
+            return self.generate_range(from_value, to_value)
+        return range(0)
+
+    def execute(self, variable_scope):
+        from_value = self.from_ast.execute(variable_scope)
+        to_value = self.to_ast.execute(variable_scope)
+        iterations = self.iterations(from_value, to_value)
+        if self.original is None or not iterations:
+            return self.run(iterations, variable_scope)
+        (self if self.hoist(variable_scope) else self.original).run(iterations, variable_scope)
+
+    def run(self, iterations, variable_scope):
+        budget = Budget.current.get()
+        if budget is not None:
+            iterations = budget.metered(iterations)
+        for iterable_value in iterations:
+            try:
+                variable_scope.set(self.var_name, iterable_value)
+                self.execute_inner(variable_scope)
+            except ContinueCommand.ContinueException:
+                continue
+            except BreakCommand.BreakException:
+                break
+
+    def resolve(self, symbols):
+        self.from_ast.resolve(symbols)
+        self.to_ast.resolve(symbols)
+        return super().resolve(symbols)
+
+
+class ParallelForCommand(ForCommand):
+    """`parallel for` loop, chunks of its iterations run in forked worker processes and share nothing.
+    Variables assigned in the body are private to a worker, except reduction variables listed after `with`:
+    every chunk starts them from identity of reduction and their partial results are merged in order of chunks
+    into the enclosing scope. Output printed by workers follows in the same order"""
+
+    class SharedVariableException(Exception):
+        def __init__(self, var_name, line):
+            self.var_name, self.line = var_name, line
+
+        def __repr__(self):
+            return 'Variable {} is assigned in parallel for on line {} and outside of it, declare it as ' \
+                   'reduction after `with`'.format(self.var_name, self.line)
+
+    class BreakInParallelLoopException(Exception):
+        def __repr__(self):
+            return 'break can not be used in parallel for'
+
+    class ParallelLoopInFunctionException(Exception):
+        def __repr__(self):
+            return 'parallel for can not be used inside function'
+
+    class InvalidReductionException(Exception):
+        def __init__(self, reduction):
+            self.reduction = reduction
+
+        def __repr__(self):
+            return 'Invalid reduction {}, expected one of {} with variable name in brackets'.format(
+                self.reduction.strip(), ', '.join(ParallelForCommand.REDUCTIONS))
+
+    # reduction -> (partial result at start of chunk from value before loop, merging of two results)
+    REDUCTIONS = {'sum': (lambda initial: 0, lambda left, right: left + right),
+                  'list': (lambda initial: [], lambda left, right: left + right),
+                  'min': (lambda initial: initial, lambda left, right: right if right < left else left),
+                  'max': (lambda initial: initial, lambda left, right: right if right > left else left)}
+
+    CHUNKS_PER_WORKER = 4
+
+    workers = None  # processes running one loop, number of cpus when None
+    running = None  # loop being run, forked workers inherit it
+
+    def __init__(self, var_name, from_ast, to_ast, commands, direction, reductions, assigned_names):
+        super().__init__(var_name, from_ast, to_ast, commands, direction)
+        self.reductions = reductions  # [(reduction, variable name)]
+        self.assigned_names = assigned_names  # names bound in the body, private to workers
+
+    def execute(self, variable_scope):
+        def run_iteration(value):
+            variable_scope.set(self.var_name, value)
+            try:
+                self.execute_inner(variable_scope)
+            except ContinueCommand.ContinueException:
+                pass
+
+        from_value = self.from_ast.execute(variable_scope)
+        to_value = self.to_ast.execute(variable_scope)
+        self.run_parallel(self.iterations(from_value, to_value), run_iteration, variable_scope.get, variable_scope.set,
+                          variable_scope.delete)
+
+    @staticmethod
+    def can_fork():
+        # workers of pools are daemons and can not start processes, nested loops run sequentially there
+        return 'fork' in multiprocessing.get_all_start_methods() and not multiprocessing.current_process().daemon
+
+    def run_chunk(self, iterations, run_iteration, load, store, initial):
+        """Runs iterations, returns partial results of reductions"""
+        for (reduction, var_name), value in zip(self.reductions, initial):
+            store(var_name, self.REDUCTIONS[reduction][0](value))
+        budget = Budget.current.get()
+        if budget is not None:
+            # worker processes meter their chunks from the steps made before the loop, their steps are not summed
+            iterations = budget.metered(iterations)
+        for value in iterations:
+            run_iteration(value)
+        return [load(var_name) for _, var_name in self.reductions]
+
+    @staticmethod
+    def run_worker_chunk(iterations):
+        """Runs chunk in worker, returns partial results of reductions and printed output"""
+        command, run_iteration, load, store, initial = ParallelForCommand.running
+        output = io.StringIO()
+        with redirect_output(output):
+            partial = command.run_chunk(iterations, run_iteration, load, store, initial)
+        return partial, output.getvalue()
+
+    def run_private(self, iterations, run_iteration, load, store, delete, initial):
+        """Runs iterations in this process as in one worker: afterwards names private to the body have values
+        from before the loop again or are deleted"""
+        reduction_names = [var_name for _, var_name in self.reductions]
+        private_names = [name for name in self.assigned_names if name not in reduction_names]
+        saved = {}
+        for name in private_names:
+            try:
+                saved[name] = load(name)
+            except VariableScope.UndefinedVariable:
+                pass
+        try:
+            return self.run_chunk(iterations, run_iteration, load, store, initial)
+        finally:
+            for name in private_names:
+                if name in saved:
+                    store(name, saved[name])
+                else:
+                    delete(name)
+
+    def run_parallel(self, iterations, run_iteration, load, store, delete):
+        """Runs iterations by run_iteration(value), reduction variables are read and written by load(name)
+        and store(name, value) of the engine, private names of loop run in this process are deleted by
+        delete(name)"""
+        initial = [load(var_name) for _, var_name in self.reductions]
+        workers = min(self.workers or multiprocessing.cpu_count(), len(iterations))
+        if workers < 2 or not self.can_fork():
+            partials = [self.run_private(iterations, run_iteration, load, store, delete, initial)]
+        else:
+            chunk_size = -(-len(iterations) // (workers * self.CHUNKS_PER_WORKER))
+            chunks = [iterations[start:start + chunk_size] for start in range(0, len(iterations), chunk_size)]
+            current_output.get().flush()  # otherwise every worker would print text collected before the loop
+            ParallelForCommand.running = (self, run_iteration, load, store, initial)
+            try:
+                with multiprocessing.get_context('fork').Pool(workers) as pool:
+                    results = pool.map(ParallelForCommand.run_worker_chunk, chunks)
+            finally:
+                ParallelForCommand.running = None
+            partials = []
+            for partial, output in results:
+                current_output.get().write(output)
+                partials.append(partial)
+
+        for (reduction, var_name), value, *partial_values in zip(self.reductions, initial, *partials):
+            merge = self.REDUCTIONS[reduction][1]
+            for partial_value in partial_values:
+                value = merge(value, partial_value)
+            store(var_name, value)
+
+    @staticmethod
+    def find_break(commands):
+        """Whether break of loop itself is among commands, breaks of nested loops are not"""
+        for command in commands:
+            if isinstance(command, BreakCommand):
+                return True
+            if isinstance(command, IfCommand):
+                while command is not None:
+                    if ParallelForCommand.find_break(command.commands):
+                        return True
+                    command = command.next_if_command
+        return False
 
 
 class ExpressionCommand(Command):
-    def __init__(self, variable_scope, ast):
-        super().__init__(variable_scope)
+    def __init__(self, ast):
         self.ast = ast
 
-    def execute(self):
-        self.ast.execute(self.variable_scope)
+    def execute(self, variable_scope):
+        self.ast.execute(variable_scope)
+
+    def resolve(self, symbols):
+        self.ast.resolve(symbols)
+        return self
@@ -0,0 +1,96 @@
+import gc
+import hashlib
+import os
+import pickle
+import sys
+
+
+class CompilationCache:
+    """Stores compiled programs in `__aicache__` next to the source file (or in cache_dir).
+    Entry is keyed by hash of the source, compile options and the interpreter itself, so any change invalidates it"""
+
+    DIRECTORY = '__aicache__'
+
+    _interpreter_version = None
+
+    def __init__(self, source_path, cache_dir=None):
+        self.source_path = os.path.abspath(source_path)
+        self.cache_dir = cache_dir or os.path.join(os.path.dirname(self.source_path), self.DIRECTORY)
+
+    @staticmethod
+    def interpreter_version():
+        """Hash of python version and of every module of the interpreter, computed once per process"""
+        if CompilationCache._interpreter_version is None:
+            digest = hashlib.sha256(sys.version.encode())
+            root = os.path.dirname(os.path.abspath(__file__))
+            for directory in (root, os.path.join(root, 'expression_builder')):
+                for file_name in sorted(os.listdir(directory)):
+                    if file_name.endswith('.py'):
+                        with open(os.path.join(directory, file_name), 'rb') as f:
+                            digest.update(file_name.encode() + f.read())
+            CompilationCache._interpreter_version = digest.hexdigest()
+        return CompilationCache._interpreter_version
+
+    def key(self, source_code, options):
+        digest = hashlib.sha256(self.interpreter_version().encode())
+        digest.update(repr(sorted(options.items())).encode())
+        digest.update(source_code.encode())
+        return digest.hexdigest()[:32]
+
+    def prefix(self):
+        # different sources with the same name in one cache directory must not evict each other
+        path_hash = hashlib.sha256(self.source_path.encode()).hexdigest()[:8]
+        return '{}.{}.'.format(os.path.basename(self.source_path), path_hash)
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, self.prefix() + key + '.pickle')
+
+    def load(self, key):
+        """Returns cached compiled program or None when there is no valid entry"""
+        try:
+            with open(self.entry_path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        gc.disable()
+        try:
+            compiled = pickle.loads(data)
+        except Exception:
+            # entry written by other version of classes or damaged, it will be overwritten
+            return None
+        finally:
+            gc.enable()
+        # loaded program lives until exit, collector should not traverse it again and again while it runs
+        gc.freeze()
+        return compiled
+
+    def store(self, key, compiled):
+        """Writes entry atomically and removes stale entries of the same source, failures are ignored"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            data = pickle.dumps(compiled, pickle.HIGHEST_PROTOCOL)
+            path = self.entry_path(key)
+            temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+            with open(temporary_path, 'wb') as f:
+                f.write(data)
+            os.replace(temporary_path, path)
+
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.startswith(self.prefix()) and not file_name.endswith('.tmp') and \
+                        os.path.join(self.cache_dir, file_name) != path:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+        except (OSError, pickle.PicklingError, TypeError, RecursionError):
+            return False
+        return True
+
+    def get_or_compile(self, source_code, options, compile_program):
+        """Returns (compiled program, True if it was loaded from cache)"""
+        key = self.key(source_code, options)
+        compiled = self.load(key)
+        if compiled is not None:
+            return compiled, True
+
+        compiled = compile_program()
+        self.store(key, compiled)
+        return compiled, False
@@ -0,0 +1,372 @@
+from expression_builder import build_ast
+from expression_builder.useful import ASTtoString
+from collections import Counter
+import gc
+import re
+import sys
+from VariableScopeClass import VariableScope, SymbolTable
+from my_builtins import BuiltInFunction
+from ASTwithCalculation import AST
+from ASTOptimizer import ASTOptimizer
+from LoopOptimizer import LoopOptimizer
+from DeadCodeEliminator import DeadCodeEliminator
+from Commands import *
+
+
+class Compiled:
+    def __init__(self, compiled_commands):
+        self.compiled_commands = compiled_commands
+
+    def run(self, variables=None):
+        """Runs program with given variables set beforehand, returns global variables after the run.
+        Every run has its own scope, so program can run in many threads at once"""
+        variable_scope = VariableScope()
+        if variables:
+            variable_scope.vars.update(variables)
+        for cmd in self.compiled_commands:
+            cmd.execute(variable_scope)
+        return variable_scope.visible_vars()
+
+
+class Compiler:
+
+    class InvalidLineException(Exception):
+        pass
+
+    class InvalidElifException(Exception):
+        pass
+
+    def __init__(self, text, fold_constants=True, dump_ast=False, memoize=True, memo_size=4096, tail_calls=True,
+                 static_builtins=True, expression_cache=None, optimize_loops=True, eliminate_dead_code=True,
+                 dump_dead_code=False, seeded_names=()):
+        numbered_lines = [(number, self.prepare_line(line)) for number, line in enumerate(text.split('\n'), 1)]
+        numbered_lines = [(number, line) for number, line in numbered_lines if line[1]]
+        self.lines = [line for _, line in numbered_lines]
+        self.line_numbers = [number for number, _ in numbered_lines]  # in source, for profiler
+        self.block_ends = self.index_blocks(self.lines)
+        self.fold_constants, self.dump_ast = fold_constants, dump_ast
+        self.assigned_names = [{}]  # names assigned in every function body being compiled, outermost first
+        # how many times every name is assigned anywhere in program, names seeded before run count as assigned
+        self.bound_names = Counter(seeded_names)
+        self.symbol_tables = []
+        self.memoize, self.memo_size, self.tail_calls = memoize, memo_size, tail_calls
+        self.static_builtins = static_builtins
+        self.optimize_loops = optimize_loops  # hoist invariant expressions out of loops
+        self.eliminate_dead_code, self.dump_dead_code = eliminate_dead_code, dump_dead_code
+        self.removed = []  # (line, description) of code removed as dead
+        self.expression_cache = expression_cache  # source of expression -> optimized ast, shared between compilers
+        self.lambdas, self.advance_functions = [], []
+        self.parallel_loops, self.parallel_depth = [], 0
+        self.parallel_bound_names = Counter()  # assignments inside bodies of outermost parallel loops
+
+    @staticmethod
+    def shadowed_builtins(variables):
+        """Names of builtins among variables set before run. Program run with them must be compiled with them as
+        seeded_names, otherwise functions would still bind the builtins and memoize on them"""
+        return frozenset(name for name in variables or () if name in BuiltInFunction.arr)
+
+    @staticmethod
+    def replace_tabulation(line):
+        return line.replace('\t', '    ')
+
+    @staticmethod
+    def remove_comment(line):
+        if '#' in line:
+            return line[:line.index('#')]
+        return line
+
+    @staticmethod
+    def add_level(line):
+        spaces = re.search(r'^(    )*', line).group()
+        return len(spaces)//4, line.strip()
+
+    def prepare_line(self, line):
+        return self.add_level(self.replace_tabulation(self.remove_comment(line)))
+
+    def build_expression(self, expression, condition=False):
+        if self.expression_cache is not None and expression in self.expression_cache:
+            # asts are never changed in place, so one can be shared
+            return AST(self.expression_cache[expression], condition)
+        ast = build_ast(expression)
+        optimized_ast = ASTOptimizer(ast, self.fold_constants).optimize()
+        if self.dump_ast:
+            print('{}  =>  {}'.format(ASTtoString(ast).convert(), ASTtoString(optimized_ast).convert()), file=sys.stderr)
+        if self.expression_cache is not None:
+            self.expression_cache[expression] = optimized_ast
+        return AST(optimized_ast, condition)
+
+    @staticmethod
+    def index_blocks(lines):
+        """block_ends[i] is the index of the first line after lines[i] which level is not deeper, found in one pass"""
+        block_ends, opened = [len(lines)] * len(lines), []
+        for j, (level, _) in enumerate(lines):
+            while opened and lines[opened[-1]][0] >= level:
+                block_ends[opened.pop()] = j
+            opened.append(j)
+        return block_ends
+
+    def bind(self, *names):
+        for name in names:
+            self.assigned_names[-1][name] = None
+        self.bound_names.update(names)
+
+    def create_symbol_table(self, argument_names, local_names):
+        self.bound_names.update(argument_names)
+        symbols = SymbolTable(argument_names, local_names)
+        self.symbol_tables.append(symbols)
+        return symbols
+
+    def compile_block(self, i):
+        return self.compile(i + 1, self.block_ends[i], in_commands=True), self.block_ends[i]
+
+    def compile_fn(self, match, i, commands):
+        (func_name, arguments), ast = match.group(1, 2), self.build_expression(match.group(5))
+        args = re.findall(r'[a-zA-Z_]\w*', arguments)
+        self.bind(func_name)
+        commands.append(CreateFunctionCommand(func_name, args, ast, self.create_symbol_table(args, [])))
+        self.lambdas.append(commands[-1])
+        return i + 1
+
+    def compile_def(self, match, i, commands):
+        func_name, arguments, with_vars = match.group(1, 2, 5)
+
+        args = re.findall(r'[a-zA-Z_]\w*', arguments or '')
+        with_vars = re.findall(r'[a-zA-Z_]\w*', with_vars or '')
+
+        self.bind(func_name)
+        self.assigned_names.append({})
+        block, end_of_block = self.compile_block(i)
+        local_names = [name for name in self.assigned_names.pop() if name not in with_vars]
+        self.bind(*with_vars)
+
+        symbols = self.create_symbol_table(args, local_names)
+        commands.append(CreateAdvanceFunctionCommand(func_name, args, with_vars, block, symbols))
+        self.advance_functions.append(commands[-1])
+        return end_of_block
+
+    def compile_return(self, match, i, commands):
+        commands.append(ReturnCommand(self.build_expression(match.group(1))))
+        return i + 1
+
+    def compile_if(self, match, i, commands):
+        ast = self.build_expression(match.group(1), True)
+        block, end_of_block = self.compile_block(i)
+        commands.append(IfCommand(ast, block))
+        return end_of_block
+
+    def compile_elif(self, match, i, commands):
+        ast = self.build_expression(match.group(1) if match.groups() else '1', True)
+        block, end_of_block = self.compile_block(i)
+        cmd = IfCommand(ast, block)
+        cmd.line = self.line_numbers[i]
+
+        if len(commands) > 0 and isinstance(commands[-1], IfCommand):
+            commands[-1].end().hook_up(cmd)
+        else:
+            raise Compiler.InvalidElifException
+
+        return end_of_block
+
+    def compile_while(self, match, i, commands):
+        ast = self.build_expression(match.group(1), True)
+        block, end_of_block = self.compile_block(i)
+        commands.append(WhileCommand(ast, block))
+        return end_of_block
+
+    def compile_for(self, match, i, commands):
+        var_name, from_expr, direction, to_expr = match.group(1, 2, 3, 4)
+        from_ast, to_ast = self.build_expression(from_expr), self.build_expression(to_expr)
+        direction = ForCommand.UP if direction == 'to' else ForCommand.DOWN
+        self.bind(var_name)
+
+        block, end_of_block = self.compile_block(i)
+        commands.append(ForCommand(var_name, from_ast, to_ast, block, direction))
+        return end_of_block
+
+    REDUCTION = re.compile(r'\s*([a-zA-Z_]\w*)\s*\(\s*([a-zA-Z_]\w*)\s*\)\s*$')
+
+    def compile_parallel_for(self, match, i, commands):
+        var_name, from_expr, direction, to_expr, reductions = match.group(1, 2, 3, 4, 6)
+        if len(self.assigned_names) > 1:
+            raise ParallelForCommand.ParallelLoopInFunctionException
+        from_ast, to_ast = self.build_expression(from_expr), self.build_expression(to_expr)
+        direction = ForCommand.UP if direction == 'to' else ForCommand.DOWN
+
+        parsed_reductions = []
+        for reduction in reductions.split(',') if reductions else []:
+            reduction_match = self.REDUCTION.match(reduction)
+            if not reduction_match or reduction_match.group(1) not in ParallelForCommand.REDUCTIONS:
+                raise ParallelForCommand.InvalidReductionException(reduction)
+            parsed_reductions.append(reduction_match.group(1, 2))
+
+        bound_before = Counter(self.bound_names)
+        self.bind(var_name)
+        self.parallel_depth += 1
+        block, end_of_block = self.compile_block(i)
+        self.parallel_depth -= 1
+        if ParallelForCommand.find_break(block):
+            raise ParallelForCommand.BreakInParallelLoopException
+        body_bound_names = self.bound_names - bound_before
+        if not self.parallel_depth:
+            self.parallel_bound_names.update(body_bound_names)
+
+        commands.append(ParallelForCommand(var_name, from_ast, to_ast, block, direction, parsed_reductions,
+                                           list(body_bound_names)))
+        self.parallel_loops.append(commands[-1])
+        return end_of_block
+
+    def compile_break(self, match, i, commands):
+        commands.append(BreakCommand())
+        return i + 1
+
+    def compile_continue(self, match, i, commands):
+        commands.append(ContinueCommand())
+        return i + 1
+
+    ASSIGNMENT = re.compile(r'([a-zA-Z_]\w*)\s*=(.*)$')
+    KEYWORD = re.compile(r'[a-zA-Z_]\w*')
+
+    # leading keyword -> (pattern of the whole line, compiling method)
+    STATEMENTS = {'fn':       (re.compile(r'fn\s+([a-zA-Z_]\w*)\s*\((([a-zA-Z_]\w*(\s*,\s*[a-zA-Z_]\w*)*)?)\)\s*=>(.*)$'),
+                               compile_fn),
+                  'def':      (re.compile(r'def\s+([a-zA-Z_]\w*)\s*\(([a-zA-Z_]\w*(\s*,\s*[a-zA-Z_]\w*)*)?\)'
+                                          r'\s*(\s+with\s+([a-zA-Z_]\w*(\s*,\s*[a-zA-Z_]\w*)*))?:$'),
+                               compile_def),
+                  'return':   (re.compile(r'return\s+(.*)$'), compile_return),
+                  'if':       (re.compile(r'if\b(.*):$'), compile_if),
+                  'elif':     (re.compile(r'elif\b(.*):$'), compile_elif),
+                  'else':     (re.compile(r'else\s*:$'), compile_elif),
+                  'while':    (re.compile(r'while\b(.*):$'), compile_while),
+                  'for':      (re.compile(r'for\s+([a-zA-Z_]\w*)\s*=(.*)\s+(to|downto)\s+(.*):$'), compile_for),
+                  'parallel': (re.compile(r'parallel\s+for\s+([a-zA-Z_]\w*)\s*=(.*)\s+(to|downto)\s+(.*?)'
+                                          r'(\s+with\s+(.*))?:$'), compile_parallel_for),
+                  'break':    (re.compile(r'break$'), compile_break),
+                  'continue': (re.compile(r'continue$'), compile_continue)}
+
+    def compile(self, start=0, end=None, in_commands=False):
+        if not in_commands and gc.isenabled():
+            # compiling allocates only long living objects, tracing them only makes large programs superlinear
+            gc.disable()
+            try:
+                return self.compile(start, end, in_commands)
+            finally:
+                gc.enable()
+
+        end = len(self.lines) if end is None else end
+        commands = []
+
+        i = start
+        while i < end:
+            i = self.compile_statement(i, commands)
+
+        if in_commands:
+            return commands
+        return Compiled(self.resolve(commands))
+
+    def compile_statement(self, i, commands):
+        """Compiles statement starting on line i, returns index of the next one"""
+        priority, line = self.lines[i]
+        commands_count = len(commands)
+
+        if match := self.ASSIGNMENT.match(line):
+            var_name, ast = match.group(1), self.build_expression(match.group(2))
+            self.bind(var_name)
+            commands.append(SetVariableCommand(var_name, ast))
+            next_i = i + 1
+        elif (keyword := self.KEYWORD.match(line)) and \
+                (statement := self.STATEMENTS.get(keyword.group())) and (match := statement[0].match(line)):
+            next_i = statement[1](self, match, i, commands)
+        else:
+            commands.append(ExpressionCommand(self.build_expression(line)))
+            next_i = i + 1
+
+        if len(commands) > commands_count:
+            commands[-1].line = self.line_numbers[i]
+        return next_i
+
+    def resolve(self, commands):
+        """Binds names inside function bodies to slots once whole program is known"""
+        self.check_parallel_loops()
+        if self.eliminate_dead_code:
+            commands = self.remove_dead_code(commands)
+        builtins = {}
+        if self.static_builtins:
+            builtins = {name: builtin for name, builtin in BuiltInFunction.arr.items() if name not in self.bound_names}
+            for symbols in self.symbol_tables:
+                symbols.builtins = builtins
+        if self.tail_calls:
+            self.mark_tail_calls()
+        if self.memoize:
+            for command in self.pure_lambdas():
+                command.memo_size = self.memo_size
+        if self.optimize_loops:
+            # without static builtins any name called may be assigned later, loops calling them are not optimized
+            commands = LoopOptimizer(builtins).optimize(commands)
+        return [command.resolve(None) for command in commands]
+
+    def remove_dead_code(self, commands):
+        """Unused definitions are removed from lists of functions too, so later passes skip them"""
+        eliminator = DeadCodeEliminator()
+        commands = eliminator.eliminate(commands)
+        self.lambdas = [command for command in self.lambdas if command in eliminator.live]
+        self.advance_functions = [command for command in self.advance_functions if command in eliminator.live]
+        self.removed = sorted(eliminator.removed, key=lambda removed: removed[0])
+        if self.dump_dead_code:
+            for line, description in self.removed:
+                print('line {:>6}  removed {}'.format(line, description), file=sys.stderr)
+        return commands
+
+    def check_parallel_loops(self):
+        """Variables assigned in body of parallel for must not be assigned outside of parallel loops,
+        as workers can not change them, unless they are reductions"""
+        for command in self.parallel_loops:
+            reduction_names = [var_name for _, var_name in command.reductions]
+            for name in command.assigned_names:
+                if name != command.var_name and name not in reduction_names and \
+                        self.bound_names[name] > self.parallel_bound_names[name]:
+                    raise ParallelForCommand.SharedVariableException(name, command.line)
+
+    def is_self_call(self, command):
+        """Name of function refers to function itself inside its body, when it is bound only once"""
+        return self.bound_names[command.func_name] == 1 and command.func_name not in command.symbols.slots
+
+    def mark_tail_calls(self):
+        """Self calls in tail position become TAIL_CALL, function runs them as loop instead of recursion.
+        Expressions are compiled again by resolve, which runs right after"""
+        for command in self.lambdas:
+            if self.is_self_call(command):
+                command.ast.ast = AST.mark_tail_calls(command.ast.ast, command.func_name, len(command.args))[0]
+
+        for command in self.advance_functions:
+            if self.is_self_call(command):
+                self.mark_tail_returns(command.commands, command)
+
+    def mark_tail_returns(self, commands, function):
+        for command in commands:
+            if isinstance(command, ReturnCommand):
+                command.ast.ast = AST.mark_tail_calls(command.ast.ast, function.func_name, len(function.args))[0]
+            elif isinstance(command, IfCommand):
+                while command is not None:
+                    self.mark_tail_returns(command.commands, function)
+                    command = command.next_if_command
+            elif isinstance(command, (WhileCommand, ForCommand)):
+                self.mark_tail_returns(command.commands, function)
+
+    def pure_lambdas(self):
+        """fn functions which result depends only on arguments: they use only arguments, pure builtins never
+        shadowed and other pure fn functions, which names are defined once in whole program"""
+        pure = {command.func_name: command for command in self.lambdas if self.bound_names[command.func_name] == 1}
+
+        def is_pure(name, command):
+            if name in command.args or name in pure:
+                return True
+            return name not in self.bound_names and name in BuiltInFunction.arr and BuiltInFunction.arr[name].pure
+
+        changed = True
+        while changed:
+            changed = False
+            for name, command in list(pure.items()):
+                if not all(is_pure(used_name, command) for used_name in AST.read_names(command.ast.ast)):
+                    del pure[name]
+                    changed = True
+        return list(pure.values())
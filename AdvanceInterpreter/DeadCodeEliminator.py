@@ -0,0 +1,164 @@
+from ASTwithCalculation import AST
+from Commands import *
+
+
+class DeadCodeEliminator:
+    """Removes code which never runs or is never used: branches of if and while loops which conditions are
+    constant false, for loops over constant empty range, commands after return, break or continue, then
+    definitions of fn and def functions which names are never read. Names are followed from code at top level
+    through bodies of functions kept, like calls in call graph, regardless of scope: definition stays when any
+    kept code reads its name. Removed code is recorded as (line, description)"""
+
+    TERMINATING = (ReturnCommand, BreakCommand, ContinueCommand)
+
+    def __init__(self):
+        self.removed = []
+        self.live = set()  # definitions kept
+
+    def record(self, command, description):
+        self.removed.append((command.line, description))
+
+    def eliminate(self, commands):
+        commands = self.prune(commands)
+        self.live = self.live_definitions(commands)
+        return self.drop_definitions(commands)
+
+    @staticmethod
+    def truth(ast):
+        """Truth of condition known at compile time, None when it is not known"""
+        if 'value' not in ast.ast or ast.ast['value'].__class__ not in (int, float, str, bool):
+            return None
+        return bool(ast.ast['value'])
+
+    @staticmethod
+    def constant(ast):
+        value = ast.ast.get('value')
+        return value if value.__class__ in (int, float, bool) else None
+
+    def is_empty_loop(self, command):
+        if isinstance(command, WhileCommand):
+            return self.truth(command.condition_ast) is False
+        if isinstance(command, ParallelForCommand):
+            return False  # sets its reduction variables even without iterations
+        from_value, to_value = self.constant(command.from_ast), self.constant(command.to_ast)
+        return from_value is not None and to_value is not None and not command.iterations(from_value, to_value)
+
+    def prune(self, commands):
+        """Commands without dead branches, empty loops and unreachable commands"""
+        pruned = []
+        for i, command in enumerate(commands):
+            if isinstance(command, IfCommand):
+                pruned.extend(self.prune_if(command))
+            elif isinstance(command, (WhileCommand, ForCommand)) and self.is_empty_loop(command):
+                self.record(command, 'loop which never runs')
+            else:
+                if isinstance(command, BlockCommand):
+                    command.commands = self.prune(command.commands)
+                pruned.append(command)
+
+            if pruned and self.terminates(pruned[-1]) and i + 1 < len(commands):
+                unreachable = len(commands) - i - 1
+                self.record(commands[i + 1], '{} unreachable statement{}'.format(unreachable, 's' * (unreachable > 1)))
+                break
+        return pruned
+
+    def terminates(self, command):
+        """Whether command surely leaves its block by return, break or continue"""
+        if isinstance(command, self.TERMINATING):
+            return True
+        if not isinstance(command, IfCommand):
+            return False
+        while command.next_if_command is not None:
+            if not command.commands or not self.terminates(command.commands[-1]):
+                return False
+            command = command.next_if_command
+        return self.truth(command.condition_ast) is True and bool(command.commands) and \
+            self.terminates(command.commands[-1])
+
+    def prune_if(self, command):
+        """Commands replacing if chain: chain of branches which may run, commands of branch which surely runs
+        first or nothing"""
+        branches, branch = [], command
+        while branch is not None:
+            truth = self.truth(branch.condition_ast)
+            if truth is False:
+                self.record(branch, 'branch which never runs')
+            else:
+                branch.commands = self.prune(branch.commands)
+                branches.append(branch)
+            branch = branch.next_if_command
+            if truth:
+                while branch is not None:
+                    self.record(branch, 'branch which never runs')
+                    branch = branch.next_if_command
+
+        if not branches:
+            return []
+        if self.truth(branches[0].condition_ast):
+            return branches[0].commands
+        for previous, following in zip(branches, branches[1:] + [None]):
+            previous.next_if_command = following
+        return [branches[0]]
+
+    @staticmethod
+    def scan(commands, names, definitions):
+        """Collects names read by commands and definitions among them, bodies of definitions are not scanned"""
+        for command in commands:
+            if isinstance(command, (CreateFunctionCommand, CreateAdvanceFunctionCommand)):
+                definitions.append(command)
+                continue
+            if isinstance(command, (SetVariableCommand, ExpressionCommand, ReturnCommand)):
+                names.update(AST.read_names(command.ast.ast))
+            elif isinstance(command, IfCommand):
+                branch = command
+                while branch is not None:
+                    names.update(AST.read_names(branch.condition_ast.ast))
+                    DeadCodeEliminator.scan(branch.commands, names, definitions)
+                    branch = branch.next_if_command
+                continue
+            elif isinstance(command, WhileCommand):
+                names.update(AST.read_names(command.condition_ast.ast))
+            elif isinstance(command, ForCommand):
+                names.update(AST.read_names(command.from_ast.ast))
+                names.update(AST.read_names(command.to_ast.ast))
+            if isinstance(command, BlockCommand):
+                DeadCodeEliminator.scan(command.commands, names, definitions)
+
+    @staticmethod
+    def live_definitions(commands):
+        """Definitions reachable from code at top level through names read"""
+        used, waiting, live = set(), {}, set()  # waiting: name -> definitions found, which name is not read yet
+        units = [commands]  # code to scan: commands at top level and definitions found live
+        while units:
+            unit, names, definitions = units.pop(), set(), []
+            if isinstance(unit, CreateFunctionCommand):
+                names.update(AST.read_names(unit.ast.ast))
+            else:
+                DeadCodeEliminator.scan(unit.commands if isinstance(unit, CreateAdvanceFunctionCommand) else unit,
+                                        names, definitions)
+            for definition in definitions:
+                waiting.setdefault(definition.func_name, []).append(definition)
+            used.update(names)
+            for name in names | {definition.func_name for definition in definitions}:
+                if name in used:
+                    for definition in waiting.pop(name, ()):
+                        live.add(definition)
+                        units.append(definition)
+        return live
+
+    def drop_definitions(self, commands):
+        kept = []
+        for command in commands:
+            if isinstance(command, (CreateFunctionCommand, CreateAdvanceFunctionCommand)) and command not in self.live:
+                self.record(command, '{} {} which is never used'.format(
+                    'fn' if isinstance(command, CreateFunctionCommand) else 'def', command.func_name))
+                continue
+            if isinstance(command, IfCommand):
+                branch = command
+                while branch is not None:
+                    branch.commands = self.drop_definitions(branch.commands)
+                    branch = branch.next_if_command
+            elif isinstance(command, BlockCommand):
+                command.commands = self.drop_definitions(command.commands)
+            kept.append(command)
+        return kept
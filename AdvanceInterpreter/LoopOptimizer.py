@@ -0,0 +1,232 @@
+from ASTwithCalculation import AST
+from Commands import *
+
+
+class LoopOptimizer:
+    """Moves pure expressions which do not change inside of while and for loops out of them: they are computed
+    once before the loop into hidden variables, which are read instead on every iteration.
+    Expressions are hoisted only from code running on every iteration: condition of while loop, commands of the
+    body up to the first command which is not assignment or expression and head of that command (condition of
+    if, while, range of for), and neither from branches of IF nor from right operands of AND and OR. They are
+    computed only after the loop as written checked its condition or range, so nothing is computed which the loop
+    as written would not compute.
+    Only loops calling nothing but builtins and defining no functions are optimized, so variables can change
+    there only by commands of the loop itself. Optimized loop keeps the loop as written as original, it runs
+    instead when hoisted expressions fail or read mutable values (see LoopCommand.hoist)"""
+
+    CHILDREN = ('left', 'right', 'condition', 'true', 'false')
+    CONDITIONAL = {'IF': ('true', 'false'), 'AND': ('right',), 'OR': ('right',)}  # children which may not run
+
+    def __init__(self, builtins):
+        self.builtins = builtins  # builtins never shadowed in program, by name
+        self.hidden_count = 0
+        self.variant = set()  # names assigned in loop being optimized
+        self.hoisted = {}  # ast as text -> (hidden name, ast)
+        self.hoisting = False  # whether commands being rewritten run on every iteration
+
+    def hidden_name(self):
+        self.hidden_count += 1
+        return '0h{}'.format(self.hidden_count)
+
+    def optimize(self, commands, symbols=None):
+        """Returns commands where loops are replaced by optimized ones, blocks of commands are changed in place"""
+        optimized = []
+        for command in commands:
+            if isinstance(command, CreateAdvanceFunctionCommand):
+                command.commands = self.optimize(command.commands, command.symbols)
+            elif isinstance(command, IfCommand):
+                branch = command
+                while branch is not None:
+                    branch.commands = self.optimize(branch.commands, symbols)
+                    branch = branch.next_if_command
+            elif isinstance(command, ParallelForCommand):
+                command.commands = self.optimize(command.commands, symbols)
+            elif isinstance(command, (WhileCommand, ForCommand)):
+                command = self.optimize_loop(command, symbols)
+            optimized.append(command)
+        return optimized
+
+    @staticmethod
+    def walk(commands):
+        """Yields commands and all commands nested in them"""
+        for command in commands:
+            yield command
+            if isinstance(command, IfCommand):
+                branch = command
+                while branch is not None:
+                    if branch is not command:
+                        yield branch
+                    yield from LoopOptimizer.walk(branch.commands)
+                    branch = branch.next_if_command
+            elif isinstance(command, BlockCommand):
+                yield from LoopOptimizer.walk(command.commands)
+
+    @staticmethod
+    def command_asts(command):
+        if isinstance(command, (SetVariableCommand, ExpressionCommand, ReturnCommand)):
+            return [command.ast]
+        if isinstance(command, (IfCommand, WhileCommand)):
+            return [command.condition_ast]
+        if isinstance(command, ForCommand):
+            return [command.from_ast, command.to_ast]
+        return []
+
+    @staticmethod
+    def called_names(ast):
+        if 'value' in ast:
+            return
+        if ast['op'] == 'CALL_FUNCTION':
+            yield ast['function']['content']
+        for key in LoopOptimizer.CHILDREN:
+            if key in ast:
+                yield from LoopOptimizer.called_names(ast[key])
+        for sub_ast in ast.get('arguments', ()):
+            yield from LoopOptimizer.called_names(sub_ast)
+
+    @staticmethod
+    def variable_names(ast):
+        if 'value' in ast:
+            return
+        if ast['op'] == 'VARIABLE':
+            yield ast['content']
+        for key in LoopOptimizer.CHILDREN:
+            if key in ast:
+                yield from LoopOptimizer.variable_names(ast[key])
+        for sub_ast in ast.get('arguments', ()):
+            yield from LoopOptimizer.variable_names(sub_ast)
+
+    def eligible(self, commands):
+        """Whether nothing but commands themselves can assign variables while they run"""
+        for command in self.walk(commands):
+            if isinstance(command, (CreateFunctionCommand, CreateAdvanceFunctionCommand, ParallelForCommand)):
+                return False
+            for ast in self.command_asts(command):
+                if any(name not in self.builtins for name in self.called_names(ast.ast)):
+                    return False
+        return True
+
+    @staticmethod
+    def assigned_names(commands):
+        return {command.var_name for command in LoopOptimizer.walk(commands)
+                if isinstance(command, (SetVariableCommand, ForCommand))}
+
+    def optimize_loop(self, loop, symbols):
+        if not self.eligible(loop.commands):
+            loop.commands = self.optimize(loop.commands, symbols)
+            return loop
+
+        self.variant = self.assigned_names(loop.commands)
+        if isinstance(loop, ForCommand):
+            self.variant.add(loop.var_name)
+        self.hoisted, self.hoisting = {}, True
+
+        if isinstance(loop, WhileCommand):
+            condition = self.rewrite_ast(loop.condition_ast)
+            optimized = WhileCommand(condition, self.rewrite_block(loop.commands))
+        else:
+            optimized = ForCommand(loop.var_name, loop.from_ast, loop.to_ast, self.rewrite_block(loop.commands),
+                                   loop.direction)
+        if not self.hoisted:
+            loop.commands = self.optimize(loop.commands, symbols)
+            return loop
+
+        optimized.line, optimized.original = loop.line, loop
+        optimized.hoisted = [(name, AST(ast), list(dict.fromkeys(self.variable_names(ast))))
+                             for name, ast in self.hoisted.values()]
+        if symbols is not None:
+            for name, _ in self.hoisted.values():
+                symbols.add_local(name)
+        optimized.commands = self.optimize(optimized.commands, symbols)
+        return optimized
+
+    def rewrite(self, command):
+        """Copy of command of loop body where invariant expressions read hidden variables. Commands after head of
+        compound command may not run on every iteration, hoisting stops there"""
+        if isinstance(command, SetVariableCommand):
+            rewritten = SetVariableCommand(command.var_name, self.rewrite_ast(command.ast))
+        elif isinstance(command, ExpressionCommand):
+            rewritten = ExpressionCommand(self.rewrite_ast(command.ast))
+        elif isinstance(command, ReturnCommand):
+            rewritten = ReturnCommand(self.rewrite_ast(command.ast))
+            self.hoisting = False
+        elif isinstance(command, IfCommand):
+            condition = self.rewrite_ast(command.condition_ast)
+            self.hoisting = False
+            rewritten = IfCommand(condition, self.rewrite_block(command.commands))
+            if command.next_if_command is not None:
+                rewritten.hook_up(self.rewrite(command.next_if_command))
+        elif isinstance(command, WhileCommand):
+            condition = self.rewrite_ast(command.condition_ast)
+            self.hoisting = False
+            rewritten = WhileCommand(condition, self.rewrite_block(command.commands))
+        elif isinstance(command, ForCommand):
+            from_ast, to_ast = self.rewrite_ast(command.from_ast), self.rewrite_ast(command.to_ast)
+            self.hoisting = False
+            rewritten = ForCommand(command.var_name, from_ast, to_ast, self.rewrite_block(command.commands),
+                                   command.direction)
+        else:
+            self.hoisting = False
+            return command  # break and continue keep no state
+        rewritten.line = command.line
+        return rewritten
+
+    def rewrite_block(self, commands):
+        return [self.rewrite(command) for command in commands]
+
+    def rewrite_ast(self, ast):
+        return AST(self.expression(ast.ast) if self.hoisting else ast.ast, ast.condition)
+
+    def expression(self, ast):
+        return self.hoist(*self.visit(ast))
+
+    def visit(self, ast):
+        """Returns ast where invariant parts are hoisted and whether ast itself is invariant, then it is left
+        for caller to hoist as part of larger expression"""
+        if 'value' in ast or ast['op'] in ('NUMBER', 'STRING'):
+            return ast, True
+        op = ast['op']
+        if op == 'VARIABLE':
+            return ast, ast['content'] not in self.variant
+
+        conditional = self.CONDITIONAL.get(op, ())
+        children = {key: (ast[key], self.is_invariant(ast[key])) if key in conditional else self.visit(ast[key])
+                    for key in self.CHILDREN if key in ast}
+        arguments = [self.visit(sub_ast) for sub_ast in ast.get('arguments', ())]
+        invariant = all(flag for _, flag in children.values()) and all(flag for _, flag in arguments)
+        if op == 'TAIL_CALL' or op == 'CALL_FUNCTION' and not self.is_pure(ast['function']['content']):
+            invariant = False
+        if invariant:
+            return ast, True
+
+        # children which may not run stay in place, only whole expression including them may be hoisted
+        rewritten = dict(ast, **{key: self.hoist(*child) for key, child in children.items() if key not in conditional})
+        if 'arguments' in ast:
+            rewritten['arguments'] = [self.hoist(*argument) for argument in arguments]
+        return rewritten, False
+
+    def is_invariant(self, ast):
+        """Whether ast gives the same value on every iteration, nothing in it is hoisted"""
+        if 'value' in ast or ast['op'] in ('NUMBER', 'STRING'):
+            return True
+        if ast['op'] == 'VARIABLE':
+            return ast['content'] not in self.variant
+        if ast['op'] == 'TAIL_CALL' or ast['op'] == 'CALL_FUNCTION' and not self.is_pure(ast['function']['content']):
+            return False
+        return all(self.is_invariant(ast[key]) for key in self.CHILDREN if key in ast) and \
+            all(self.is_invariant(sub_ast) for sub_ast in ast.get('arguments', ()))
+
+    def is_pure(self, name):
+        return name in self.builtins and self.builtins[name].pure
+
+    @staticmethod
+    def is_trivial(ast):
+        return 'value' in ast or ast['op'] in ('NUMBER', 'STRING', 'VARIABLE')
+
+    def hoist(self, ast, invariant):
+        """Variable reading ast computed before the loop, when ast is invariant and worth it"""
+        if not invariant or self.is_trivial(ast):
+            return ast
+        key = repr(ast)
+        if key not in self.hoisted:
+            self.hoisted[key] = (self.hidden_name(), ast)
+        return {'op': 'VARIABLE', 'content': self.hoisted[key][0]}
@@ -0,0 +1,33 @@
+import sys
+
+
+class OutputBuffer:
+    """Collects printed text and writes it to sys.stdout in large chunks instead of a write per print.
+    It is flushed when chunk is full, before reading input, on explicit flush and at exit.
+    Output can be captured to other stream instead of sys.stdout"""
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, stream=None, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.parts = []
+        self.size = 0
+        self.stream = stream  # sys.stdout when None, it is looked up on every flush as it can be replaced
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.chunk_size:
+            self.flush(False)
+
+    def print(self, *values):
+        self.write(' '.join(map(str, values)) + '\n')
+
+    def flush(self, flush_stream=True):
+        if self.parts:
+            text = ''.join(self.parts)
+            self.parts.clear()
+            self.size = 0
+            (self.stream or sys.stdout).write(text)
+        if flush_stream:
+            (self.stream or sys.stdout).flush()
@@ -0,0 +1,108 @@
+import json
+from time import perf_counter
+from Commands import *
+
+
+class Profiler:
+    """Counts hits and time of every line and calls and time of every fn/def function.
+    Program is instrumented only when profiling, so without it commands run as usual.
+    Self time excludes nested profiled lines and function calls, cumulative time of recursive line or function
+    is counted once for the outermost execution. Self call in tail position runs as loop inside of the call, it is
+    counted as call but its time goes to the call"""
+
+    HITS, CUMULATIVE, SELF, ACTIVE = range(4)
+
+    def __init__(self, source_code):
+        self.source_lines = source_code.split('\n')
+        self.lines = {}  # line number -> [hits, cumulative time, self time, active executions]
+        self.functions = {}  # (name, line number) -> the same counters, hits are calls
+        self.children = [0.0]  # time of nested profiled executions for every execution in progress
+
+    def measure(self, counters, execute, *arguments):
+        counters[self.HITS] += 1
+        counters[self.ACTIVE] += 1
+        self.children.append(0.0)
+        start = perf_counter()
+        try:
+            return execute(*arguments)
+        finally:
+            elapsed = perf_counter() - start
+            counters[self.SELF] += elapsed - self.children.pop()
+            counters[self.ACTIVE] -= 1
+            if not counters[self.ACTIVE]:
+                counters[self.CUMULATIVE] += elapsed
+            self.children[-1] += elapsed
+
+    def instrument(self, commands):
+        """Returns commands wrapped for profiling, blocks and function bodies are instrumented in place"""
+        for command in commands:
+            if isinstance(command, IfCommand):
+                branch = command
+                while branch is not None:
+                    branch.commands = self.instrument(branch.commands)
+                    branch = branch.next_if_command
+            elif isinstance(command, BlockCommand):
+                command.commands = self.instrument(command.commands)
+        return [ProfiledCommand(command, self) for command in commands]
+
+    def instrument_compiled(self, compiled):
+        compiled.compiled_commands = self.instrument(compiled.compiled_commands)
+        return compiled
+
+    def source_line(self, number):
+        return self.source_lines[number - 1].strip() if number and number <= len(self.source_lines) else ''
+
+    def report(self):
+        lines = ['Lines by self time:',
+                 ' {:>6} {:>10} {:>14} {:>14}  {}'.format('line', 'hits', 'cumulative ms', 'self ms', 'source')]
+        for number, counters in sorted(self.lines.items(), key=lambda item: -item[1][self.SELF]):
+            lines.append(' {:>6} {:>10} {:>14.3f} {:>14.3f}  {}'.format(
+                number, counters[self.HITS], counters[self.CUMULATIVE] * 1000, counters[self.SELF] * 1000,
+                self.source_line(number)))
+
+        lines += ['Functions by self time:',
+                  ' {:<20} {:>6} {:>10} {:>14} {:>14}'.format('function', 'line', 'calls', 'cumulative ms', 'self ms')]
+        for (name, number), counters in sorted(self.functions.items(), key=lambda item: -item[1][self.SELF]):
+            lines.append(' {:<20} {:>6} {:>10} {:>14.3f} {:>14.3f}'.format(
+                name, number, counters[self.HITS], counters[self.CUMULATIVE] * 1000, counters[self.SELF] * 1000))
+        return '\n'.join(lines)
+
+    def to_json(self):
+        def entry(counters, **keys):
+            return dict(keys, hits=counters[self.HITS], cumulative=counters[self.CUMULATIVE],
+                        self=counters[self.SELF])
+
+        return json.dumps({'lines': [entry(counters, line=number, source=self.source_line(number))
+                                     for number, counters in sorted(self.lines.items())],
+                           'functions': [entry(counters, name=name, line=number)
+                                         for (name, number), counters in sorted(self.functions.items())]},
+                          indent=2)
+
+
+class ProfiledCommand(Command):
+    def __init__(self, command, profiler):
+        self.command, self.profiler = command, profiler
+        self.line = command.line
+        self.counters = profiler.lines.setdefault(command.line, [0, 0.0, 0.0, 0])
+        if isinstance(command, (CreateFunctionCommand, CreateAdvanceFunctionCommand)):
+            self.function_counters = profiler.functions.setdefault((command.func_name, command.line), [0, 0.0, 0.0, 0])
+
+    def execute(self, variable_scope):
+        self.profiler.measure(self.counters, self.command.execute, variable_scope)
+
+        if isinstance(self.command, (CreateFunctionCommand, CreateAdvanceFunctionCommand)):
+            function = variable_scope.get(self.command.func_name)
+            variable_scope.set(self.command.func_name, ProfiledFunction(function, self.function_counters,
+                                                                        self.profiler))
+
+
+class ProfiledFunction:
+    def __init__(self, function, counters, profiler):
+        self.function, self.counters, self.profiler = function, counters, profiler
+        function.on_tail_call = self.count_tail_call
+
+    def count_tail_call(self):
+        self.counters[Profiler.HITS] += 1
+
+    def execute(self, arguments_values, variable_scope):
+        return self.profiler.measure(self.counters, self.function.execute, arguments_values, variable_scope)
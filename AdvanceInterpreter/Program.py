@@ -0,0 +1,100 @@
+import asyncio
+from contextlib import nullcontext
+from Budget import Budget
+from Compiler import Compiler
+from VirtualMachine import CompiledBytecode, CompiledAsync
+from Transpiler import CompiledPython
+from my_builtins import redirect_output, current_input_reader
+
+
+class Program:
+    """Program compiled once for embedding into other python code and run any number of times.
+    It is not changed by runs: every run has its own scope seeded with given inputs and its own output buffer,
+    so one program can run in many threads at once. Program with engine `async` runs on asyncio event loop by
+    run_async, many of them can run concurrently on one thread
+
+        program = Program('result = n * n', engine='python')
+        program.run({'n': 7})['result']  # 49
+    """
+
+    class UnknownEngineException(Exception):
+        def __init__(self, engine):
+            self.engine = engine
+
+        def __repr__(self):
+            return 'Unknown engine {}, expected one of {}'.format(self.engine, ', '.join(Program.ENGINES))
+
+    class NotAsyncEngineException(Exception):
+        def __init__(self, engine):
+            self.engine = engine
+
+        def __repr__(self):
+            return 'Program with engine {} can not run on asyncio, use engine async'.format(self.engine)
+
+    ENGINES = {'tree': lambda compiled: compiled, 'vm': CompiledBytecode, 'python': CompiledPython,
+               'async': CompiledAsync}
+
+    __slots__ = ('_source_code', '_engine', '_options', '_compiled', '_shadowing')
+
+    def __init__(self, source_code, engine='tree', **options):
+        """options are those of Compiler: fold_constants, memoize, memo_size, tail_calls, optimize_loops,
+        eliminate_dead_code. Functions which are never used are not among variables returned by runs"""
+        if engine not in self.ENGINES:
+            raise Program.UnknownEngineException(engine)
+        self._source_code, self._engine, self._options = source_code, engine, options
+        self._compiled = self.compile(())
+        self._shadowing = {}  # names of builtins shadowed by inputs -> program compiled for them
+
+    def compile(self, seeded_names):
+        return self.ENGINES[self._engine](Compiler(self._source_code, seeded_names=seeded_names,
+                                                   **self._options).compile())
+
+    def compiled_for(self, inputs):
+        """Compiled program for inputs, inputs shadowing builtins get program compiled for them on the first run"""
+        shadowed = Compiler.shadowed_builtins(inputs)
+        if not shadowed:
+            return self._compiled
+        if shadowed not in self._shadowing:
+            self._shadowing[shadowed] = self.compile(shadowed)
+        return self._shadowing[shadowed]
+
+    @staticmethod
+    def from_file(path, engine='tree', **options):
+        with open(path, 'r') as f:
+            return Program(f.read(), engine, **options)
+
+    @property
+    def source_code(self):
+        return self._source_code
+
+    @property
+    def engine(self):
+        return self._engine
+
+    @staticmethod
+    def budget(max_steps, max_seconds, max_depth):
+        if max_steps is None and max_seconds is None and max_depth is None:
+            return nullcontext()
+        return Budget(max_steps, max_seconds, max_depth).active()
+
+    def run(self, inputs=None, output=None, max_steps=None, max_seconds=None, max_depth=None):
+        """Runs program with inputs set as variables, returns dict of global variables after the run.
+        Printed text goes to output stream, sys.stdout when it is None. Run exceeding any of limits raises
+        Budget.BudgetExceededException"""
+        if self._engine == 'async':
+            return asyncio.run(self.run_async(inputs, output, None, max_steps, max_seconds, max_depth))
+        with redirect_output(output), self.budget(max_steps, max_seconds, max_depth):
+            return self.compiled_for(inputs).run(dict(inputs) if inputs else None)
+
+    async def run_async(self, inputs=None, output=None, read_input=None, max_steps=None, max_seconds=None,
+                        max_depth=None):
+        """Runs program as run does, letting other tasks run during it. read_input is coroutine function returning
+        lines for input builtin, by default they are read from stdin"""
+        if self._engine != 'async':
+            raise Program.NotAsyncEngineException(self._engine)
+        token = current_input_reader.set(read_input)
+        try:
+            with redirect_output(output), self.budget(max_steps, max_seconds, max_depth):
+                return await self.compiled_for(inputs).run(dict(inputs) if inputs else None)
+        finally:
+            current_input_reader.reset(token)
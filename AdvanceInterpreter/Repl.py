@@ -0,0 +1,85 @@
+from collections import Counter
+from Compiler import Compiler
+from Commands import ExpressionCommand
+from VariableScopeClass import VariableScope
+from my_builtins import OUTPUT
+
+try:
+    import readline  # line editing and history of inputs where it is available
+except ImportError:
+    readline = None
+
+
+class Repl:
+    """Interactive session. Every entered statement or block is compiled alone and runs in one scope kept between
+    inputs, value of entered expression is printed. Later inputs may assign any name, so builtins are not bound
+    statically, results of fn functions are not memoized, self calls are not turned into loops (the name may refer
+    to another function later) and functions unused by the input are kept. Parsed expressions are cached by their
+    source, so entering function again parses only changed lines"""
+
+    PROMPT, CONTINUATION = '>>> ', '... '
+
+    def __init__(self, fold_constants=True, dump_ast=False):
+        self.options = {'fold_constants': fold_constants, 'dump_ast': dump_ast, 'tail_calls': False,
+                        'memoize': False, 'static_builtins': False, 'eliminate_dead_code': False}
+        self.variable_scope = VariableScope()
+        self.expressions = {}
+        # names assigned by previous inputs, for checks of parallel loops
+        self.bound_names, self.parallel_bound_names = Counter(), Counter()
+
+    @staticmethod
+    def opens_block(line):
+        return Compiler.remove_comment(line).rstrip().endswith(':')
+
+    def read(self, read_line=input):
+        """Returns source of next statement, block lasts until empty line. None at end of input"""
+        try:
+            line = read_line(self.PROMPT)
+        except EOFError:
+            return None
+        lines = [line]
+        if self.opens_block(line):
+            while True:
+                try:
+                    line = read_line(self.CONTINUATION)
+                except EOFError:
+                    break
+                if not line.strip():
+                    break
+                lines.append(line)
+        return '\n'.join(lines)
+
+    def execute(self, source_code):
+        """Compiles and runs source in the scope of session, returns value of expression or None"""
+        compiler = Compiler(source_code, expression_cache=self.expressions, **self.options)
+        compiler.bound_names.update(self.bound_names)
+        compiler.parallel_bound_names.update(self.parallel_bound_names)
+        commands = compiler.compile().compiled_commands
+        self.bound_names, self.parallel_bound_names = compiler.bound_names, compiler.parallel_bound_names
+
+        if len(commands) == 1 and isinstance(commands[0], ExpressionCommand):
+            return commands[0].ast.execute(self.variable_scope)
+        for command in commands:
+            command.execute(self.variable_scope)
+        return None
+
+    def run(self, read_line=input):
+        while True:
+            OUTPUT.flush()
+            try:
+                source_code = self.read(read_line)
+                if source_code is None:
+                    break
+                if not Compiler.remove_comment(source_code).strip():
+                    continue
+                value = self.execute(source_code)
+                if value is not None:
+                    OUTPUT.print(value)
+            except KeyboardInterrupt:
+                OUTPUT.print('KeyboardInterrupt')
+            except Exception as e:
+                if hasattr(e, '__repr__'):
+                    OUTPUT.print(e.__repr__())
+                else:
+                    OUTPUT.print(e)
+        OUTPUT.print()
@@ -0,0 +1,559 @@
+from math import isfinite
+import re
+from ASTwithCalculation import AST
+from Commands import *
+from VariableScopeClass import VariableScope, UNSET, TailCall
+from my_builtins import BuiltInFunction
+from Budget import Budget
+from LoopOptimizer import LoopOptimizer
+
+
+class Transpiler:
+    """Translates compiled commands into Python source which is run by CPython itself.
+    Global names become `v_name`, names local to a function nested on depth d become `l<d>_name`.
+    Metered translation charges budget: for loops iterate over chunks of their range, while loops over endless
+    ticks of the run and functions take a tick in prologue, counting depth only when it is limited. Optimized
+    loop is preceded by hoisted expressions and followed by loop as written in else branch, which runs when they
+    fail"""
+
+    class LoopControlOutsideLoopException(Exception):
+        def __init__(self, command):
+            self.command = command
+
+        def __repr__(self):
+            return '{} outside of loop'.format('break' if isinstance(self.command, BreakCommand) else 'continue')
+
+    class ReturnOutsideFunctionException(Exception):
+        def __repr__(self):
+            return 'return outside of function'
+
+    class UnknownCommandException(Exception):
+        def __init__(self, command):
+            self.command = command
+
+        def __repr__(self):
+            return 'Command {} can not be transpiled to python'.format(type(self.command).__name__)
+
+    class PythonCompilationException(Exception):
+        def __init__(self, error):
+            self.error = error
+
+        def __repr__(self):
+            return 'Transpiled program can not be compiled by python: {}'.format(self.error)
+
+    operators = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'DIV': '/', 'INT_DIV': '//', 'MOD': '%', 'POW': '**',
+                 'BIT_AND': '&', 'BIT_XOR': '^', 'BIT_OR': '|', 'LEFT_SHIFT': '<<', 'RIGHT_SHIFT': '>>',
+                 'AND': 'and', 'OR': 'or'}
+
+    # comparisons of the language give int, not bool (and int arrays for arrays)
+    comparisons = {'EQUALS': '==', 'NOT_EQUALS': '!=', 'LESS': '<', 'LESS_EQUALS': '<=', 'GREATER': '>',
+                   'GREATER_EQUALS': '>='}
+
+    IDENTIFIER = re.compile(r'(v|l\d+)_(\w+)$')
+    IDENTIFIER_IN_TEXT = re.compile(r'\b(?:v|l\d+)_(\w+)')
+
+    def __init__(self, metered=False, limit_depth=False):
+        self.metered, self.limit_depth = metered, metered and limit_depth
+        self.lines, self.constants = [], []
+        self.scopes = []  # symbols of functions being translated, outermost first
+        self.unassigned = []  # for every scope locals which may be read while unassigned
+        self.loops = 0
+        self.tail_loop = None  # arguments of function which body is wrapped into `while True:` for tail calls
+        self.parallel_body = False  # body of parallel for is function, continue outside of inner loops returns
+        self.parallel_loops = 0
+
+    @staticmethod
+    def source_name(identifier):
+        """Name in the language for identifier of transpiled code"""
+        match = Transpiler.IDENTIFIER.match(identifier or '')
+        return match.group(2) if match else identifier
+
+    def identifier(self, name):
+        for depth in range(len(self.scopes), 0, -1):
+            if name in self.scopes[depth - 1].slots:
+                return 'l{}_{}'.format(depth, name)
+        return 'v_' + name
+
+    def read(self, name, depth=None):
+        """Python expression reading name. Local which may be unassigned yet holds UNSET, then name is read from
+        outer scopes at the moment of reading, as Frame.get does"""
+        for depth in range(len(self.scopes) if depth is None else depth, 0, -1):
+            if name in self.scopes[depth - 1].slots:
+                identifier = 'l{}_{}'.format(depth, name)
+                if name not in self.unassigned[depth - 1]:
+                    return identifier
+                return '({0} if {0} is not UNSET else {1})'.format(identifier, self.read(name, depth - 1))
+        return 'v_' + name
+
+    def constant(self, value):
+        if type(value) in (int, bool, str) and not (type(value) is int and value.bit_length() > 1024) or \
+                type(value) is float and isfinite(value):
+            text = repr(value)
+            return '({})'.format(text) if text.startswith('-') else text
+        self.constants.append(value)
+        return 'constants[{}]'.format(len(self.constants) - 1)
+
+    def expression(self, ast, tail_calls=False, condition=False):
+        """Python expression for ast, comparisons of ast which value is only tested for truth stay bool"""
+        if 'value' in ast:
+            return self.constant(ast['value'])
+
+        op = ast['op']
+        if op == 'NUMBER':
+            return ast['content']
+        if op == 'STRING':
+            return repr(ast['content'])
+        if op == 'VARIABLE':
+            return self.read(ast['content'])
+
+        if op == 'IF':
+            return '({} if {} else {})'.format(self.expression(ast['true'], tail_calls, condition),
+                                               self.expression(ast['condition'], condition=True),
+                                               self.expression(ast['false'], tail_calls, condition))
+
+        if op == 'TAIL_CALL' and tail_calls:
+            return 'TailCall([{}])'.format(', '.join(map(self.expression, ast['arguments'])))
+
+        if op in ('CALL_FUNCTION', 'TAIL_CALL'):
+            return '{}({})'.format(self.read(ast['function']['content']),
+                                   ', '.join(map(self.expression, ast['arguments'])))
+
+        left = self.expression(ast['left'], condition=op == 'NOT' or condition and op in ('AND', 'OR'))
+        if op == 'UNARY_PLUS':
+            return left
+        if op == 'UNARY_MINUS':
+            return '(-{})'.format(left)
+        if op == 'NOT':
+            return 'logical_not({})'.format(left)
+
+        if op in self.operators:
+            right = self.expression(ast['right'], condition=condition and op in ('AND', 'OR'))
+            return '({} {} {})'.format(left, self.operators[op], right)
+        if op in self.comparisons:
+            return ('({} {} {})' if condition else '(({} {} {}) + 0)').format(
+                left, self.comparisons[op], self.expression(ast['right']))
+
+        raise AST.InvalidAstOperationException(op)
+
+    @staticmethod
+    def unassigned_reads(commands, assigned, found):
+        """Collects names which may be read before assignment, returns names surely assigned after commands.
+        Such locals are read from outer scope in the language, while python raises UnboundLocalError"""
+        assigned = set(assigned)
+        for command in commands:
+            if isinstance(command, (SetVariableCommand, ExpressionCommand, ReturnCommand)):
+                found.update(name for name in AST.read_names(command.ast.ast) if name not in assigned)
+            if isinstance(command, SetVariableCommand):
+                assigned.add(command.var_name)
+
+            elif isinstance(command, CreateFunctionCommand):
+                assigned.add(command.func_name)
+
+            elif isinstance(command, CreateAdvanceFunctionCommand):
+                # variables listed after `with` must be bound here for `nonlocal` of nested function
+                found.update(name for name in command.with_vars if name not in assigned)
+                assigned.add(command.func_name)
+
+            elif isinstance(command, IfCommand):
+                branches = []
+                while command is not None:
+                    found.update(name for name in AST.read_names(command.condition_ast.ast)
+                                 if name not in assigned)
+                    branches.append(Transpiler.unassigned_reads(command.commands, assigned, found))
+                    if Transpiler.is_true(command.condition_ast):
+                        assigned = set.intersection(*branches)
+                        break
+                    command = command.next_if_command
+
+            elif isinstance(command, (WhileCommand, ForCommand)):
+                loop_assigned = assigned
+                if command.original is not None:
+                    Transpiler.unassigned_reads([command.original], assigned, found)
+                    for _, ast, _ in command.hoisted:
+                        found.update(name for name in AST.read_names(ast.ast) if name not in assigned)
+                    loop_assigned = assigned | {name for name, _, _ in command.hoisted}
+
+                if isinstance(command, WhileCommand):
+                    found.update(name for name in AST.read_names(command.condition_ast.ast)
+                                 if name not in loop_assigned)
+                    Transpiler.unassigned_reads(command.commands, loop_assigned, found)
+                else:
+                    for ast in (command.from_ast, command.to_ast):
+                        found.update(name for name in AST.read_names(ast.ast) if name not in loop_assigned)
+                    Transpiler.unassigned_reads(command.commands, loop_assigned | {command.var_name}, found)
+        return assigned
+
+    @staticmethod
+    def nested_reads(commands, found):
+        """Collects names read by functions defined in commands, they may read locals before they are assigned"""
+        for command in commands:
+            if isinstance(command, CreateFunctionCommand):
+                found.update(AST.read_names(command.ast.ast))
+            elif isinstance(command, CreateAdvanceFunctionCommand):
+                found.update(command.with_vars)
+                Transpiler.unassigned_reads(command.commands, command.args, found)
+                Transpiler.nested_reads(command.commands, found)
+            elif isinstance(command, IfCommand):
+                while command is not None:
+                    Transpiler.nested_reads(command.commands, found)
+                    command = command.next_if_command
+            elif isinstance(command, BlockCommand):
+                Transpiler.nested_reads(command.commands, found)
+                if isinstance(command, LoopCommand) and command.original is not None:
+                    Transpiler.nested_reads([command.original], found)
+
+    @staticmethod
+    def is_true(ast):
+        return 'value' in ast.ast and bool(ast.ast['value'])
+
+    def emit(self, level, line):
+        self.lines.append('    ' * level + line)
+
+    def translate(self, commands):
+        self.block(commands, 0)
+        return '\n'.join(self.lines) + '\n'
+
+    def block(self, commands, level):
+        size = len(self.lines)
+        for command in commands:
+            self.command(command, level)
+        if len(self.lines) == size:
+            self.emit(level, 'pass')
+
+    def loop_body(self, commands, level):
+        self.loops += 1
+        self.block(commands, level)
+        self.loops -= 1
+
+    def function(self, command, level, with_vars, commands):
+        name = self.identifier(command.func_name)
+        unassigned = set()
+        if commands is not None:
+            found = set()
+            self.unassigned_reads(commands, command.args, found)
+            self.nested_reads(commands, found)
+            unassigned = {local_name for local_name in command.symbols.slots
+                          if local_name in found and local_name not in command.args}
+        self.scopes.append(command.symbols)
+        self.unassigned.append(unassigned)
+        depth = len(self.scopes)
+
+        arguments = ', '.join(self.identifier(argument) for argument in command.args)
+        self.emit(level, 'def {}({}):'.format(name, arguments))
+
+        for var_name in dict.fromkeys(with_vars):
+            outer_name = self.identifier(var_name)
+            self.emit(level + 1, '{} {}'.format('global' if outer_name.startswith('v_') else 'nonlocal', outer_name))
+
+        loops, tail_loop, parallel_body = self.loops, self.tail_loop, self.parallel_body
+        self.loops, self.parallel_body = 0, False
+        tail_returns = set(self.tail_returns(commands, command))
+        self.tail_loop = command.args if tail_returns else None
+        body_level = level + 1
+        if self.metered:
+            self.enter_call(body_level)
+        if self.limit_depth:
+            body_level += 1
+        if False in tail_returns:
+            self.emit(body_level, 'for () in ticks:' if self.metered else 'while True:')
+            body_level += 1
+
+        if commands is None:
+            self.tail_return(command.ast.ast, body_level)
+        else:
+            for local_name in command.symbols.slots:
+                if local_name in unassigned:
+                    self.emit(body_level, 'l{}_{} = UNSET'.format(depth, local_name))
+
+            self.block(commands, body_level)
+            if False in tail_returns:
+                self.emit(body_level, 'return None')
+        if self.limit_depth:
+            self.emit(level + 1, 'finally:')
+            self.emit(level + 2, 'budget_.depth -= 1')
+
+        self.loops, self.tail_loop, self.parallel_body = loops, tail_loop, parallel_body
+        self.scopes.pop()
+        self.unassigned.pop()
+
+        if commands is None and command.memo_size is not None:
+            self.emit(level, '{0} = memoize({1!r}, {0}, {2})'.format(name, command.func_name, command.memo_size))
+        if True in tail_returns:
+            self.emit(level, '{0} = trampoline({0})'.format(name))
+
+    def enter_call(self, level):
+        """Prologue of metered function taking one tick for its call. With limited depth it also counts depth,
+        body goes into try block which decreases it"""
+        if self.limit_depth:
+            self.emit(level, 'if budget_.depth >= budget_.max_depth:')
+            self.emit(level + 1, "raise budget_.exceeded('depth', budget_.max_depth)")
+        self.emit(level, 'next(ticks)')
+        if self.limit_depth:
+            self.emit(level, 'budget_.depth += 1')
+            self.emit(level, 'try:')
+
+    @staticmethod
+    def tail_returns(commands, function, in_loop=False):
+        """Yields for every return with tail call whether it is inside loop"""
+        if commands is None:
+            if AST.has_tail_call(function.ast.ast):
+                yield False
+            return
+
+        for command in commands:
+            if isinstance(command, ReturnCommand) and AST.has_tail_call(command.ast.ast):
+                yield in_loop
+            elif isinstance(command, IfCommand):
+                while command is not None:
+                    yield from Transpiler.tail_returns(command.commands, function, in_loop)
+                    command = command.next_if_command
+            elif isinstance(command, (WhileCommand, ForCommand)):
+                yield from Transpiler.tail_returns(command.commands, function, True)
+
+    @staticmethod
+    def trampoline(function):
+        """Runs TailCall returned from loops of function, where it can not be turned into `continue`"""
+        def run(*arguments_values):
+            result = function(*arguments_values)
+            while result.__class__ is TailCall:
+                result = function(*result.arguments)
+            return result
+        return run
+
+    def tail_return(self, ast, level):
+        """Returns value of ast, tail calls rebind arguments and start function over"""
+        if self.tail_loop is None or not AST.has_tail_call(ast):
+            self.emit(level, 'return {}'.format(self.expression(ast)))
+
+        elif self.loops:
+            self.emit(level, 'return {}'.format(self.expression(ast, tail_calls=True)))
+
+        elif ast['op'] == 'IF':
+            self.emit(level, 'if {}:'.format(self.expression(ast['condition'], condition=True)))
+            self.tail_return(ast['true'], level + 1)
+            self.emit(level, 'else:')
+            self.tail_return(ast['false'], level + 1)
+
+        else:
+            if self.tail_loop:
+                self.emit(level, '{} = {},'.format(', '.join(map(self.identifier, self.tail_loop)) + ',',
+                                                   ', '.join(map(self.expression, ast['arguments']))))
+            self.emit(level, 'continue')
+
+    def parallel_loop(self, command, level):
+        """Body becomes function of loop variable run by parallel_for, names it assigns are globals of worker"""
+        self.parallel_loops += 1
+        name = 'parallel_body_{}'.format(self.parallel_loops)
+        self.emit(level, 'def {}(value):'.format(name))
+        names = dict.fromkeys([command.var_name] + command.assigned_names)
+        self.emit(level + 1, 'global {}'.format(', '.join(map(self.identifier, names))))
+        self.emit(level + 1, '{} = value'.format(self.identifier(command.var_name)))
+
+        loops, parallel_body = self.loops, self.parallel_body
+        self.loops, self.parallel_body = 0, True
+        self.block(command.commands, level + 1)
+        self.loops, self.parallel_body = loops, parallel_body
+
+        self.emit(level, 'parallel_for({}, {}, {}, {}, globals())'.format(
+            self.constant(command), self.expression(command.from_ast.ast), self.expression(command.to_ast.ast), name))
+
+    @staticmethod
+    def parallel_for(command, from_value, to_value, body, namespace):
+        def load(name):
+            if 'v_' + name not in namespace:
+                raise VariableScope.UndefinedVariable(name)
+            return namespace['v_' + name]
+
+        def store(name, value):
+            namespace['v_' + name] = value
+
+        def delete(name):
+            namespace.pop('v_' + name, None)
+
+        command.run_parallel(command.iterations(from_value, to_value), body, load, store, delete)
+
+    def hoist(self, command, level):
+        """Computes hidden variables of optimized loop, opens branch running it"""
+        self.emit(level, 'try:')
+        for name, ast, _ in command.hoisted:
+            self.emit(level + 1, '{} = {}'.format(self.identifier(name), self.expression(ast.ast)))
+        inputs = [name for _, _, names in command.hoisted for name in names] + \
+            [name for name, _, _ in command.hoisted]
+        self.emit(level + 1, 'hoisted_ = immutable({})'.format(', '.join(map(self.read, dict.fromkeys(inputs)))))
+        self.emit(level, 'except Exception:')
+        self.emit(level + 1, 'hoisted_ = False')
+        self.emit(level, 'if hoisted_:')
+
+    def loop(self, command, level, entered=False):
+        """Entered loop already checked its condition or computed its range into range_. Entered while loop skips
+        the first check by flag entered_, every iteration clears it"""
+        if isinstance(command, WhileCommand):
+            entered = entered and not self.is_true(command.condition_ast)
+            condition = self.expression(command.condition_ast.ast, condition=True)
+            if entered:
+                self.emit(level, 'entered_ = True')
+                condition = '(entered_ or {})'.format(condition)
+            if self.metered:
+                self.emit(level, 'for () in ticks:')
+                if not self.is_true(command.condition_ast):
+                    self.emit(level + 1, 'if not {}:'.format(condition))
+                    self.emit(level + 2, 'break')
+            else:
+                self.emit(level, 'while {}:'.format(condition))
+            if entered:
+                self.emit(level + 1, 'entered_ = False')
+            self.loop_body(command.commands, level + 1)
+            return
+
+        iterations = 'range_' if entered else self.iterations(command)
+        if self.metered:
+            # break of the body leaves inner loop over chunk and skips its else, so outer loop breaks too
+            self.emit(level, 'for chunk_ in chunked({}):'.format(iterations))
+            self.emit(level + 1, 'for {} in chunk_:'.format(self.identifier(command.var_name)))
+            self.loop_body(command.commands, level + 2)
+            self.emit(level + 1, 'else:')
+            self.emit(level + 2, 'continue')
+            self.emit(level + 1, 'break')
+            return
+        self.emit(level, 'for {} in {}:'.format(self.identifier(command.var_name), iterations))
+        self.loop_body(command.commands, level + 1)
+
+    def iterations(self, command):
+        return '{}({}, {})'.format('for_up' if command.direction == ForCommand.UP else 'for_down',
+                                   self.expression(command.from_ast.ast), self.expression(command.to_ast.ast))
+
+    def command(self, command, level):
+        if isinstance(command, SetVariableCommand):
+            self.emit(level, '{} = {}'.format(self.identifier(command.var_name), self.expression(command.ast.ast)))
+
+        elif isinstance(command, ExpressionCommand):
+            self.emit(level, self.expression(command.ast.ast))
+
+        elif isinstance(command, CreateFunctionCommand):
+            self.function(command, level, [], None)
+
+        elif isinstance(command, CreateAdvanceFunctionCommand):
+            self.function(command, level, command.with_vars, command.commands)
+
+        elif isinstance(command, ReturnCommand):
+            if not self.scopes:
+                raise Transpiler.ReturnOutsideFunctionException
+            self.tail_return(command.ast.ast, level)
+
+        elif isinstance(command, IfCommand):
+            keyword = 'if'
+            while command is not None:
+                if keyword == 'elif' and self.is_true(command.condition_ast):
+                    self.emit(level, 'else:')
+                    self.block(command.commands, level + 1)
+                    break
+                self.emit(level, '{} {}:'.format(keyword, self.expression(command.condition_ast.ast, condition=True)))
+                self.block(command.commands, level + 1)
+                keyword, command = 'elif', command.next_if_command
+
+        elif isinstance(command, LoopCommand) and command.original is not None:
+            # hidden variables are computed only for loop which runs at least once
+            if isinstance(command, WhileCommand):
+                self.emit(level, 'if {}:'.format(self.expression(command.original.condition_ast.ast, condition=True)))
+            else:
+                self.emit(level, 'range_ = {}'.format(self.iterations(command)))
+                self.emit(level, 'if range_:')
+            self.hoist(command, level + 1)
+            self.loop(command, level + 2, True)
+            self.emit(level + 1, 'else:')
+            self.loop(command.original, level + 2, True)
+
+        elif isinstance(command, ParallelForCommand):
+            self.parallel_loop(command, level)
+
+        elif isinstance(command, (WhileCommand, ForCommand)):
+            self.loop(command, level)
+
+        elif isinstance(command, (BreakCommand, ContinueCommand)):
+            if not self.loops and self.parallel_body and isinstance(command, ContinueCommand):
+                self.emit(level, 'return')
+                return
+            if not self.loops:
+                raise Transpiler.LoopControlOutsideLoopException(command)
+            self.emit(level, 'break' if isinstance(command, BreakCommand) else 'continue')
+
+        else:
+            raise Transpiler.UnknownCommandException(command)
+
+
+class CompiledPython:
+    """Compiled program translated to python source and compiled to CPython code object.
+    Metered translations for runs with budget, with and without limit of depth, are made on the first such run"""
+
+    # TypeError of python calling function with wrong number of arguments or calling other value
+    ARGUMENTS_ERROR = re.compile(r'(?:\w+\.<locals>\.)*(\w+)\(\) (?:takes (\d+) positional arguments? but (\d+) '
+                                 r'(?:was|were) given|missing (\d+) required positional arguments?: (.*))$')
+    NOT_CALLABLE_ERROR = re.compile(r"'(\w+)' object is not callable$")
+
+    def __init__(self, compiled):
+        self.compiled_commands = compiled.compiled_commands
+        self.source, self.constants, self.code = self.translate(False)
+        self.metered_translations = {}  # whether depth is limited: translation
+
+    def translate(self, metered, limit_depth=False):
+        """Returns (source, constants, code object)"""
+        transpiler = Transpiler(metered, limit_depth)
+        source = transpiler.translate(self.compiled_commands)
+        try:
+            return source, transpiler.constants, compile(source, '<AdvanceInterpreter>', 'exec')
+        except (SyntaxError, RecursionError, MemoryError) as error:
+            raise Transpiler.PythonCompilationException(error)
+
+    def create_namespace(self, constants):
+        namespace = {'v_' + name: builtin.func for name, builtin in BuiltInFunction.arr.items()}
+        namespace.update(constants=constants, UNSET=UNSET, TailCall=TailCall, trampoline=Transpiler.trampoline,
+                         memoize=MemoizedFunction.memoize, logical_not=AST.logical_not,
+                         parallel_for=Transpiler.parallel_for, immutable=LoopCommand.immutable,
+                         for_up=ForCommand(None, None, None, [], ForCommand.UP).iterations,
+                         for_down=ForCommand(None, None, None, [], ForCommand.DOWN).iterations)
+        return namespace
+
+    def run(self, variables=None):
+        budget = Budget.current.get()
+        if budget is None:
+            namespace, code = self.create_namespace(self.constants), self.code
+        else:
+            limit_depth = budget.max_depth is not None
+            if limit_depth not in self.metered_translations:
+                self.metered_translations[limit_depth] = self.translate(True, limit_depth)
+            _, constants, code = self.metered_translations[limit_depth]
+            namespace = self.create_namespace(constants)
+            namespace.update(chunked=budget.chunked, ticks=budget.ticks(), budget_=budget)
+        if variables:
+            namespace.update(('v_' + name, value) for name, value in variables.items())
+        try:
+            exec(code, namespace)
+        except NameError as error:
+            raise VariableScope.UndefinedVariable(Transpiler.source_name(getattr(error, 'name', None)))
+        except TypeError as error:
+            raise self.call_error(str(error)) from None
+        builtins = {'v_' + name: builtin.func for name, builtin in BuiltInFunction.arr.items()}
+        return {name[2:]: value for name, value in namespace.items()
+                if name.startswith('v_') and builtins.get(name) is not value and
+                not VariableScope.is_hidden(name[2:])}
+
+    def call_error(self, message):
+        """Exception which other engines raise for TypeError of transpiled code with message, other TypeErrors
+        get names of the program instead of identifiers in their message"""
+        match = self.ARGUMENTS_ERROR.match(message)
+        if match and Transpiler.IDENTIFIER.match(match.group(1)):
+            name, expected, given, missing, missing_names = match.groups()
+            if expected is not None:
+                return Function.FunctionInvalidArgumentsException(int(expected), int(given))
+            # missing arguments are the last ones of function, which is found by their names
+            missing_names = [Transpiler.source_name(name) for name in re.findall(r"'(\w+)'", missing_names)]
+            for command in LoopOptimizer.walk(self.compiled_commands):
+                if isinstance(command, (CreateFunctionCommand, CreateAdvanceFunctionCommand)) and \
+                        command.func_name == Transpiler.source_name(name) and \
+                        list(command.args[len(command.args) - int(missing):]) == missing_names:
+                    return Function.FunctionInvalidArgumentsException(len(command.args),
+                                                                      len(command.args) - int(missing))
+        match = self.NOT_CALLABLE_ERROR.match(message)
+        if match:
+            return AST.NotFunctionException(match.group(1))
+        return TypeError(Transpiler.IDENTIFIER_IN_TEXT.sub(r'\1', message))
@@ -33,6 +33,9 @@ class VariableScope:
     def set(self, name, value):
         self.vars[name] = value
 
+    def delete(self, name):
+        self.vars.pop(name, None)
+
     def get(self, name):
         if name not in self.vars:
             if name in BuiltInFunction.arr:
@@ -40,25 +43,66 @@ class VariableScope:
             raise self.UndefinedVariable(name)
         return self.vars[name]
 
+    @staticmethod
+    def is_hidden(name):
+        """Names made up by compiler start with digit, so programs can not use them"""
+        return name[:1].isdigit()
+
+    def visible_vars(self):
+        return {name: value for name, value in self.vars.items() if not self.is_hidden(name)}
+
     def __repr__(self):
         return 'Variable Scope:\n | Vars: {}'.format(self.vars)
 
 
-class VariableScopeLocalAdvance:
-    def __init__(self, global_variables, with_variables):
-        self.global_variables, self.with_variables = global_variables, with_variables
-        self.vars = {}
+UNSET = object()  # value of a local slot before first assignment
+
+
+class SymbolTable:
+    """Names of a function body resolved at compile time: arguments and assigned names become local slots"""
+
+    def __init__(self, argument_names, local_names):
+        self.slots = {name: slot for slot, name in enumerate(dict.fromkeys(list(argument_names) + list(local_names)))}
+        self.arguments_count, self.size = len(argument_names), len(self.slots)
+        self.builtins = {}  # builtins that are never shadowed in program, bound directly
+
+    def add_local(self, name):
+        """Adds slot for name made up by compiler after body was compiled"""
+        self.slots.setdefault(name, len(self.slots))
+        self.size = len(self.slots)
 
-    def admin_set_variable(self, key, value):
-        self.vars[key] = value
+    def resolve(self, name):
+        """Returns (slot, None) for locals, (None, builtin) for builtins and (None, None) for outer scope names"""
+        if name in self.slots:
+            return self.slots[name], None
+        return None, self.builtins.get(name)
+
+
+class TailCall:
+    """Returned by self call in tail position: function starts over with new arguments instead of nested call"""
+    __slots__ = ('arguments',)
+
+    def __init__(self, arguments):
+        self.arguments = arguments
+
+
+class Frame:
+    """Local scope of a function call, values are stored in slots numbered by SymbolTable"""
+    __slots__ = ('symbols', 'parent', 'slots')
+
+    def __init__(self, symbols, parent, slots):
+        self.symbols, self.parent, self.slots = symbols, parent, slots
 
     def set(self, name, value):
-        if name in self.with_variables:
-            self.global_variables.set(name, value)
-        self.vars[name] = value
+        slot = self.symbols.slots.get(name)
+        if slot is None:
+            # variables listed after `with` belong to the outer scope
+            self.parent.set(name, value)
+        else:
+            self.slots[slot] = value
 
     def get(self, name):
-        if name in self.vars:
-            return self.vars[name]
-        return self.global_variables.get(name)
-
+        slot = self.symbols.slots.get(name)
+        if slot is not None and (value := self.slots[slot]) is not UNSET:
+            return value
+        return self.parent.get(name)
@@ -0,0 +1,484 @@
+import asyncio
+from time import perf_counter
+from Commands import *
+from ASTwithCalculation import AST
+from VariableScopeClass import VariableScope
+from Budget import Budget
+from expression_builder.useful import ASTtoString
+
+
+EVAL, STORE, POP, JUMP, JUMP_IF_FALSE, FOR_RANGE, FOR_ITER, MAKE_FUNCTION, MAKE_ADVANCE_FUNCTION, RETURN, \
+    RETURN_NONE, SET, EXPRESSION, JUMP_UNLESS, SET_LOCAL, PARALLEL_FOR, AWAIT_CALL, HOIST, AWAIT_EVAL = range(19)
+
+FOR_END = object()
+
+OPCODE_NAMES = ('EVAL', 'STORE', 'POP', 'JUMP', 'JUMP_IF_FALSE', 'FOR_RANGE', 'FOR_ITER', 'MAKE_FUNCTION',
+                'MAKE_ADVANCE_FUNCTION', 'RETURN', 'RETURN_NONE', 'SET', 'EXPRESSION', 'JUMP_UNLESS',
+                'SET_LOCAL', 'PARALLEL_FOR', 'AWAIT_CALL', 'HOIST', 'AWAIT_EVAL')
+
+# SET, EXPRESSION and JUMP_UNLESS are superinstructions for EVAL followed by STORE, POP and JUMP_IF_FALSE:
+# most statements take one dispatch instead of two. SET_LOCAL is SET to a slot of function Frame.
+# PARALLEL_FOR runs code of loop body as separate program for every iteration.
+# AWAIT_CALL is SET, SET_LOCAL or EXPRESSION calling functions in code for asyncio (`y = int(input()) + 1`), it awaits
+# def and fn functions and async variants of builtins. AWAIT_EVAL is such EVAL, conditions calling functions are
+# AWAIT_EVAL followed by JUMP_IF_FALSE. Both are evaluated as usual when the code runs synchronously.
+# HOIST sets hidden variables of optimized loop which follows, or jumps to the loop as written when they fail.
+# It runs after the loop as written checked its condition or took the first value, so empty loop computes nothing
+
+
+class BytecodeCompiler:
+    """Flattens Command objects into a list of (opcode, argument) instructions, blocks become jumps"""
+
+    class LoopControlOutsideLoopException(Exception):
+        def __init__(self, command):
+            self.command = command
+
+        def __repr__(self):
+            return '{} outside of loop'.format('break' if isinstance(self.command, BreakCommand) else 'continue')
+
+    class UnknownCommandException(Exception):
+        def __init__(self, command):
+            self.command = command
+
+        def __repr__(self):
+            return 'Command {} can not be compiled to bytecode'.format(type(self.command).__name__)
+
+    def __init__(self, asynchronous=False, symbols=None):
+        self.code = []
+        self.loops = []  # (continue target, jumps to patch with the end of loop) for every loop being compiled
+        self.asynchronous, self.symbols = asynchronous, symbols  # symbols of function which body is compiled
+
+    def emit(self, opcode, argument=None):
+        self.code.append((opcode, argument))
+        return len(self.code) - 1
+
+    def patch(self, index, target=None):
+        opcode, argument = self.code[index]
+        if opcode in (FOR_ITER, JUMP_UNLESS, HOIST):
+            self.code[index] = (opcode, (argument[0], len(self.code) if target is None else target))
+        else:
+            self.code[index] = (opcode, len(self.code) if target is None else target)
+
+    def compile(self, commands):
+        self.compile_block(commands)
+        self.emit(RETURN_NONE)
+        return self.code
+
+    def compile_block(self, commands):
+        for command in commands:
+            self.compile_command(command)
+
+    def awaits(self, ast):
+        return self.asynchronous and AST.awaits(ast.ast, self.symbols)
+
+    def emit_eval(self, ast):
+        return self.emit(AWAIT_EVAL if self.awaits(ast) else EVAL, ast)
+
+    def emit_condition(self, ast):
+        """Jump to patch when ast is false, returns its index and index of the first instruction of condition"""
+        if self.awaits(ast):
+            start = self.emit(AWAIT_EVAL, ast)
+            return self.emit(JUMP_IF_FALSE), start
+        jump = self.emit(JUMP_UNLESS, (ast, None))
+        return jump, jump
+
+    def compile_command(self, command):
+        if isinstance(command, (SetVariableCommand, ExpressionCommand)) and self.awaits(command.ast):
+            store = command.slot if isinstance(command, SetLocalCommand) else \
+                command.var_name if isinstance(command, SetVariableCommand) else None
+            self.emit(AWAIT_CALL, (store, command.ast))
+
+        elif isinstance(command, SetLocalCommand):
+            self.emit(SET_LOCAL, (command.slot, command.ast))
+
+        elif isinstance(command, SetVariableCommand):
+            self.emit(SET, (command.var_name, command.ast))
+
+        elif isinstance(command, ExpressionCommand):
+            self.emit(EXPRESSION, command.ast)
+
+        elif isinstance(command, CreateFunctionCommand):
+            self.emit(MAKE_FUNCTION, command)
+            self.emit(STORE, command.func_name)
+
+        elif isinstance(command, CreateAdvanceFunctionCommand):
+            code = BytecodeCompiler(self.asynchronous, command.symbols).compile(command.commands)
+            self.emit(MAKE_ADVANCE_FUNCTION, (command.args, command.with_vars, code, command.symbols))
+            self.emit(STORE, command.func_name)
+
+        elif isinstance(command, ReturnCommand):
+            self.emit_eval(command.ast)
+            self.emit(RETURN)
+
+        elif isinstance(command, IfCommand):
+            jumps_to_end = []
+            while command is not None:
+                jump_to_next, _ = self.emit_condition(command.condition_ast)
+                self.compile_block(command.commands)
+                if command.next_if_command is not None:
+                    jumps_to_end.append(self.emit(JUMP))
+                self.patch(jump_to_next)
+                command = command.next_if_command
+            for jump in jumps_to_end:
+                self.patch(jump)
+
+        elif isinstance(command, LoopCommand) and command.original is not None:
+            self.compile_optimized_loop(command)
+
+        elif isinstance(command, ParallelForCommand):
+            self.emit_eval(command.from_ast)
+            self.emit_eval(command.to_ast)
+            self.emit(PARALLEL_FOR, (command, BytecodeCompiler(self.asynchronous, self.symbols).compile_parallel_body(
+                command.commands)))
+
+        elif isinstance(command, (WhileCommand, ForCommand)):
+            self.compile_loop(command)
+
+        elif isinstance(command, (BreakCommand, ContinueCommand)):
+            if not self.loops:
+                raise BytecodeCompiler.LoopControlOutsideLoopException(command)
+            start, jumps_to_end = self.loops[-1]
+            if isinstance(command, BreakCommand) or start is None:  # continue ends iteration of parallel for
+                jumps_to_end.append(self.emit(JUMP))
+            else:
+                self.emit(JUMP, start)
+
+        else:
+            raise BytecodeCompiler.UnknownCommandException(command)
+
+    def compile_loop(self, command):
+        jumps_to_end = []
+        self.compile_range(command)
+        self.compile_iterations(command, jumps_to_end)
+        self.end_loop(command, jumps_to_end)
+
+    def compile_optimized_loop(self, command):
+        """Loop as written checks its condition or takes the first value of range, only then HOIST computes hidden
+        variables and enters body of optimized loop, or body of loop as written when they fail. Both loops share
+        range iterator and end"""
+        jumps_to_end = []
+        self.compile_range(command)
+        self.compile_check(command.original, jumps_to_end)
+        hoist = self.emit(HOIST, (command, None))
+        self.compile_iterations(command, jumps_to_end, self.emit(JUMP))
+        self.compile_iterations(command.original, jumps_to_end, hoist)
+        self.end_loop(command, jumps_to_end)
+
+    def compile_range(self, command):
+        if isinstance(command, ForCommand):
+            self.emit_eval(command.from_ast)
+            self.emit_eval(command.to_ast)
+            self.emit(FOR_RANGE, command)
+
+    def compile_check(self, command, jumps_to_end):
+        """Condition of while or taking next value of for, leaving loop when it ends. Returns index of its start"""
+        if isinstance(command, WhileCommand):
+            jump, start = self.emit_condition(command.condition_ast)
+        else:
+            jump = start = self.emit(FOR_ITER, (command.var_name, None))
+        jumps_to_end.append(jump)
+        return start
+
+    def compile_iterations(self, command, jumps_to_end, entry=None):
+        """Check and body of loop, entry is jump to body which skips the first check"""
+        start = self.compile_check(command, jumps_to_end)
+        if entry is not None:
+            self.patch(entry)
+        self.compile_loop_body(command.commands, start, jumps_to_end)
+        self.emit(JUMP, start)
+
+    def end_loop(self, command, jumps_to_end):
+        for jump in jumps_to_end:
+            self.patch(jump)
+        if isinstance(command, ForCommand):
+            self.emit(POP)  # range iterator
+
+    def compile_loop_body(self, commands, start, jumps_to_end):
+        self.loops.append((start, jumps_to_end))
+        self.compile_block(commands)
+        self.loops.pop()
+
+    def compile_parallel_body(self, commands):
+        jumps_to_end = []
+        self.compile_loop_body(commands, None, jumps_to_end)
+        for jump in jumps_to_end:
+            self.patch(jump)
+        self.emit(RETURN_NONE)
+        return self.code
+
+    @staticmethod
+    def disassemble(code, indent=''):
+        lines = []
+        for i, (opcode, argument) in enumerate(code):
+            if opcode == MAKE_ADVANCE_FUNCTION:
+                lines.append('{}{:>4} {} {}'.format(indent, i, OPCODE_NAMES[opcode], argument[:2]))
+                lines.append(BytecodeCompiler.disassemble(argument[2], indent + '    '))
+            elif opcode in (EVAL, EXPRESSION, AWAIT_EVAL):
+                lines.append('{}{:>4} {} {}'.format(indent, i, OPCODE_NAMES[opcode], ASTtoString(argument.ast).convert()))
+            elif opcode == MAKE_FUNCTION:
+                lines.append('{}{:>4} {} {} {}{}'.format(indent, i, OPCODE_NAMES[opcode], argument.args,
+                                                         ASTtoString(argument.ast.ast).convert(),
+                                                         '' if argument.memo_size is None else '  memoized'))
+            elif opcode in (SET, SET_LOCAL, JUMP_UNLESS, AWAIT_CALL):
+                first, second = argument if opcode != JUMP_UNLESS else argument[::-1]
+                lines.append('{}{:>4} {} {} {}'.format(indent, i, OPCODE_NAMES[opcode], first,
+                                                       ASTtoString(second.ast).convert()))
+            elif opcode == PARALLEL_FOR:
+                lines.append('{}{:>4} {} {} {}'.format(indent, i, OPCODE_NAMES[opcode], argument[0].var_name,
+                                                       argument[0].reductions))
+                lines.append(BytecodeCompiler.disassemble(argument[1], indent + '    '))
+            elif opcode == FOR_RANGE:
+                lines.append('{}{:>4} {} {}'.format(indent, i, OPCODE_NAMES[opcode], argument.direction))
+            elif opcode == HOIST:
+                command, target = argument
+                lines.append('{}{:>4} {} {}'.format(indent, i, OPCODE_NAMES[opcode], target))
+                for name, ast, _ in command.hoisted:
+                    lines.append('{}{:>4} {} = {}'.format(indent, '', name, ASTtoString(ast.ast).convert()))
+            else:
+                lines.append('{}{:>4} {} {}'.format(indent, i, OPCODE_NAMES[opcode], '' if argument is None else argument))
+        return '\n'.join(lines)
+
+
+class VirtualMachine:
+
+    TIME_SLICE = 0.005  # seconds of running before code for asyncio lets other tasks run
+    CHECK_EVERY = 64  # back-edges between checks of time
+
+    @staticmethod
+    def execute(code, variable_scope):
+        stack, pc = [], 0
+        push, pop = stack.append, stack.pop
+        budget, steps = Budget.current.get(), 0  # back-edges not charged yet
+
+        while True:
+            opcode, argument = code[pc]
+            pc += 1
+
+            if opcode == SET_LOCAL:
+                slot, ast = argument
+                variable_scope.slots[slot] = ast.execute(variable_scope)
+            elif opcode == SET:
+                var_name, ast = argument
+                variable_scope.set(var_name, ast.execute(variable_scope))
+            elif opcode == JUMP_UNLESS:
+                ast, target = argument
+                if not ast.execute(variable_scope):
+                    pc = target
+            elif opcode == JUMP:
+                if budget is not None and argument < pc:
+                    steps += 1
+                    if steps == Budget.CHUNK:
+                        budget.charge(steps)
+                        steps = 0
+                pc = argument
+            elif opcode == FOR_ITER:
+                var_name, end = argument
+                value = next(stack[-1], FOR_END)
+                if value is FOR_END:
+                    pc = end
+                else:
+                    variable_scope.set(var_name, value)
+            elif opcode == EXPRESSION:
+                argument.execute(variable_scope)
+            elif opcode == EVAL:
+                push(argument.execute(variable_scope))
+            elif opcode == STORE:
+                variable_scope.set(argument, pop())
+            elif opcode == JUMP_IF_FALSE:
+                if not pop():
+                    pc = argument
+            elif opcode == POP:
+                pop()
+            elif opcode == FOR_RANGE:
+                to_value = pop()
+                push(iter(argument.iterations(pop(), to_value)))
+            elif opcode == HOIST:
+                command, original = argument
+                if not command.hoist(variable_scope):
+                    pc = original
+            elif opcode == RETURN:
+                if budget is not None:
+                    budget.charge(steps)
+                return pop()
+            elif opcode == RETURN_NONE:
+                if budget is not None:
+                    budget.charge(steps)
+                return None
+            elif opcode == MAKE_FUNCTION:
+                push(argument.create(variable_scope))
+            elif opcode == MAKE_ADVANCE_FUNCTION:
+                argument_names, with_vars, function_code, symbols = argument
+                push(FunctionBytecode(argument_names, with_vars, function_code, variable_scope, symbols))
+            elif opcode == PARALLEL_FOR:
+                command, body_code = argument
+                to_value = pop()
+                command.run_parallel(command.iterations(pop(), to_value),
+                                     VirtualMachine.parallel_iteration(command.var_name, body_code, variable_scope),
+                                     variable_scope.get, variable_scope.set, variable_scope.delete)
+
+            elif opcode == AWAIT_CALL:
+                store, ast = argument
+                VirtualMachine.store(variable_scope, store, ast.execute(variable_scope))
+            elif opcode == AWAIT_EVAL:
+                push(argument.execute(variable_scope))
+
+    @staticmethod
+    def store(variable_scope, store, value):
+        if store.__class__ is int:
+            variable_scope.slots[store] = value
+        elif store is not None:
+            variable_scope.set(store, value)
+
+    @staticmethod
+    async def execute_async(code, variable_scope):
+        """The same as execute for code compiled for asyncio. Other tasks run when time slice is over at back-edge
+        of loop and while it waits for async builtins, also in functions called by AWAIT_CALL and AWAIT_EVAL"""
+        stack, pc = [], 0
+        push, pop = stack.append, stack.pop
+        back_edges, slice_start = 0, perf_counter()
+        budget, steps = Budget.current.get(), 0
+
+        while True:
+            opcode, argument = code[pc]
+            pc += 1
+
+            if opcode == SET_LOCAL:
+                slot, ast = argument
+                variable_scope.slots[slot] = ast.execute(variable_scope)
+            elif opcode == SET:
+                var_name, ast = argument
+                variable_scope.set(var_name, ast.execute(variable_scope))
+            elif opcode == JUMP_UNLESS:
+                ast, target = argument
+                if not ast.execute(variable_scope):
+                    pc = target
+            elif opcode == JUMP:
+                if argument < pc:
+                    back_edges += 1
+                    if budget is not None:
+                        steps += 1
+                        if steps == Budget.CHUNK:
+                            budget.charge(steps)
+                            steps = 0
+                    if not back_edges % VirtualMachine.CHECK_EVERY and \
+                            perf_counter() - slice_start > VirtualMachine.TIME_SLICE:
+                        await asyncio.sleep(0)
+                        slice_start = perf_counter()
+                pc = argument
+            elif opcode == FOR_ITER:
+                var_name, end = argument
+                value = next(stack[-1], FOR_END)
+                if value is FOR_END:
+                    pc = end
+                else:
+                    variable_scope.set(var_name, value)
+            elif opcode == EXPRESSION:
+                argument.execute(variable_scope)
+            elif opcode == AWAIT_CALL:
+                store, ast = argument
+                VirtualMachine.store(variable_scope, store, await ast.execute_async(variable_scope))
+            elif opcode == AWAIT_EVAL:
+                push(await argument.execute_async(variable_scope))
+            elif opcode == EVAL:
+                push(argument.execute(variable_scope))
+            elif opcode == STORE:
+                variable_scope.set(argument, pop())
+            elif opcode == JUMP_IF_FALSE:
+                if not pop():
+                    pc = argument
+            elif opcode == POP:
+                pop()
+            elif opcode == FOR_RANGE:
+                to_value = pop()
+                push(iter(argument.iterations(pop(), to_value)))
+            elif opcode == HOIST:
+                command, original = argument
+                if not command.hoist(variable_scope):
+                    pc = original
+            elif opcode == RETURN:
+                if budget is not None:
+                    budget.charge(steps)
+                return pop()
+            elif opcode == RETURN_NONE:
+                if budget is not None:
+                    budget.charge(steps)
+                return None
+            elif opcode == MAKE_FUNCTION:
+                push(argument.create(variable_scope))
+            elif opcode == MAKE_ADVANCE_FUNCTION:
+                argument_names, with_vars, function_code, symbols = argument
+                push(FunctionBytecode(argument_names, with_vars, function_code, variable_scope, symbols))
+            elif opcode == PARALLEL_FOR:
+                command, body_code = argument
+                to_value = pop()
+                command.run_parallel(command.iterations(pop(), to_value),
+                                     VirtualMachine.parallel_iteration(command.var_name, body_code, variable_scope),
+                                     variable_scope.get, variable_scope.set, variable_scope.delete)
+
+    @staticmethod
+    async def call_async(function, arguments_values):
+        budget = Budget.current.get()
+        if budget is not None:
+            budget.enter()
+        try:
+            result = await VirtualMachine.execute_async(function.code,
+                                                        function.create_local_variables(arguments_values))
+            while result.__class__ is TailCall:
+                if budget is not None:
+                    budget.charge()
+                local_variables = function.create_local_variables(result.arguments)
+                result = await VirtualMachine.execute_async(function.code, local_variables)
+            return result
+        finally:
+            if budget is not None:
+                budget.depth -= 1
+
+    @staticmethod
+    def parallel_iteration(var_name, code, variable_scope):
+        def run_iteration(value):
+            variable_scope.set(var_name, value)
+            VirtualMachine.execute(code, variable_scope)
+        return run_iteration
+
+
+class FunctionBytecode(FunctionAdvance):
+    def __init__(self, argument_names, with_vars, code, variable_scope, symbols):
+        super().__init__(argument_names, with_vars, [], variable_scope, symbols)
+        self.code = code
+
+    def execute_async(self, arguments_values, variable_scope):
+        return VirtualMachine.call_async(self, arguments_values)
+
+    def run(self, arguments_values, budget=None):
+        result = VirtualMachine.execute(self.code, self.create_local_variables(arguments_values))
+        while result.__class__ is TailCall:
+            if budget is not None:
+                budget.charge()
+            result = VirtualMachine.execute(self.code, self.create_local_variables(result.arguments))
+        return result
+
+
+class CompiledBytecode:
+    def __init__(self, compiled):
+        self.code = BytecodeCompiler().compile(compiled.compiled_commands)
+
+    def run(self, variables=None):
+        variable_scope = VariableScope()
+        if variables:
+            variable_scope.vars.update(variables)
+        VirtualMachine.execute(self.code, variable_scope)
+        return variable_scope.visible_vars()
+
+
+class CompiledAsync:
+    """Program compiled to bytecode run by asyncio event loop, many programs can run on one thread at once"""
+
+    def __init__(self, compiled):
+        self.code = BytecodeCompiler(asynchronous=True).compile(compiled.compiled_commands)
+
+    async def run(self, variables=None):
+        variable_scope = VariableScope()
+        if variables:
+            variable_scope.vars.update(variables)
+        await VirtualMachine.execute_async(self.code, variable_scope)
+        return variable_scope.visible_vars()
@@ -1,183 +1,164 @@
-from expression_builder import build_ast
-import re
-from VariableScopeClass import VariableScope
-from ASTwithCalculation import AST
-from Commands import *
+from Compiler import Compiler
+from VirtualMachine import CompiledBytecode, CompiledAsync, BytecodeCompiler
+from Transpiler import CompiledPython
+from CompilationCache import CompilationCache
+from Commands import MemoizedFunction, ParallelForCommand
+from ASTwithCalculation import InlineCache
+from Profiler import Profiler
+from BatchRunner import BatchRunner
+from Repl import Repl
+from Budget import Budget
+from my_builtins import OUTPUT
+from time import perf_counter
+from contextlib import nullcontext
 import argparse
+import asyncio
+import sys
 
 
-class Compiled:
-    def __init__(self, compiled_commands, variable_scope):
-        self.compiled_commands = compiled_commands
-        self.variable_scope = variable_scope
-
-    def run(self):
-        self.variable_scope.clear()
-        for cmd in self.compiled_commands:
-            cmd.execute()
-
-
-class Compiler:
-
-    class InvalidLineException(Exception):
-        pass
-
-    class InvalidElifException(Exception):
-        pass
-
-    def __init__(self, text):
-        self.lines = list(filter(lambda x: x[1], map(self.prepare_line, text.split('\n'))))
-
-    @staticmethod
-    def replace_tabulation(line):
-        return line.replace('\t', '    ')
-
-    @staticmethod
-    def remove_comment(line):
-        if '#' in line:
-            return line[:line.index('#')]
-        return line
-
-    @staticmethod
-    def add_level(line):
-        spaces = re.search(r'^(    )*', line).group()
-        return len(spaces)//4, line.strip()
-
-    def prepare_line(self, line):
-        return self.add_level(self.replace_tabulation(self.remove_comment(line)))
-
-    @staticmethod
-    def find_block_end(lines, i):
-        try:
-            return next(j for j in range(i+1, len(lines)) if lines[j][0] <= lines[i][0])
-        except StopIteration:
-            return len(lines)
-
-    def compile(self, lines=None, variable_scope=None, in_commands=False):
-        variable_scope = variable_scope or VariableScope()
-        lines = self.lines if lines is None else lines
-        commands = []
-
-        i = 0
-        while i < len(lines):
-            priority, line = lines[i]
-            if match := re.match(r'^([a-zA-Z_]\w*)\s*=(.*)$', line):
-                var_name, ast = match.group(1), AST(build_ast(match.group(2)))
-                commands.append(SetVariableCommand(variable_scope, var_name, ast))
-                i += 1
-
-            elif match := re.match(r'^fn\s+([a-zA-Z_]\w*)\s*\((([a-zA-Z_]\w*(\s*,\s*[a-zA-Z_]\w*)*)?)\)\s*=>(.*)$', line):
-                (func_name, arguments), ast = match.group(1, 2), AST(build_ast(match.group(5)))
-                args = re.findall(r'[a-zA-Z_]\w*', arguments)
-                commands.append(CreateFunctionCommand(variable_scope, func_name, args, ast))
-                i += 1
-
-            elif match := re.match(r'^def\s+([a-zA-Z_]\w*)\s*\(([a-zA-Z_]\w*(\s*,\s*[a-zA-Z_]\w*)*)?\)'
-                                   r'\s*(\s+with\s+([a-zA-Z_]\w*(\s*,\s*[a-zA-Z_]\w*)*))?:$', line):
-                func_name, arguments, with_vars = match.group(1, 2, 5)
-
-                args = re.findall(r'[a-zA-Z_]\w*', arguments or '')
-                with_vars = re.findall(r'[a-zA-Z_]\w*', with_vars or '')
-
-                end_of_block = self.find_block_end(lines, i)
-                block = self.compile(lines[i+1:end_of_block], variable_scope, True)
-                commands.append(CreateAdvanceFunctionCommand(func_name, args, with_vars, variable_scope, block))
-                i = end_of_block
-
-            elif match := re.match(r'^return\s+(.*)$', line):
-                ast = AST(build_ast(match.group(1)))
-                commands.append(ReturnCommand(variable_scope, ast))
-                i += 1
-
-            elif match := re.match(r'^if\b(.*):$', line):
-                ast = AST(build_ast(match.group(1)))
-                end_of_block = self.find_block_end(lines, i)
-                block = self.compile(lines[i+1:end_of_block], variable_scope, True)
-                commands.append(IfCommand(variable_scope, ast, block))
-                i = end_of_block
-
-            elif match := re.match(r'^elif\b(.*):$', line):
-                ast = AST(build_ast(match.group(1)))
-                end_of_block = self.find_block_end(lines, i)
-                block = self.compile(lines[i+1:end_of_block], variable_scope, True)
-                cmd = IfCommand(variable_scope, ast, block)
-
-                if len(commands) > 0 and isinstance(commands[-1], IfCommand):
-                    commands[-1].end().hook_up(cmd)
-                else:
-                    raise Compiler.InvalidElifException
-
-                i = end_of_block
-
-            elif re.match(r'^else\s*:$', line):
-                ast = AST(build_ast('1'))
-                end_of_block = self.find_block_end(lines, i)
-                block = self.compile(lines[i+1:end_of_block], variable_scope, True)
-                cmd = IfCommand(variable_scope, ast, block)
-
-                if len(commands) > 0 and isinstance(commands[-1], IfCommand):
-                    commands[-1].end().hook_up(cmd)
-                else:
-                    raise Compiler.InvalidElifException
-
-                i = end_of_block
-
-            elif match := re.match(r'^while\b(.*):$', line):
-                ast = AST(build_ast(match.group(1)))
-                end_of_block = self.find_block_end(lines, i)
-                block = self.compile(lines[i+1:end_of_block], variable_scope, True)
-                commands.append(WhileCommand(variable_scope, ast, block))
-                i = end_of_block
-
-            elif match := re.match(r'^for\s+([a-zA-Z_]\w*)\s*=(.*)\s+(to|downto)\s+(.*):$', line):
-                var_name, from_expr, direction, to_expr = match.group(1, 2, 3, 4)
-                from_ast, to_ast = AST(build_ast(from_expr)), AST(build_ast(to_expr))
-                direction = ForCommand.UP if direction == 'to' else ForCommand.DOWN
-
-                end_of_block = self.find_block_end(lines, i)
-                block = self.compile(lines[i+1:end_of_block], variable_scope, True)
-                commands.append(ForCommand(variable_scope, var_name, from_ast, to_ast, block, direction))
-                i = end_of_block
-
-            elif re.match(r'break', line):
-                commands.append(BreakCommand())
-                i += 1
-
-            elif re.match(r'continue', line):
-                commands.append(ContinueCommand())
-                i += 1
-
-            else:
-                commands.append(ExpressionCommand(variable_scope, AST(build_ast(line))))
-                i += 1
-
-        if in_commands:
-            return commands
-        return Compiled(commands, variable_scope)
-
-
-def parse_args():
+def parse_args(argv=None):
     parser = argparse.ArgumentParser()
-    parser.add_argument('--src', type=str, help='file with code to execute location', required=True)
-    args = parser.parse_args()
-    return args.src
+    parser.add_argument('--src', type=str, default=None,
+                        help='file with code to execute location, interactive session starts without it')
+    parser.add_argument('--no-fold', action='store_true', help='disable constant folding of expressions')
+    parser.add_argument('--dump-ast', action='store_true', help='print expressions before and after optimization')
+    parser.add_argument('--engine', choices=('tree', 'vm', 'python', 'async'), default='tree',
+                        help='execute command tree directly, compile it to bytecode for virtual machine '
+                             '(async runs it on asyncio event loop) or transpile it to python')
+    parser.add_argument('--dump-bytecode', action='store_true',
+                        help='print bytecode when running with --engine=vm or --engine=async')
+    parser.add_argument('--dump-python', action='store_true',
+                        help='print transpiled source when running with --engine=python')
+    parser.add_argument('--no-cache', action='store_true', help='always compile source, do not read or write cache')
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='directory for compiled programs, __aicache__ next to source by default')
+    parser.add_argument('--timing', action='store_true', help='print compile and run time')
+    parser.add_argument('--no-memoize', action='store_true', help='do not cache results of pure fn functions')
+    parser.add_argument('--memo-size', type=int, default=4096,
+                        help='results cached for every pure fn function, least recently used are evicted')
+    parser.add_argument('--memo-stats', action='store_true', help='print hits and misses of memoized functions')
+    parser.add_argument('--ic-stats', action='store_true',
+                        help='print how many binary operations were specialised for types of their operands')
+    parser.add_argument('--no-tail-calls', action='store_true',
+                        help='run self calls in tail position as ordinary recursion')
+    parser.add_argument('--no-loop-opt', action='store_true',
+                        help='do not move expressions which do not change in loops out of them')
+    parser.add_argument('--keep-dead-code', action='store_true',
+                        help='do not remove unused functions, branches which never run and unreachable statements')
+    parser.add_argument('--dump-dead-code', action='store_true', help='print code removed as dead')
+    parser.add_argument('--profile', action='store_true',
+                        help='print hits and time of every line and function, program runs with --engine=tree')
+    parser.add_argument('--profile-output', type=str, default=None,
+                        help='also write profile to this file as json, implies --profile')
+    parser.add_argument('--batch', type=str, default=None,
+                        help='run program once for every json object of this json lines file, keys of object are '
+                             'set as variables')
+    parser.add_argument('--batch-output', type=str, default=None,
+                        help='write output, result variable and error of every record to this json lines file '
+                             'instead of stdout')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='processes running records of --batch or iterations of parallel for, number of cpus '
+                             'by default')
+    parser.add_argument('--max-steps', type=int, default=None,
+                        help='stop program after this many iterations of loops and calls of functions')
+    parser.add_argument('--max-seconds', type=float, default=None, help='stop program running longer than this')
+    parser.add_argument('--max-depth', type=int, default=None, help='stop program nesting more calls than this')
+    return parser.parse_args(argv)
+
+
+def budget_limits(args):
+    """Limits of --max-* arguments, None without any of them"""
+    limits = {'max_steps': args.max_steps, 'max_seconds': args.max_seconds, 'max_depth': args.max_depth}
+    return limits if any(value is not None for value in limits.values()) else None
+
+
+def run_batch(compiled, args, source_code, compiler_options):
+    runner = BatchRunner(compiled, args.engine, args.workers, budget_limits(args), source_code, compiler_options)
+    with open(args.batch, 'r') as records_file:
+        if args.batch_output:
+            with open(args.batch_output, 'w') as results_file:
+                count, seconds = runner.run(records_file, results_file)
+        else:
+            count, seconds = runner.run(records_file, sys.stdout)
+    print('{} records in {:.3f} s, {:.1f} records/s with {} workers'.format(
+        count, seconds, count / seconds if seconds else float('inf'), runner.workers), file=sys.stderr)
+
 
+def main(args):
+    code_src = args.src
+    if code_src is None:
+        return Repl(not args.no_fold, args.dump_ast).run()
 
-def main(code_src):
     try:
         with open(code_src, 'r') as f:
             source_code = f.read()
     except FileNotFoundError:
         pass
 
+    ParallelForCommand.workers = args.workers
     try:
-        compiled = Compiler(source_code).compile()
-        compiled.run()
+        start = perf_counter()
+        profiling = args.profile or args.profile_output
+        # profile counts lines of loops as written
+        compiler_options = {'fold_constants': not args.no_fold, 'memoize': not args.no_memoize,
+                            'memo_size': args.memo_size, 'tail_calls': not args.no_tail_calls,
+                            'optimize_loops': not args.no_loop_opt and not profiling,
+                            'eliminate_dead_code': not args.keep_dead_code}
+        compile_program = lambda: Compiler(source_code, dump_ast=args.dump_ast, dump_dead_code=args.dump_dead_code,
+                                           **compiler_options).compile()
+        if args.no_cache or args.dump_ast or args.dump_dead_code:
+            compiled, cache_status = compile_program(), 'not used'
+        else:
+            compiled, loaded = CompilationCache(code_src, args.cache_dir).get_or_compile(
+                source_code, compiler_options, compile_program)
+            cache_status = 'hit' if loaded else 'miss'
+        if args.batch:
+            return run_batch(compiled, args, source_code, compiler_options)
+        profiler = None
+        if profiling:
+            profiler = Profiler(source_code)
+            compiled = profiler.instrument_compiled(compiled)
+        elif args.engine in ('vm', 'async'):
+            compiled = CompiledBytecode(compiled) if args.engine == 'vm' else CompiledAsync(compiled)
+            if args.dump_bytecode:
+                print(BytecodeCompiler.disassemble(compiled.code), file=sys.stderr)
+        elif args.engine == 'python':
+            compiled = CompiledPython(compiled)
+            if args.dump_python:
+                print(compiled.source, file=sys.stderr)
+        limits = budget_limits(args)
+        compiled_time = perf_counter()
+        try:
+            with Budget(**limits).active() if limits else nullcontext():
+                if args.engine == 'async' and profiler is None:
+                    asyncio.run(compiled.run())
+                else:
+                    compiled.run()
+        finally:
+            OUTPUT.flush()  # reports on stderr follow output of the program
+            if profiler is not None:
+                print(profiler.report(), file=sys.stderr)
+                if args.profile_output:
+                    with open(args.profile_output, 'w') as f:
+                        f.write(profiler.to_json())
+
+        if args.timing:
+            print('compile {:10.3f} ms  (cache {})'.format((compiled_time - start) * 1000, cache_status),
+                  file=sys.stderr)
+            print('run     {:10.3f} ms'.format((perf_counter() - compiled_time) * 1000), file=sys.stderr)
+        if args.memo_stats:
+            for name, (hits, misses, size) in sorted(MemoizedFunction.statistics().items()):
+                print('memo {:<16} hits {:>10}  misses {:>10}  cached {:>8}'.format(name, hits, misses, size),
+                      file=sys.stderr)
+        if args.ic_stats:
+            for state, count in sorted(InlineCache.statistics().items()):
+                print('inline caches {:<24} {:>8}'.format(state, count), file=sys.stderr)
     except Exception as e:
+        # message goes after everything the program printed before the error
         if hasattr(e, '__repr__'):
-            print(e.__repr__())
+            OUTPUT.print(e.__repr__())
         else:
-            print(e)
+            OUTPUT.print(e)
 
 
 if __name__ == '__main__':
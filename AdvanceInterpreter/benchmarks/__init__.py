@@ -0,0 +1,33 @@
+"""
+Benchmarks of the interpreter, run from console:
+
+    python AdvanceInterpreter/benchmarks                          time every stage of every program in corpus
+    python AdvanceInterpreter/benchmarks --save-baseline=FILE     ... and store results
+    python AdvanceInterpreter/benchmarks --baseline=FILE          ... and flag regressions against stored results
+    python AdvanceInterpreter/benchmarks --comparisons            compare alternative implementations of internals
+"""
+import os
+from time import perf_counter
+
+
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+
+def load_corpus(names=None):
+    """Returns {program name: source} of programs in corpus directory, name is file name without extension"""
+    corpus = {}
+    for file_name in sorted(os.listdir(CORPUS_DIRECTORY)):
+        name, extension = os.path.splitext(file_name)
+        if extension == '.ai' and (names is None or name in names):
+            with open(os.path.join(CORPUS_DIRECTORY, file_name), 'r') as f:
+                corpus[name] = f.read()
+    return corpus
+
+
+def best_time(function, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        best = min(best, perf_counter() - start)
+    return best
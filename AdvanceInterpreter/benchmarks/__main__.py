@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+
+# modules of the interpreter are imported by plain names, as when it is run itself
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import load_corpus
+from benchmarks.stages import StageBenchmark
+from benchmarks.baseline import Baseline
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='benchmarks')
+    parser.add_argument('programs', nargs='*', help='names of corpus programs to run, all by default')
+    parser.add_argument('--stages', nargs='+', choices=StageBenchmark.STAGES, default=StageBenchmark.STAGES,
+                        help='stages to time, all by default')
+    parser.add_argument('--repeat', type=int, default=3, help='best time of this many repeats is taken')
+    parser.add_argument('--save-baseline', type=str, default=None, help='store results to this json file')
+    parser.add_argument('--baseline', type=str, default=None, help='compare results with this json file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown or memory growth reported as regression, 0.1 by default')
+    parser.add_argument('--comparisons', action='store_true',
+                        help='compare alternative implementations of internals instead')
+    return parser.parse_args()
+
+
+def format_memory(size):
+    return '{:.1f} KiB'.format(size / 1024)
+
+
+def main(args):
+    if args.comparisons:
+        from benchmarks.comparisons import run_comparisons
+        run_comparisons()
+        return 0
+
+    corpus = load_corpus(args.programs or None)
+    results = {}
+    print('{:<22} {:<11} {:>12} {:>24} {:>12}'.format('program', 'stage', 'time', 'ops/s', 'peak memory'))
+    for name, source in corpus.items():
+        results[name] = StageBenchmark(source, args.repeat).run(args.stages)
+        for stage, result in results[name].items():
+            print('{:<22} {:<11} {:>10.3f}ms {:>12.0f} {:<11} {:>12}'.format(
+                name, stage, result['seconds'] * 1000, result['ops_per_second'], result['unit'] + '/s',
+                format_memory(result['peak_memory'])))
+
+    regressions = 0
+    if args.baseline:
+        print('\nCompared with {}:'.format(args.baseline))
+        for program, stage, speed, memory, verdict in Baseline.load(args.baseline).compare(results, args.threshold):
+            regressions += verdict == Baseline.REGRESSION
+            print('{:<22} {:<11} speed x{:<8.2f} memory x{:<8.2f} {}'.format(program, stage, speed, memory, verdict))
+        print('{} regressions'.format(regressions))
+
+    if args.save_baseline:
+        Baseline(results).save(args.save_baseline)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
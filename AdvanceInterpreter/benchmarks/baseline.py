@@ -0,0 +1,54 @@
+import json
+import platform
+import sys
+
+
+class Baseline:
+    """Results of benchmarks stored in json file, new results are compared with them stage by stage"""
+
+    class InvalidBaselineException(Exception):
+        def __init__(self, path):
+            self.path = path
+
+        def __repr__(self):
+            return 'File {} is not a benchmark baseline'.format(self.path)
+
+    IMPROVED, UNCHANGED, REGRESSION = 'improved', 'unchanged', 'REGRESSION'
+
+    MEMORY_TOLERANCE = 64 * 1024  # growth of peak memory smaller than this is noise of allocator
+
+    def __init__(self, results):
+        self.results = results  # {program: {stage: results of StageBenchmark}}
+
+    @staticmethod
+    def load(path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or 'results' not in data:
+            raise Baseline.InvalidBaselineException(path)
+        return Baseline(data['results'])
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({'python': sys.version, 'platform': platform.platform(), 'results': self.results}, f, indent=2)
+
+    def compare(self, results, threshold):
+        """Yields (program, stage, speed ratio, memory ratio, verdict) for stages present in both results.
+        Stage is a regression when it is slower or takes more memory than threshold allows"""
+        for program, stages in results.items():
+            for stage, current in stages.items():
+                saved = self.results.get(program, {}).get(stage)
+                if saved is None:
+                    continue
+
+                speed = current['ops_per_second'] / saved['ops_per_second']
+                memory = current['peak_memory'] / saved['peak_memory'] if saved['peak_memory'] else 1.0
+                more_memory = memory > 1 + threshold and \
+                    current['peak_memory'] - saved['peak_memory'] > Baseline.MEMORY_TOLERANCE
+                if speed < 1 - threshold or more_memory:
+                    verdict = Baseline.REGRESSION
+                elif speed > 1 + threshold:
+                    verdict = Baseline.IMPROVED
+                else:
+                    verdict = Baseline.UNCHANGED
+                yield program, stage, speed, memory, verdict
@@ -0,0 +1,343 @@
+"""
+Comparisons of alternative implementations of interpreter internals, run from console:
+
+    python AdvanceInterpreter/benchmarks --comparisons
+"""
+import asyncio
+import gc
+import io
+import os
+import tempfile
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from Compiler import Compiler
+from ASTwithCalculation import AST
+from VirtualMachine import CompiledBytecode
+from Transpiler import CompiledPython
+from CompilationCache import CompilationCache
+from Profiler import Profiler
+from Program import Program
+from expression_builder import Lexer, Parser, prepare_tokens
+from benchmarks import load_corpus, best_time
+from my_builtins import numpy
+
+
+PROGRAMS = load_corpus(['arithmetic_for_loop', 'arithmetic_while_loop', 'recursive_fn', 'recursive_def'])
+
+ENGINE_PROGRAMS = dict(PROGRAMS, **load_corpus(['loop_control']))
+
+
+def recursive_execute(self, variables):
+    return AST.recursive(self.ast, variables)
+
+
+def compare_evaluators():
+    print('Expression evaluation: AST.recursive vs compiled closures')
+    closure_execute = AST.execute
+    for name, source in PROGRAMS.items():
+        compiled = Compiler(source, memoize=False).compile()
+
+        AST.execute = recursive_execute
+        try:
+            recursive_time = best_time(compiled.run)
+        finally:
+            AST.execute = closure_execute
+        closure_time = best_time(compiled.run)
+
+        print(' | {:<24} recursive {:8.4f}s  closures {:8.4f}s  speedup x{:.2f}'.format(
+            name, recursive_time, closure_time, recursive_time / closure_time))
+
+
+def compare_engines():
+    print('Execution engines: command tree vs bytecode virtual machine')
+    for name, source in ENGINE_PROGRAMS.items():
+        compiled = Compiler(source, memoize=False).compile()
+        tree_time = best_time(compiled.run)
+        vm_time = best_time(CompiledBytecode(compiled).run)
+
+        print(' | {:<24} tree {:8.4f}s  vm {:8.4f}s  speedup x{:.2f}'.format(
+            name, tree_time, vm_time, tree_time / vm_time))
+
+
+def compare_inline_caches():
+    print('Binary nodes: generic closures vs specialised by inline caches')
+    for name, source in dict(ENGINE_PROGRAMS, **load_corpus(['mixed_types', 'strings'])).items():
+        AST.inline_caches = False
+        try:
+            generic_time = best_time(Compiler(source, memoize=False).compile().run)
+        finally:
+            AST.inline_caches = True
+        specialised_time = best_time(Compiler(source, memoize=False).compile().run)
+
+        print(' | {:<24} generic {:8.4f}s  specialised {:8.4f}s  speedup x{:.2f}'.format(
+            name, generic_time, specialised_time, generic_time / specialised_time))
+
+
+def compare_loop_optimizer():
+    print('Loops: expressions evaluated on every iteration vs invariant ones hoisted out of loop')
+    for name, source in dict(ENGINE_PROGRAMS, **load_corpus(['invariant_loops'])).items():
+        for engine, wrap in (('tree', lambda compiled: compiled), ('vm', CompiledBytecode),
+                             ('python', CompiledPython)):
+            plain = wrap(Compiler(source, memoize=False, optimize_loops=False).compile())
+            hoisted = wrap(Compiler(source, memoize=False).compile())
+            plain_time, hoisted_time = best_time(plain.run), best_time(hoisted.run)
+            print(' | {:<24} {:<6} plain {:8.4f}s  hoisted {:8.4f}s  speedup x{:.2f}'.format(
+                name, engine, plain_time, hoisted_time, plain_time / hoisted_time))
+
+
+def compare_transpiler():
+    print('Execution engines: command tree vs transpiled to python')
+    for name, source in ENGINE_PROGRAMS.items():
+        compiled = Compiler(source, memoize=False).compile()
+        tree_time = best_time(compiled.run)
+        python_time = best_time(CompiledPython(compiled).run)
+
+        print(' | {:<24} tree {:8.4f}s  python {:8.4f}s  speedup x{:.2f}'.format(
+            name, tree_time, python_time, tree_time / python_time))
+
+
+def compare_memoization():
+    print('Pure fn functions: evaluated on every call vs memoized')
+    for n in (15, 20, 25):
+        source = PROGRAMS['recursive_fn'].replace('fib(18)', 'fib({})'.format(n))
+        plain_time = best_time(Compiler(source, memoize=False).compile().run, 1)
+        memoized_time = best_time(Compiler(source).compile().run, 1)
+        print(' | fib({:>2})  plain {:8.4f}s  memoized {:8.4f}s  speedup x{:.0f}'.format(
+            n, plain_time, memoized_time, plain_time / memoized_time))
+
+
+TAIL_RECURSION = '''
+fn count(n, acc) => acc if n == 0 else count(n - 1, acc + n % 7)
+def steps(n, acc):
+    if n == 0:
+        return acc
+    return steps(n - 1, acc + 1)
+x = count({0}, 0) + steps({0}, 0)
+'''
+
+
+def compare_tail_calls():
+    print('Self calls in tail position: recursion vs loop')
+    for depth in (50, 100, 150):
+        source = TAIL_RECURSION.format(depth)
+        repeat = lambda compiled: lambda: [compiled.run() for _ in range(100)]
+        recursion_time = best_time(repeat(Compiler(source, memoize=False, tail_calls=False).compile()), 3)
+        loop_time = best_time(repeat(Compiler(source, memoize=False).compile()), 3)
+        print(' | depth {:>4} x100  recursion {:8.4f}s  loop {:8.4f}s  speedup x{:.2f}'.format(
+            depth, recursion_time, loop_time, recursion_time / loop_time))
+
+    source = TAIL_RECURSION.format(100000)
+    for tail_calls in (False, True):
+        try:
+            Compiler(source, memoize=False, tail_calls=tail_calls).compile().run()
+            result = 'ok'
+        except RecursionError:
+            result = 'RecursionError'
+        print(' | depth 100000  {:<9} {}'.format('loop' if tail_calls else 'recursion', result))
+
+
+def compare_profiler():
+    print('Profiling: plain run vs instrumented run')
+    for name, source in ENGINE_PROGRAMS.items():
+        plain_time = best_time(Compiler(source, memoize=False).compile().run)
+        profiled_time = best_time(Profiler(source).instrument_compiled(Compiler(source, memoize=False).compile()).run)
+        print(' | {:<24} plain {:8.4f}s  profiled {:8.4f}s  overhead x{:.2f}'.format(
+            name, plain_time, profiled_time, profiled_time / plain_time))
+
+
+ELEMENT_LOOP = '''
+s = 0
+for i = 0 to {0} - 1:
+    x = i * 0.5
+    s = s + x * x - 3 * x + 2
+'''
+
+WHOLE_ARRAY = '''
+x = arange(0, {0}) * 0.5
+s = sum(x * x - 3 * x + 2)
+'''
+
+
+def compare_arrays():
+    print('Numeric work: loop over elements vs whole array operations')
+    if numpy is None:
+        print(' | skipped, numpy is not installed')
+        return
+    for size in (1000, 10000, 100000):
+        loop_time = best_time(Compiler(ELEMENT_LOOP.format(size)).compile().run, 3)
+        array_time = best_time(Compiler(WHOLE_ARRAY.format(size)).compile().run, 3)
+        print(' | {:>7} elements  loop {:8.4f}s  array {:8.4f}s  speedup x{:.0f}'.format(
+            size, loop_time, array_time, loop_time / array_time))
+
+
+def long_expression(terms):
+    return ' + '.join("f(x{0}, 'item {0}') * {0}.5 - (y // {0} or z)".format(i) for i in range(terms))
+
+
+def compare_tokenizers():
+    print('Tokenizing: trying every TokenType vs single master pattern')
+    for terms in (10, 100, 1000):
+        lexer = Lexer(long_expression(terms))
+        tokens_count = len(lexer.tokenize())
+        trial_time = best_time(lexer.tokenize_by_trial, 3)
+        master_time = best_time(lexer.tokenize, 3)
+
+        print(' | {:>6} tokens  by trial {:>10.0f} tokens/s  master pattern {:>10.0f} tokens/s  speedup x{:.2f}'.format(
+            tokens_count, tokens_count / trial_time, tokens_count / master_time, trial_time / master_time))
+
+
+
+def nested_expression(depth):
+    expression = 'x'
+    for i in range(depth):
+        expression = '(f({0}, {1}) - {0} * (y if x else {0}))'.format(i, expression)
+    return expression
+
+
+def compare_parsers():
+    print('Parsing: recursive splitting vs precedence climbing')
+    expressions = [('long {} terms'.format(terms), long_expression(terms)) for terms in (10, 100, 1000)]
+    expressions += [('nested {} levels'.format(depth), nested_expression(depth)) for depth in (10, 40, 80)]
+
+    for name, expression in expressions:
+        parser = Parser(prepare_tokens(expression))
+        recursive_time = best_time(parser.build_recursively, 3)
+        climbing_time = best_time(parser.build, 3)
+
+        print(' | {:<18} recursive {:8.4f}s  precedence climbing {:8.4f}s  speedup x{:.2f}'.format(
+            name, recursive_time, climbing_time, recursive_time / climbing_time))
+
+
+
+def generated_program(lines_count, depth=6):
+    lines, i = [], 0
+    while len(lines) < lines_count:
+        lines.append('def f{}(a, b) with total:'.format(i))
+        for level in range(1, depth):
+            indent = '    ' * level
+            lines.append('{}x{} = a * {} + b // (a - {})'.format(indent, level, level, i))
+            lines.append('{}if x{} > total:'.format(indent, level))
+        lines.append('    ' * depth + 'total = total + 1')
+        lines.append('    return total')
+        i += 1
+    return '\n'.join(lines)
+
+
+def compile_scaling():
+    print('Compiling generated programs')
+    for lines_count in (1000, 10000, 100000):
+        source = generated_program(lines_count)
+        compile_time = best_time(lambda: Compiler(source).compile(), 1)
+        print(' | {:>7} lines  {:8.4f}s  {:>8.0f} lines/s'.format(lines_count, compile_time, lines_count / compile_time))
+
+
+def compare_dead_code():
+    print('Compiling library of functions of which program uses two: all kept vs unused ones removed')
+    for lines_count in (1000, 10000):
+        source = generated_program(lines_count) + '\ntotal = 0\nx = f0(1, 2) + f1(3, 4)'
+        results = []
+        for eliminate_dead_code in (False, True):
+            compile_program = lambda: Compiler(source, eliminate_dead_code=eliminate_dead_code).compile()
+            compile_time = best_time(compile_program, 3)
+            tracemalloc.start()
+            try:
+                compiled = compile_program()
+                gc.collect()  # removed expressions are freed by collector, their closures refer to them
+                retained = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            results.append((compile_time, retained / 1024, compiled))
+        (kept_time, kept_memory, _), (removed_time, removed_memory, _) = results
+        print(' | {:>7} lines  kept {:8.4f}s {:>9.0f} KiB  removed {:8.4f}s {:>9.0f} KiB  speedup x{:.2f}'.format(
+            lines_count, kept_time, kept_memory, removed_time, removed_memory, kept_time / removed_time))
+
+
+def compare_cache():
+    print('Startup: compiling source vs loading compiled program from cache')
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for lines_count in (100, 1000, 10000):
+            source = generated_program(lines_count)
+            cache = CompilationCache(os.path.join(cache_dir, 'program.ai'), cache_dir)
+            compile_program = lambda: Compiler(source).compile()
+
+            cold_time = best_time(lambda: cache.get_or_compile(source, {}, compile_program), 1)
+            warm_time = best_time(lambda: cache.get_or_compile(source, {}, compile_program), 3)
+            print(' | {:>7} lines  cold {:8.4f}s  warm {:8.4f}s  speedup x{:.2f}'.format(
+                lines_count, cold_time, warm_time, cold_time / warm_time))
+
+
+EMBEDDED_PROGRAM = '''
+s = 0
+for i = 1 to n:
+    s = s + i * i
+result = s
+'''
+
+
+def compare_embedding(runs=2000):
+    print('Embedding: compiling for every run vs one Program run from thread pool, {} runs'.format(runs))
+    inputs = [{'n': 20 + i % 30} for i in range(runs)]
+    recompile_time = best_time(lambda: [Compiler(EMBEDDED_PROGRAM).compile().run(variables) for variables in inputs], 1)
+    print(' | compile every run  {:10.0f} runs/s'.format(runs / recompile_time))
+    for engine in ('tree', 'python'):
+        program = Program(EMBEDDED_PROGRAM, engine)
+        for threads in (1, 4, 16):
+            with ThreadPoolExecutor(threads) as executor:
+                run_time = best_time(lambda: list(executor.map(lambda variables: program.run(variables, io.StringIO()),
+                                                               inputs)), 3)
+            print(' | {:<6} {:>2} threads  {:10.0f} runs/s'.format(engine, threads, runs / run_time))
+
+
+WAITING_PROGRAM = '''
+s = 0
+for step = 1 to 3:
+    sleep(0.02)
+    for i = 1 to 1000:
+        s = s + i
+result = s
+'''
+
+
+def compare_async(programs=100):
+    print('Waiting programs: one after another vs {} programs on one asyncio event loop'.format(programs))
+    sequential_program, async_program = Program(WAITING_PROGRAM, 'vm'), Program(WAITING_PROGRAM, 'async')
+    sequential_time = best_time(lambda: [sequential_program.run() for _ in range(programs)], 1)
+
+    async def run_all():
+        await asyncio.gather(*(async_program.run_async() for _ in range(programs)))
+    async_time = best_time(lambda: asyncio.run(run_all()), 1)
+    print(' | sequential {:8.4f}s  asyncio {:8.4f}s  speedup x{:.1f}'.format(
+        sequential_time, async_time, sequential_time / async_time))
+
+
+def compare_budget():
+    print('Budget: runs without limits vs metered runs with limits never reached')
+    for name, source in ENGINE_PROGRAMS.items():
+        for engine in ('tree', 'vm', 'python'):
+            program = Program(source, engine)
+            free_time = best_time(lambda: program.run(output=io.StringIO()))
+            metered_time = best_time(lambda: program.run(output=io.StringIO(), max_steps=1 << 60, max_seconds=3600))
+            depth_time = best_time(lambda: program.run(output=io.StringIO(), max_steps=1 << 60, max_depth=1 << 30))
+            print(' | {:<24} {:<6} free {:8.4f}s  metered {:8.4f}s  overhead {:+.1f}%  with depth {:+.1f}%'.format(
+                name, engine, free_time, metered_time, (metered_time / free_time - 1) * 100,
+                (depth_time / free_time - 1) * 100))
+
+
+def run_comparisons():
+    compare_evaluators()
+    compare_engines()
+    compare_inline_caches()
+    compare_loop_optimizer()
+    compare_transpiler()
+    compare_memoization()
+    compare_tail_calls()
+    compare_profiler()
+    compare_arrays()
+    compare_tokenizers()
+    compare_parsers()
+    compile_scaling()
+    compare_dead_code()
+    compare_cache()
+    compare_embedding()
+    compare_async()
+    compare_budget()
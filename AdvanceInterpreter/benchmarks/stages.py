@@ -0,0 +1,76 @@
+import tracemalloc
+from Compiler import Compiler
+from VirtualMachine import CompiledBytecode
+from Transpiler import CompiledPython
+from expression_builder import Lexer, Parser, prepare_tokens
+from benchmarks import best_time
+
+
+class RecordingCompiler(Compiler):
+    """Compiler which keeps every expression it builds, so lexer and parser can be timed alone"""
+
+    def __init__(self, text, **options):
+        super().__init__(text, **options)
+        self.expressions = []
+
+    def build_expression(self, expression, condition=False):
+        self.expressions.append(expression)
+        return super().build_expression(expression, condition)
+
+
+class StageBenchmark:
+    """Times every stage of running a program: lexing and parsing of its expressions, compiling of the whole
+    source and running it with every engine. Each stage reports operations per second and peak memory"""
+
+    STAGES = ('lex', 'parse', 'compile', 'run tree', 'run vm', 'run python')
+
+    def __init__(self, source, repeat=3):
+        self.source, self.repeat = source, repeat
+
+        compiler = RecordingCompiler(source)
+        self.compiled = compiler.compile()
+        self.expressions = compiler.expressions
+        self.tokens = [prepare_tokens(expression) for expression in self.expressions]
+        self.lines_count = len(compiler.lines)
+        self.tokens_count = sum(map(len, self.tokens))
+        self.bytecode, self.python = CompiledBytecode(self.compiled), CompiledPython(self.compiled)
+
+    def lex(self):
+        for expression in self.expressions:
+            Lexer(expression).tokenize()
+
+    def parse(self):
+        for tokens in self.tokens:
+            Parser(tokens).build()
+
+    def compile(self):
+        Compiler(self.source).compile()
+
+    def stage(self, name):
+        """Returns (function running the stage once, operations it does, name of operation)"""
+        return {'lex': (self.lex, self.tokens_count, 'tokens'),
+                'parse': (self.parse, len(self.expressions), 'expressions'),
+                'compile': (self.compile, self.lines_count, 'lines'),
+                'run tree': (self.compiled.run, 1, 'runs'),
+                'run vm': (self.bytecode.run, 1, 'runs'),
+                'run python': (self.python.run, 1, 'runs')}[name]
+
+    @staticmethod
+    def peak_memory(function):
+        tracemalloc.start()
+        try:
+            function()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def run(self, stages=STAGES):
+        """Returns {stage: {'seconds', 'operations', 'unit', 'ops_per_second', 'peak_memory'}}"""
+        results = {}
+        for name in stages:
+            function, operations, unit = self.stage(name)
+            seconds = best_time(function, self.repeat)
+            results[name] = {'seconds': seconds, 'operations': operations, 'unit': unit,
+                             'ops_per_second': operations / seconds if seconds else float('inf'),
+                             'peak_memory': self.peak_memory(function)}
+        return results
@@ -88,6 +88,10 @@ class Lexer:
         def __str__(self):
             return self.error_message
 
+    MASTER_PATTERN = re.compile('|'.join('(?P<{}>{})'.format(token_type.name, token_type.regex)
+                                         for token_type in TokenType.arr))
+    TOKEN_TYPES = {token_type.name: token_type for token_type in TokenType.arr}
+
     def __init__(self, origin):
         self.origin = origin
 
@@ -97,6 +101,27 @@ class Lexer:
                 return match.group()
 
     def tokenize(self):
+        """Scans origin once with MASTER_PATTERN, alternatives keep TokenType.arr order so result is the same
+        as trying every token type one after another"""
+        tokens, origin, position = [], self.origin, 0
+
+        if banned_word := self.has_banned_words(origin):
+            raise Lexer.BannedWordsException(banned_word)
+
+        match_at, token_types = self.MASTER_PATTERN.match, self.TOKEN_TYPES
+        while position < len(origin):
+            if (match := match_at(origin, position)) is None:
+                raise Lexer.InvalidTokenException(origin[position:])
+
+            token_type = token_types[match.lastgroup]
+            if token_type is not SPACE_TOKEN:
+                tokens.append(Token(token_type, match.group()))
+            position = match.end()
+
+        return tokens
+
+    def tokenize_by_trial(self):
+        """Reference tokenizer: tries every TokenType at the beginning of the rest of origin"""
         tokens, origin = [], self.origin
 
         if banned_word := self.has_banned_words(origin):
@@ -132,6 +157,7 @@ class Parser:
 
     def __init__(self, tokens):
         self.tokens = tokens
+        self.position = 0
 
     def is_valid_brackets(self):
         depth = 0
@@ -271,14 +297,110 @@ class Parser:
             raise Parser.InvalidExpression
         return operands[0]
 
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+
+    def advance(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect_end_of_expression(self, end_token=None):
+        token = self.peek()
+        if token is None and end_token is None or token == end_token and token is not None:
+            return
+        if token == ELSE_TOKEN:
+            raise Parser.IfStatementAbsenceException
+        raise Parser.InvalidExpression
+
+    def parse_expression(self):
+        """expression: binary ['if' binary 'else' expression]"""
+        true_expr = self.parse_binary(0)
+        if self.peek() != IF_TOKEN:
+            return true_expr
+
+        self.advance()
+        condition = self.parse_binary(0)
+        if self.advance() != ELSE_TOKEN:
+            raise Parser.ElseStatementAbsenceException
+        false_expr = self.parse_expression()
+
+        return {'op': 'IF', 'condition': condition, 'true': true_expr, 'false': false_expr}
+
+    def parse_binary(self, min_priority):
+        """Precedence climbing over TokenType.priority, right_sided operations bind to the right"""
+        left = self.parse_unary()
+
+        while isinstance(token := self.peek(), Token) and token.priority is not None and token.priority >= min_priority:
+            self.advance()
+            right = self.parse_binary(token.priority + (not token.right_sided))
+            left = {'op': token.name, 'left': left, 'right': right}
+
+        return left
+
+    def parse_unary(self):
+        token = self.peek()
+
+        if isinstance(token, Token) and token in (ADD_TOKEN, SUB_TOKEN):
+            self.advance()
+            return {'op': 'UNARY_PLUS' if token == ADD_TOKEN else 'UNARY_MINUS', 'left': self.parse_unary()}
+
+        if isinstance(token, Token) and token == NOT_TOKEN:
+            self.advance()
+            return {'op': 'NOT', 'left': self.parse_binary(AND_TOKEN.priority + 1)}
+
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.advance()
+
+        if isinstance(token, dict):
+            if is_variable(token) and self.peek() == LBAR:
+                self.advance()
+                return {'op': 'CALL_FUNCTION', 'function': token, 'arguments': self.parse_arguments()}
+            return token
+
+        if token == LBAR:
+            expression = self.parse_expression()
+            self.expect_end_of_expression(RBAR)
+            self.advance()
+            return expression
+
+        raise Parser.InvalidExpression
+
+    def parse_arguments(self):
+        arguments = []
+        if self.peek() == RBAR:
+            self.advance()
+            return arguments
+
+        while True:
+            arguments.append(self.parse_expression())
+            if self.peek() != DELIMITER_TOKEN:
+                self.expect_end_of_expression(RBAR)
+                self.advance()
+                return arguments
+            self.advance()
+
     def build(self):
         if not self.is_valid_brackets():
             raise Parser.InvalidBracketsException
 
-        return self.recursive_build_ast(self.tokens)
+        self.position = 0
+        ast = self.parse_expression()
+        self.expect_end_of_expression()
+        return ast
 
+    def build_recursively(self):
+        """Reference parser, splits token list around operations level by level"""
+        if not self.is_valid_brackets():
+            raise Parser.InvalidBracketsException
 
-def build_ast(expression):
+        return self.recursive_build_ast(list(self.tokens))
+
+
+def prepare_tokens(expression):
     def prepare_token(token):
         if token == NUMBER_TOKEN:
             return {'op': 'NUMBER', 'content': token.content}
@@ -288,6 +410,8 @@ def build_ast(expression):
             return {'op': 'STRING', 'content': token.content[1:-1]}
         return token
 
-    prepared_tokens = list(map(prepare_token, Lexer(expression).tokenize()))
+    return list(map(prepare_token, Lexer(expression).tokenize()))
 
-    return Parser(prepared_tokens).build()
+
+def build_ast(expression):
+    return Parser(prepare_tokens(expression)).build()
@@ -19,7 +19,7 @@ class ASTtoString:
     class InvalidAstException(Exception):
         pass
 
-    operations = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'DIV': '/', 'MOD': '%', 'POW': '**',
+    operations = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'DIV': '/', 'INT_DIV': '//', 'MOD': '%', 'POW': '**',
                   'BIT_AND': '&', 'BIT_XOR': '^', 'BIT_OR': '|', 'LEFT_SHIFT': '<<', 'RIGHT_SHIFT': '>>',
                   'EQUALS': '==', 'NOT_EQUALS': '!=', 'GREATER': '>', 'LESS': '<', 'GREATER_EQUALS': '>=',
                   'LESS_EQUALS': '<=', 'AND': 'and', 'OR': 'or', 'ASSIGN': ':='}
@@ -31,19 +31,25 @@ class ASTtoString:
         if ast is None:
             ast = self.ast
 
-        if ast['op'] == 'CALL_FUNCTION':
+        if ast['op'] in ('CALL_FUNCTION', 'TAIL_CALL'):
             return '{}({})'.format(ast['function']['content'],
                                    ', '.join(self.convert(sub_ast) for sub_ast in ast['arguments']))
 
         if ast['op'] in ('NUMBER', 'VARIABLE'):
             return ast['content']
 
+        if ast['op'] == 'STRING':
+            return "'{}'".format(ast['content'])
+
         if ast['op'] in self.operations:
             return '({} {} {})'.format(self.convert(ast['left']), self.operations[ast['op']], self.convert(ast['right']))
 
         if ast['op'] == 'NOT':
             return '(not {})'.format(self.convert(ast['left']))
 
+        if ast['op'] in ('UNARY_PLUS', 'UNARY_MINUS'):
+            return '({}{})'.format('+' if ast['op'] == 'UNARY_PLUS' else '-', self.convert(ast['left']))
+
         if ast['op'] == 'IF':
             return '({} if {} else {})'.format(*list(map(self.convert, (ast['true'], ast['condition'], ast['false']))))
 
@@ -1,21 +1,177 @@
+import asyncio
+import atexit
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from OutputBuffer import OutputBuffer
+
+try:
+    import numpy
+except ImportError:  # only array builtins need numpy
+    numpy = None
+
+
 class BuiltInFunction:
     arr = {}
 
-    def __init__(self, name, func):
+    class MissingDependencyException(Exception):
+        def __init__(self, name, dependency):
+            self.name, self.dependency = name, dependency
+
+        def __repr__(self):
+            return 'Builtin {} requires {}, install it with `pip install {}`'.format(self.name, self.dependency,
+                                                                                   self.dependency)
+
+    class SynchronousInputException(Exception):
+        def __repr__(self):
+            return 'input can not be read without waiting in program running on asyncio, call it outside of ' \
+                   'parallel for'
+
+    def __init__(self, name, func, pure=True, async_func=None):
         self.name, self.func = name, func
+        self.pure = pure  # result depends only on arguments and there are no side effects
+        self.async_func = async_func  # coroutine function awaited instead when program runs on asyncio
         BuiltInFunction.arr[name] = self
 
     def execute(self, args, variable_scope):
         return self.func(*args)
 
+    async def execute_async(self, args, variable_scope):
+        if self.async_func is not None:
+            return await self.async_func(*args)
+        return self.func(*args)
+
+    def __reduce__(self):
+        # functions of builtins are lambdas, pickled builtin is found by name on load
+        return BuiltInFunction.by_name, (self.name,)
+
+    @staticmethod
+    def by_name(name):
+        return BuiltInFunction.arr[name]
+
+    @staticmethod
+    def requiring_numpy(name, func, pure=False):
+        """Builtin which raises MissingDependencyException when called without numpy installed"""
+        if numpy is None:
+            def func(*args):
+                raise BuiltInFunction.MissingDependencyException(name, 'numpy')
+        return BuiltInFunction(name, func, pure)
+
+
+def scalar(value):
+    """Elements of arrays are returned as python numbers, which do not overflow"""
+    return value.item() if numpy is not None and isinstance(value, numpy.generic) else value
+
+
+OUTPUT = OutputBuffer()
+atexit.register(OUTPUT.flush)
+
+# buffer which print writes to in the current thread or task, runs with captured output set their own
+current_output = ContextVar('output', default=OUTPUT)
+
+
+@contextmanager
+def redirect_output(stream=None):
+    """Output printed inside of with block goes to stream (sys.stdout when None) through new buffer,
+    flushed at the end of block"""
+    buffer = OutputBuffer(stream)
+    token = current_output.set(buffer)
+    try:
+        yield buffer
+    finally:
+        buffer.flush()
+        current_output.reset(token)
+
+
+def print_values(*values):
+    current_output.get().print(*values)
+
+
+def read_input(prompt):
+    if current_input_reader.get() is not None:
+        # lines of program running on asyncio come from its reader, which has to be awaited
+        raise BuiltInFunction.SynchronousInputException()
+    # prompt and everything printed before must be visible when program waits for input
+    output = current_output.get()
+    output.write(str(prompt))
+    output.flush()
+    return input()
+
+
+# coroutine function returning next line of input for programs running on asyncio, stdin is read when None
+current_input_reader = ContextVar('input_reader', default=None)
+
+
+async def read_input_async(prompt):
+    output = current_output.get()
+    output.write(str(prompt))
+    output.flush()
+    reader = current_input_reader.get()
+    if reader is not None:
+        return await reader()
+    return await in_executor(input)
+
+
+async def in_executor(function, *args):
+    """Runs blocking function in thread of default executor, so event loop runs other tasks meanwhile"""
+    return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+
+def open_file(path, mode='r'):
+    return open(path, mode, buffering=OutputBuffer.CHUNK_SIZE)
+
+
+def write_file(file, *values):
+    """Writes values to file the same way print writes them to output"""
+    file.write(' '.join(map(str, values)) + '\n')
+
+
+def read_file(file, size=-1):
+    return file.read(size)
+
+
+def create_array(*values):
+    if len(values) == 1 and isinstance(values[0], (list, numpy.ndarray)):
+        return numpy.array(values[0])
+    return numpy.array(values)
+
+
+def set_item(values, index, value):
+    values[index] = value
+    return values
+
+
+def sum_values(values):
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return numpy.sum(values).item()
+    return sum(values)
+
 
 INT_FUNC = BuiltInFunction('int', lambda x: int(x))
 STR_FUNC = BuiltInFunction('str', lambda x: str(x))
 LEN_FUNC = BuiltInFunction('len', lambda x: len(x))
 SLICE = BuiltInFunction('slice', lambda string, left, right: string[left:right])
-INPUT = BuiltInFunction('input', lambda prompt: input(prompt))
-PRINT = BuiltInFunction('print', lambda *args: print(*args))
+INPUT = BuiltInFunction('input', read_input, pure=False, async_func=read_input_async)
+PRINT = BuiltInFunction('print', print_values, pure=False)
+FLUSH = BuiltInFunction('flush', lambda: current_output.get().flush(), pure=False)
 ORD_FUNC = BuiltInFunction('ord', lambda char: ord(char))
 CHR_FUNC = BuiltInFunction('chr', lambda num: chr(num))
-LIST_INIT = BuiltInFunction('list', lambda *args: list(args))
-LIST_GET = BuiltInFunction('getitem', lambda arr, index: arr[index])
+# lists are changed by setitem, so creating them is not pure, the same as for arrays below
+LIST_INIT = BuiltInFunction('list', lambda *args: list(args), pure=False)
+LIST_GET = BuiltInFunction('getitem', lambda arr, index: scalar(arr[index]))
+LIST_SET = BuiltInFunction('setitem', set_item, pure=False)
+SUM_FUNC = BuiltInFunction('sum', sum_values)
+SLEEP = BuiltInFunction('sleep', lambda seconds: time.sleep(seconds), pure=False, async_func=asyncio.sleep)
+
+# arrays are mutable, so creating them is not pure: memoized function would share one array between calls
+ARRAY_INIT = BuiltInFunction.requiring_numpy('array', create_array)
+ARRAY_ZEROS = BuiltInFunction.requiring_numpy('zeros', lambda size: numpy.zeros(int(size)))
+ARRAY_RANGE = BuiltInFunction.requiring_numpy('arange', lambda *args: numpy.arange(*args))
+
+# files are read and written lazily through buffers, so size of file does not matter
+FILE_OPEN = BuiltInFunction('open', open_file, pure=False, async_func=lambda *args: in_executor(open_file, *args))
+FILE_READLINE = BuiltInFunction('readline', lambda file: file.readline(), pure=False,
+                                async_func=lambda file: in_executor(file.readline))
+FILE_READ = BuiltInFunction('read', read_file, pure=False, async_func=lambda *args: in_executor(read_file, *args))
+FILE_WRITE = BuiltInFunction('write', write_file, pure=False, async_func=lambda *args: in_executor(write_file, *args))
+FILE_CLOSE = BuiltInFunction('close', lambda file: file.close(), pure=False)
@@ -0,0 +1,28 @@
+"""
+Tests of the interpreter, run from console:
+
+    python -m pytest AdvanceInterpreter/tests
+    python -m unittest discover -s AdvanceInterpreter/tests -t AdvanceInterpreter
+"""
+import io
+import os
+import sys
+
+# modules of the interpreter are imported by plain names, as when it is run itself
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Program import Program
+
+
+def run_everywhere(source, inputs=None, limits=None, **options):
+    """Returns {engine: (printed output, error message or None)} of running source once with every engine,
+    limits are keyword arguments of budget given to run"""
+    results = {}
+    for engine in Program.ENGINES:
+        output, error = io.StringIO(), None
+        try:
+            Program(source, engine, **options).run(inputs, output, **(limits or {}))
+        except Exception as e:
+            error = e.__repr__()
+        results[engine] = (output.getvalue(), error)
+    return results
@@ -0,0 +1,57 @@
+import asyncio
+import io
+import unittest
+from tests import Program
+
+NESTED_CALLS = '''
+def twice(p):
+    x = input(p)
+    return x + x
+fn ask(p) => input(p)
+a = int(input('a')) + 1
+b = len(twice('b')) * 10
+c = ask('c') + '!'
+if input('d') == 'yes':
+    print('yes')
+n = 0
+while int(input('e')) > 0:
+    n = n + 1
+for i = 1 to int(input('f')):
+    n = n + i
+def add_input(k):
+    return int(input('g')) + k
+print(a, b, c, n, add_input(5))
+'''
+
+PARALLEL_INPUT = '''
+s = 0
+parallel for i = 1 to 2 with sum(s):
+    s = s + int(input('x'))
+'''
+
+
+def run_with_reader(source, lines):
+    """Printed output of running source on asyncio with input read from lines"""
+    lines, output = iter(lines), io.StringIO()
+
+    async def read_line():
+        return next(lines)
+    asyncio.run(Program(source, engine='async').run_async(output=output, read_input=read_line))
+    return output.getvalue()
+
+
+class AsyncTest(unittest.TestCase):
+    """Programs on asyncio read input from their reader wherever input is called"""
+
+    def test_input_in_expressions_comes_from_reader(self):
+        output = run_with_reader(NESTED_CALLS, ['41', 'ab', 'hi', 'yes', '1', '1', '0', '3', '7'])
+        self.assertEqual(output, 'abcdyes\neeefg42 40 hi! 8 12\n')
+
+    def test_input_which_can_not_wait_raises(self):
+        with self.assertRaises(Exception) as raised:
+            run_with_reader(PARALLEL_INPUT, ['1', '2'])
+        self.assertIn('input can not be read without waiting', raised.exception.__repr__())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from tests import run_everywhere
+
+LOOPS = '''
+s = 0
+for i = 1 to 1000:
+    if i % 5 == 0:
+        continue
+    for j = 10 downto 1:
+        if j < 4:
+            break
+        s = s + j
+    if i > 300:
+        break
+k = 0
+while k < 700:
+    k = k + 1
+    if k % 2:
+        continue
+    s = s + k
+def first_over(n, limit):
+    t = 0
+    for q = 1 to n:
+        if q > limit:
+            return t
+        t = t + q
+    return -1
+fn count(n, acc) => acc if n == 0 else count(n - 1, acc + n)
+print(s, i, j, k, first_over(1000, 600), first_over(10, 600), count(3000, 0))
+'''
+
+RUNAWAY = {
+    'while': 'while 1:\n    x = 1\n',
+    'for': 'for i = 1 to 100000000:\n    x = i\n',
+    'tail call': 'fn f(n) => f(n + 1)\nf(0)\n',
+    'calls': 'def f(n):\n    return n\nwhile 1:\n    f(1)\n',
+}
+
+DEEP = 'def f(n):\n    x = f(n + 1)\n    return x\nf(0)\n'
+
+SLOW_LOOP = 'while 1:\n    sleep(0.002)\n'
+
+
+class BudgetTest(unittest.TestCase):
+    """Metered runs give the same results as free ones and stop at limits on every engine"""
+
+    def test_metered_runs_give_same_results(self):
+        expected = ('134659 301 3 700 180300 -1 4501500\n', None)
+        for limits in (None, {'max_steps': 10 ** 6, 'max_seconds': 60}, {'max_steps': 10 ** 6, 'max_depth': 50}):
+            for engine, result in run_everywhere(LOOPS, limits=limits).items():
+                self.assertEqual(result, expected, (engine, limits))
+
+    def test_steps_limit_stops_runaway_programs(self):
+        for name, source in RUNAWAY.items():
+            for limits in ({'max_steps': 100000}, {'max_steps': 100000, 'max_depth': 50}):
+                for engine, (_, error) in run_everywhere(source, limits=limits).items():
+                    self.assertTrue(error.startswith('Budget exceeded: steps limit 100000'), (name, engine, error))
+
+    def test_depth_limit_stops_deep_recursion(self):
+        for engine, (_, error) in run_everywhere(DEEP, limits={'max_depth': 50}).items():
+            self.assertTrue(error.startswith('Budget exceeded: depth limit 50'), (engine, error))
+
+    def test_time_limit_stops_slow_loop_after_one_chunk(self):
+        for engine, (_, error) in run_everywhere(SLOW_LOOP, limits={'max_seconds': 0.2}).items():
+            self.assertTrue(error.startswith('Budget exceeded: seconds limit 0.2'), (engine, error))
+            seconds = float(error.split(' in ')[1].split()[0])
+            self.assertLess(seconds, 0.2 + 2 * 0.002 * 256, (engine, error))  # one chunk of sleeps with some margin
+
+
+if __name__ == '__main__':
+    unittest.main()
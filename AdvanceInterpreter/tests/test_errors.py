@@ -0,0 +1,32 @@
+import unittest
+from tests import run_everywhere
+from Compiler import Compiler
+from Transpiler import CompiledPython
+
+ERRORS = {
+    'fn f(x) => x\nprint(f(1, 2))\n': 'Function takes 1 arguments but 2 were given',
+    'def g(a, b, c):\n    return a\nprint(g(1))\n': 'Function takes 3 arguments but 1 were given',
+    'def h(n):\n    fn q(m) => m\n    return q(n, n)\nprint(h(1))\n': 'Function takes 1 arguments but 2 were given',
+    'fn f(n) => 0 if n == 0 else f(n - 1, 1)\nprint(f(3))\n': 'Function takes 1 arguments but 2 were given',
+    'a = 5\nprint(a(1))\n': 'Value of type int is not a function',
+    "def h(n):\n    k = 'text'\n    return k(n)\nh(1)\n": 'Value of type str is not a function',
+    'print(1 + undefined)\n': 'Undefined variable undefined',
+    "print(1 + 'a')\n": 'TypeError("unsupported operand type(s) for +: \'int\' and \'str\'")',
+}
+
+
+class ErrorsTest(unittest.TestCase):
+    """Every engine stops with the same error, which names things of the program"""
+
+    def test_engines_raise_the_same_errors(self):
+        for source, message in ERRORS.items():
+            for engine, result in run_everywhere(source).items():
+                self.assertEqual(result, ('', message), (engine, source))
+
+    def test_python_engine_errors_name_things_of_program(self):
+        compiled = CompiledPython(Compiler('x = 1\n').compile())
+        self.assertEqual(str(compiled.call_error('l2_total() got v_count')), 'total() got count')
+
+
+if __name__ == '__main__':
+    unittest.main()
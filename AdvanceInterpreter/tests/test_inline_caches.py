@@ -0,0 +1,56 @@
+import unittest
+from tests import run_everywhere
+from ASTwithCalculation import AST, InlineCache
+from VariableScopeClass import VariableScope
+
+CHANGING_TYPES = '''
+k = 5
+def f(n):
+    if n > 2:
+        k = 1
+    return n + k
+x = 1
+s = 0
+for i = 1 to 300:
+    if i == 100:
+        x = 0.5
+    if i == 200:
+        x = 'a'
+        s = ''
+    s = s + x
+    t = f(i % 4)
+print(s, t, i < 300, x == 'a')
+'''
+
+
+class InlineCacheTest(unittest.TestCase):
+    """Specialised binary nodes give the same results as generic ones and follow types of operands"""
+
+    def test_changing_types_give_same_results(self):
+        expected = run_everywhere(CHANGING_TYPES)
+        AST.inline_caches = False
+        try:
+            generic = run_everywhere(CHANGING_TYPES)
+        finally:
+            AST.inline_caches = True
+        self.assertEqual(expected, generic)
+        self.assertEqual(expected['tree'], ('{} 5 0 1\n'.format('a' * 101), None))
+
+    def test_node_is_specialised_again_when_types_change(self):
+        ast = AST({'op': 'ADD', 'left': {'op': 'VARIABLE', 'content': 'a'},
+                   'right': {'op': 'VARIABLE', 'content': 'b'}})
+        scope = VariableScope()
+        scope.vars.update(a=1, b=2)
+        for _ in range(InlineCache.PROBES + 1):
+            self.assertEqual(ast.execute(scope), 3)
+        cache, = ast.caches.values()
+        self.assertEqual(cache.state(), 'monomorphic int/int')
+
+        scope.vars.update(a=0.5, b=0.25)
+        for _ in range(InlineCache.MISSES + InlineCache.PROBES + 1):
+            self.assertEqual(ast.execute(scope), 0.75)
+        self.assertEqual(cache.state(), 'monomorphic float/float')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import time
+import unittest
+from tests import run_everywhere
+from Compiler import Compiler
+from Commands import LoopCommand
+from LoopOptimizer import LoopOptimizer
+from my_builtins import numpy
+
+INVARIANT_LOOPS = '''
+width = 12
+height = 8
+scale = 3
+total = 0
+for y = 0 to height - 1:
+    row = y * width * scale
+    for x = 0 to width - 1:
+        total = (total + x * scale + row + (width * height) % 97 - len('abc')) % 1000003
+step = 0
+while step < width * height / scale:
+    step = step + 1
+    total = total + step * (scale + 1) - width // scale
+def area(w, h):
+    s = 0
+    i = 0
+    while i < h:
+        i = i + 1
+        s = s + w * h - i
+    return s
+print(total, step, area(4, 5))
+'''
+
+FAILING_HOISTED = '''
+n = 10
+d = 0
+y = -1
+for i = 1 to 0:
+    y = n // d
+while d > 0:
+    y = n // d
+print(y)
+i = 0
+while i < 3:
+    i = i + 1
+    print(i)
+    y = n // d
+'''
+
+MUTABLE_VALUES = '''
+a = list(1, 2)
+k = 3
+s = 0
+for i = 1 to 4:
+    setitem(a, 0, i)
+    s = s + getitem(a, 0) * k + len(a + a)
+print(s, a)
+'''
+
+ARRAYS = '''
+r = arange(0, 5)
+s = 0
+for i = 1 to 3:
+    setitem(r, 0, i)
+    s = s + sum(r * 2) + len(r + r)
+print(s)
+'''
+
+CONDITIONAL = '''
+n = 30
+i = 0
+while i < 10:
+    i = i + 1
+    x = n * 2
+    t = n < 5 and 3 ** n > 1
+    u = (3 ** n) if n < 5 else n * 3
+    if n < 5:
+        x = 3 ** n
+    y = n + 1
+print(x, t, u, y)
+'''
+
+# hoisted power takes seconds, loops which run no iterations must not compute it
+ZERO_TRIP = '''
+n = 0
+e = 10
+for i = 1 to n:
+    y = 3 ** (e ** 7)
+while n > 0:
+    y = 3 ** (e ** 7)
+def f(m):
+    k = 0
+    while k < m:
+        k = k + 1
+        y = 3 ** (e ** 7)
+    return k
+print(f(n), n * e)
+'''
+
+# condition prints, it runs once per check with loop optimized too
+PRINTING_CONDITION = '''
+n = 4
+i = 0
+while len(str(print('check', i))) == 4 and i < n * 2 - 5:
+    i = i + 1
+    x = n * 3
+    if i == 2:
+        continue
+    print(i, x)
+'''
+
+
+class LoopOptimizerTest(unittest.TestCase):
+    """Programs give the same output and errors with loops optimized and as written, with every engine"""
+
+    def assert_same_results(self, source):
+        optimized, written = run_everywhere(source), run_everywhere(source, optimize_loops=False)
+        self.assertEqual(optimized, written)
+        self.assertEqual(len(set(optimized.values())), 1, optimized)
+        return optimized['tree']
+
+    def test_invariant_expressions(self):
+        self.assertEqual(self.assert_same_results(INVARIANT_LOOPS), ('24592 32 85\n', None))
+
+    def test_failing_hoisted_expression_runs_loop_as_written(self):
+        output, error = self.assert_same_results(FAILING_HOISTED)
+        self.assertEqual(output, '-1\n1\n')
+        self.assertIsNotNone(error)
+
+    def test_lists_run_loop_as_written(self):
+        self.assertEqual(self.assert_same_results(MUTABLE_VALUES), ('46 [4, 2]\n', None))
+
+    @unittest.skipIf(numpy is None, 'arrays need numpy')
+    def test_arrays_run_loop_as_written(self):
+        output, error = self.assert_same_results(ARRAYS)
+        self.assertIsNone(error)
+
+    def test_loops_running_no_iterations_compute_nothing(self):
+        start = time.perf_counter()
+        self.assertEqual(run_everywhere(ZERO_TRIP)['tree'], ('0 0\n', None))
+        self.assertEqual(self.assert_same_results(ZERO_TRIP), ('0 0\n', None))
+        self.assertEqual(set(run_everywhere(ZERO_TRIP, limits={'max_steps': 10 ** 6}).values()), {('0 0\n', None)})
+        self.assertLess(time.perf_counter() - start, 2)
+
+    def test_condition_runs_once_per_check(self):
+        output, error = self.assert_same_results(PRINTING_CONDITION)
+        self.assertEqual(output, 'check 0\n1 12\ncheck 1\ncheck 2\n3 12\ncheck 3\n')
+
+    def test_expressions_which_may_not_run_are_not_hoisted(self):
+        self.assert_same_results(CONDITIONAL)
+        compiler = Compiler(CONDITIONAL)
+        loops = [command for command in LoopOptimizer.walk(compiler.compile().compiled_commands)
+                 if isinstance(command, LoopCommand) and command.original is not None]
+        self.assertEqual(len(loops), 1)
+        # power is computed only inside of whole and, if and its branch, nothing after the branch is hoisted
+        self.assertEqual([ast.ast['op'] for _, ast, _ in loops[0].hoisted], ['MUL', 'AND', 'IF', 'LESS'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+from tests import run_everywhere
+
+SHARED_LIST = '''
+fn pair(x) => list(x, x)
+a = pair(1)
+setitem(a, 0, 99)
+print(pair(1), a)
+'''
+
+
+class MemoizationTest(unittest.TestCase):
+    """Memoized functions give the same results as evaluated ones"""
+
+    def test_function_creating_list_is_not_memoized(self):
+        for memoize in (True, False):
+            for engine, result in run_everywhere(SHARED_LIST, memoize=memoize).items():
+                self.assertEqual(result, ('[1, 1] [99, 1]\n', None), (engine, memoize))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+from tests import run_everywhere
+from Commands import ParallelForCommand
+
+PRIVATE_NAMES = '''
+n = 6
+i = 100
+s = 0
+parallel for i = 1 to n with sum(s):
+    t = i * 2
+    s = s + t
+print(s, i)
+print(t)
+'''
+
+
+class ParallelForTest(unittest.TestCase):
+    """Loop run in this process leaves the same variables as loop run by workers"""
+
+    def tearDown(self):
+        ParallelForCommand.workers = None
+
+    def test_private_names_do_not_leak(self):
+        for workers in (1, 3):  # one worker runs the loop in this process
+            ParallelForCommand.workers = workers
+            for engine, result in run_everywhere(PRIVATE_NAMES).items():
+                self.assertEqual(result, ('42 100\n', 'Undefined variable t'), (engine, workers))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+from tests import Program  # noqa: F401, puts modules of the interpreter on the path
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__main__.py')
+
+COUNT = '''
+fn count(n, acc) => acc if n == 0 else count(n - 1, acc + n)
+print(count(50000, 0))
+'''
+
+
+def load_main():
+    spec = importlib.util.spec_from_file_location('interpreter_main', MAIN)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class ProfileTest(unittest.TestCase):
+    """Profile counts the program as written"""
+
+    def test_profile_counts_every_self_call(self):
+        main = load_main()
+        with tempfile.TemporaryDirectory() as directory:
+            source, report = os.path.join(directory, 'count.ai'), os.path.join(directory, 'profile.json')
+            with open(source, 'w') as f:
+                f.write(COUNT)
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                main.main(main.parse_args(['--src', source, '--no-cache', '--profile-output', report]))
+            with open(report) as f:
+                functions = json.load(f)['functions']
+        self.assertEqual([(function['name'], function['hits']) for function in functions], [('count', 50001)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import io
+import json
+import unittest
+from tests import run_everywhere
+from Program import Program
+from BatchRunner import BatchRunner
+from Compiler import Compiler
+
+SHADOWING_PROGRAM = '''
+def total(x):
+    return x + sum
+fn shifted(x) => x + len
+result = total(1) + shifted(2)
+print(result, sum, len)
+'''
+
+
+class ShadowedBuiltinsTest(unittest.TestCase):
+    """Inputs named as builtins are seen by functions, not only by code at top level"""
+
+    def test_inputs_shadow_builtins_in_functions(self):
+        for engine, result in run_everywhere(SHADOWING_PROGRAM, {'sum': 10, 'len': 100}).items():
+            self.assertEqual(result, ('113 10 100\n', None), engine)
+
+    def test_program_keeps_builtins_for_other_inputs(self):
+        for engine in Program.ENGINES:
+            program = Program('fn size(s) => len(s)\nresult = size(word)', engine)
+            self.assertEqual(program.run({'word': 'abc'})['result'], 3, engine)
+            self.assertEqual(program.run({'word': 'ab'})['result'], 2, engine)
+
+    def test_pure_function_is_not_memoized_on_shadowed_builtin(self):
+        for engine in Program.ENGINES:
+            program = Program('fn scaled(x) => x * sum\nresult = scaled(2)', engine)
+            self.assertEqual([program.run({'sum': n})['result'] for n in (1, 2, 3)], [2, 4, 6], engine)
+
+    def test_batch_records_shadow_builtins(self):
+        records = ['{"sum": 10}\n', '{"sum": 20}\n']
+        for engine in Program.ENGINES:
+            source = 'def total(x):\n    return x + sum\nresult = total(1)'
+            options = {'memoize': True}
+            runner = BatchRunner(Compiler(source, **options).compile(), engine, 1, None, source, options)
+            results = io.StringIO()
+            runner.run(iter(records), results)
+            self.assertEqual([json.loads(line)['result'] for line in results.getvalue().splitlines()], [11, 21],
+                             engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
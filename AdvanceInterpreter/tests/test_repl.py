@@ -0,0 +1,17 @@
+import unittest
+import tests  # noqa: F401, puts modules of the interpreter on the path
+from Repl import Repl
+
+
+class ReplTest(unittest.TestCase):
+    """Inputs of session see names as later inputs bound them"""
+
+    def test_rebound_function_is_called_by_its_new_name(self):
+        repl = Repl()
+        for source in ('fn f(n) => 0 if n == 0 else f(n - 1)', 'g = f', 'fn f(n) => 42'):
+            repl.execute(source)
+        self.assertEqual(repl.execute('g(5)'), 42)
+
+
+if __name__ == '__main__':
+    unittest.main()